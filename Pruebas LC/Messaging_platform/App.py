@@ -1,21 +1,36 @@
-from flask import Flask, request, jsonify, render_template
+import json
+import zlib
 
-from metodos.Webhook import procesar_webhook
-from metodos.Setwebhook import set_webhook
-from metodos.GetWebhook import get_webhook
+from flask import Flask, Response, request, jsonify, render_template
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from metodos.Webhook import procesar_webhook, procesar_webhooks
 from metodos.Token import obtener_token
-from metodos.SendMessage import send_message
-from metodos.SendQuickAnswer import send_quick_answer
-from metodos.SendFile import send_file
 from metodos.Transfer import transfer
-from metodos.Balance import get_balance
-from metodos.Channels import get_channels
-from Inbox.conversations import get_conversations
-from Inbox.messages import get_messages
+from Inbox.conversations import get_conversations, get_conversations_version
+from Inbox.messages import get_messages, get_messages_version, poll_messages
+from Inbox.search import search_messages
 from DB.database import init_db
+from services.webhook_service import parse_ndjson
+from services.retention import default_retention_worker, run_retention
+from services.resilience import default_upstream
+from services.upstream_metrics import default_metrics
+from services.outbox import default_outbox
+from services.config_cache import get_balance, get_channels, get_webhook, set_webhook
+from services.broadcast import prepare_broadcast, stream_broadcast
+from services.bulk_transfer import prepare_bulk_transfer, run_bulk_transfer
+from services.media_store import MAX_UPLOAD_BYTES, default_media_store
+from services.events import default_event_hub, parse_conversation_filter, parse_event_id
 init_db()
 
+MAX_WEBHOOK_BATCH_ITEMS = 5000
+# Tope de cualquier body (tambien chunked): el upload mas grande de /media mas
+# el multipart. Un lote de webhooks mas pesado se corta sin leerlo entero.
+MAX_REQUEST_BYTES = MAX_UPLOAD_BYTES + 1024 * 1024
+NDJSON_MIMETYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+
 app = Flask(__name__)
+app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_BYTES
 
 def _status_from_result(result):
     if isinstance(result, dict):
@@ -26,13 +41,45 @@ def _status_from_result(result):
             return 502
     return 200
 
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(_error):
+    return jsonify({"ok": False, "error": f"El body supera el maximo de {MAX_REQUEST_BYTES} bytes"}), 413
+
 @app.route("/", methods=["GET"])
 def home():
     return render_template("index.html")
 
+def _page_args():
+    return {
+        "limit": request.args.get("limit"),
+        "before": request.args.get("before"),
+        "after": request.args.get("after"),
+        "since": request.args.get("since"),
+    }
+
+def _conditional_json(version, load):
+    # El ETag combina la version de sincronizacion con la URL pedida; si no hubo
+    # cambios se responde 304 sin consultar las filas.
+    etag = f"{version}-{zlib.crc32(request.full_path.encode('utf-8')):x}"
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    result = load()
+    response = jsonify(result)
+    response.status_code = _status_from_result(result)
+    if result.get("ok"):
+        response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
 @app.route("/conversations", methods=["GET"])
 def api_get_conversations():
-    return jsonify(get_conversations())
+    return _conditional_json(
+        get_conversations_version(),
+        lambda: get_conversations(**_page_args()),
+    )
 
 @app.route("/config/setWebhook", methods=["POST"])
 def config_set_webhook():
@@ -54,6 +101,29 @@ def config_balance():
     result = get_balance()
     return jsonify(result), _status_from_result(result)
 
+@app.route("/config/retention", methods=["POST"])
+def config_retention():
+    payload = request.get_json(silent=True) or {}
+    result = run_retention(
+        older_than_days=payload.get("older_than_days"),
+        inactive_days=payload.get("inactive_days"),
+    )
+    return jsonify(result), _status_from_result(result)
+
+@app.route("/config/upstream", methods=["GET"])
+def config_upstream():
+    # Estado del circuito y tokens disponibles por endpoint, para monitoreo.
+    return jsonify({"ok": True, **default_upstream.snapshot()})
+
+@app.route("/stats/upstream", methods=["GET"])
+def stats_upstream():
+    # Latencia, status, reintentos, rechazos locales y bytes por endpoint de
+    # LiveConnect, mas las renovaciones de token. ?reset=1 reinicia los contadores.
+    snapshot = default_metrics.snapshot()
+    if request.args.get("reset") == "1":
+        default_metrics.reset()
+    return jsonify({"ok": True, **snapshot})
+
 @app.route("/config/channels", methods=["GET"])
 def config_channels():
     filters = request.args.to_dict()
@@ -62,7 +132,48 @@ def config_channels():
 
 @app.route("/messages/<conversation_id>", methods=["GET"])
 def api_get_messages(conversation_id):
-    return jsonify(get_messages(conversation_id))
+    return _conditional_json(
+        get_messages_version(conversation_id),
+        lambda: get_messages(conversation_id, archived=request.args.get("archived"), **_page_args()),
+    )
+
+@app.route("/messages/<conversation_id>/poll", methods=["GET"])
+def api_poll_messages(conversation_id):
+    # Long-poll para clientes sin streaming: espera hasta "wait" segundos a que
+    # lleguen mensajes despues de "after" y devuelve solo esos.
+    result = poll_messages(
+        conversation_id,
+        after=request.args.get("after"),
+        wait=request.args.get("wait"),
+        limit=request.args.get("limit"),
+    )
+    response = jsonify(result)
+    response.headers["Cache-Control"] = "no-store"
+    return response, _status_from_result(result)
+
+@app.route("/events", methods=["GET"])
+def api_events():
+    # SSE: message.created y conversation.updated en cuanto se guarda un mensaje.
+    # El navegador reenvia Last-Event-ID al reconectar; last_event_id sirve al abrir
+    # un stream nuevo (p. ej. al cambiar de conversacion).
+    after_id = parse_event_id(request.headers.get("Last-Event-ID") or request.args.get("last_event_id"))
+    stream = default_event_hub.stream(after_id, parse_conversation_filter(request.args.getlist("conversation_id")))
+    return Response(
+        stream,
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route("/search", methods=["GET"])
+def api_search_messages():
+    result = search_messages(
+        request.args.get("q"),
+        conversation_id=request.args.get("conversation_id"),
+        canal=request.args.get("canal"),
+        limit=request.args.get("limit"),
+        after=request.args.get("after"),
+    )
+    return jsonify(result), _status_from_result(result)
 
 @app.route("/webhook/liveconnect", methods=["POST"])
 def webhook():
@@ -70,6 +181,25 @@ def webhook():
     status_code = 200 if result.get("ok", result.get("status") == "ok") else 400
     return jsonify(result), status_code
 
+@app.route("/webhook/liveconnect/batch", methods=["POST"])
+def webhook_batch():
+    if request.mimetype in NDJSON_MIMETYPES:
+        payloads = parse_ndjson(request.stream, max_items=MAX_WEBHOOK_BATCH_ITEMS)
+    else:
+        body = request.get_json(silent=True)
+        payloads = body.get("events") if isinstance(body, dict) else body
+
+    if not isinstance(payloads, list):
+        return jsonify({"ok": False, "error": "Se esperaba un arreglo JSON o NDJSON de eventos"}), 400
+    if len(payloads) > MAX_WEBHOOK_BATCH_ITEMS:
+        return jsonify({
+            "ok": False,
+            "error": f"El lote supera el maximo de {MAX_WEBHOOK_BATCH_ITEMS} eventos",
+        }), 413
+
+    result = procesar_webhooks(payloads)
+    return jsonify(result), _status_from_result(result)
+
 @app.route("/setWebhook", methods=["POST"])
 def api_set_webhook():
     payload = request.get_json(silent=True) or {}
@@ -85,26 +215,69 @@ def api_get_webhook():
     result = get_webhook(id_canal)
     return jsonify(result), _status_from_result(result)
 
+# Los envios quedan en el outbox y se responde 202; la entrega corre en segundo plano.
 @app.route("/sendMessage", methods=["POST"])
 def api_send_message():
-    return jsonify(send_message(request.json))
+    result = default_outbox.enqueue("sendMessage", request.get_json(silent=True))
+    return jsonify(result), _status_from_result(result)
 
 @app.route("/sendQuickAnswer", methods=["POST"])
 def api_send_quick_answer():
-    return jsonify(send_quick_answer(request.json))
+    result = default_outbox.enqueue("sendQuickAnswer", request.get_json(silent=True))
+    return jsonify(result), _status_from_result(result)
 
 @app.route("/sendFile", methods=["POST"])
 def api_send_file():
-    return jsonify(send_file(request.json))
+    error, payload = default_media_store.resolve_send_file(request.get_json(silent=True), request.host_url)
+    result = error or default_outbox.enqueue("sendFile", payload)
+    return jsonify(result), _status_from_result(result)
+
+@app.route("/media", methods=["POST"])
+def api_upload_media():
+    # Se lee request.stream directamente: el archivo va a disco por partes.
+    result = default_media_store.save_multipart(request.stream, request.headers.get("Content-Type"))
+    return jsonify(result), _status_from_result(result)
+
+@app.route("/media/<sha256>", methods=["GET"])
+def api_get_media(sha256):
+    response = default_media_store.serve(sha256, request.environ)
+    if response is None:
+        return jsonify({"ok": False, "error": "Archivo no encontrado"}), 404
+    return response
+
+@app.route("/broadcast", methods=["POST"])
+def api_broadcast():
+    error, plan = prepare_broadcast(request.get_json(silent=True))
+    if error:
+        return jsonify(error), _status_from_result(error)
+    # NDJSON: una linea por destinatario a medida que termina y una de resumen al final.
+    lines = (json.dumps(line, ensure_ascii=False) + "\n" for line in stream_broadcast(plan))
+    return Response(lines, mimetype="application/x-ndjson", headers={"X-Broadcast-Id": plan["broadcast_id"]})
+
+@app.route("/outbox/<int:outbox_id>", methods=["GET"])
+def api_outbox_status(outbox_id):
+    result = default_outbox.status(outbox_id)
+    return jsonify(result), _status_from_result(result)
 
 @app.route("/transfer", methods=["POST"])
 def api_transfer():
     return jsonify(transfer(request.json))
 
+@app.route("/transfer/bulk", methods=["POST"])
+def api_bulk_transfer():
+    error, plan = prepare_bulk_transfer(request.get_json(silent=True))
+    if error:
+        return jsonify(error), _status_from_result(error)
+    result = run_bulk_transfer(plan)
+    return jsonify(result), _status_from_result(result)
+
 @app.route("/balance", methods=["GET"])
 def api_balance():
     result = get_balance()
     return jsonify(result), _status_from_result(result)
 
 if __name__ == "__main__":
+    default_retention_worker.start()
+    # Retoma los envios que quedaron pendientes antes del reinicio.
+    default_outbox.start()
     app.run(port=3000)
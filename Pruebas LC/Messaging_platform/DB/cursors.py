@@ -0,0 +1,27 @@
+import base64
+import binascii
+import json
+
+
+def encode_cursor(*values):
+    raw = json.dumps(list(values), separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token, size):
+    if not isinstance(token, str) or not token.strip():
+        raise ValueError("cursor invalido")
+
+    normalized = token.strip()
+    padding = "=" * (-len(normalized) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(normalized + padding).decode("utf-8")
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("cursor invalido") from None
+
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("cursor invalido")
+    if any(isinstance(value, bool) or not isinstance(value, (str, int, float)) for value in values):
+        raise ValueError("cursor invalido")
+    return tuple(values)
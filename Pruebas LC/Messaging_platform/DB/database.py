@@ -1,16 +1,167 @@
 import json
+import logging
+import os
+import queue
 import sqlite3
-from dataclasses import dataclass
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from DB.migrations import ARCHIVE_SCHEMA, apply_migrations, ensure_archive_schema
 
 DB_NAME = "database.db"
 
+POOL_SIZE = 8
+POOL_TIMEOUT_SECONDS = 30
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE_SIZE = 256
+
+ARCHIVE_BATCH_SIZE = 500
+AUTO_VACUUM_INCREMENTAL = 2
+
+SEARCH_RANK_SQL = "bm25(messages_fts, 10.0, 4.0, 2.0)"
+
+OUTBOX_LEASE_SECONDS = 120
+OUTBOX_COLUMNS = "id, kind, conversation_id, payload, status, attempts, last_error, result, created_at, updated_at"
+
+logger = logging.getLogger(__name__)
+
+# WAL permite lecturas concurrentes mientras el webhook escribe; el resto
+# ajusta cache de paginas y mmap para conexiones de larga duracion.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 134217728",
+    "PRAGMA temp_store = MEMORY",
+)
+
 
 @dataclass
 class SQLiteRepository:
     db_name: str = DB_NAME
+    pool_size: int = POOL_SIZE
+    busy_timeout_ms: int = BUSY_TIMEOUT_MS
+    archive_name: str = None
+    _pool: queue.LifoQueue = field(default=None, init=False, repr=False, compare=False)
+    _pool_lock: threading.Lock = field(default=None, init=False, repr=False, compare=False)
+    _pool_created: int = field(default=0, init=False, repr=False, compare=False)
+    _pool_pid: int = field(default=None, init=False, repr=False, compare=False)
+    _change_listeners: list = field(default_factory=list, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.archive_name is None:
+            self.archive_name = self._default_archive_name(self.db_name)
+        self._reset_pool()
+
+    @staticmethod
+    def _default_archive_name(db_name):
+        if db_name == ":memory:":
+            return db_name
+        root, ext = os.path.splitext(db_name)
+        return f"{root}_archive{ext or '.db'}"
+
+    def _reset_pool(self):
+        self._pool = queue.LifoQueue()
+        self._pool_lock = threading.Lock()
+        self._pool_created = 0
+        self._pool_pid = os.getpid()
 
     def _connect(self):
-        return sqlite3.connect(self.db_name)
+        conn = sqlite3.connect(
+            self.db_name,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        # Se adjunta antes de los PRAGMA para que el historico tambien quede en WAL.
+        conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (self.archive_name,))
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self):
+        if self._pool_pid != os.getpid():
+            # Las conexiones SQLite no deben cruzar un fork (p. ej. workers de gunicorn).
+            self._reset_pool()
+
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._pool_lock:
+            if self._pool_created < self.pool_size:
+                self._pool_created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._pool_created -= 1
+                    raise
+
+        try:
+            return self._pool.get(timeout=POOL_TIMEOUT_SECONDS)
+        except queue.Empty:
+            raise sqlite3.OperationalError("No hay conexiones disponibles en el pool") from None
+
+    def _release(self, conn):
+        if self._pool_pid != os.getpid():
+            return
+        self._pool.put(conn)
+
+    @contextmanager
+    def _connection(self):
+        conn = self._acquire()
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._release(conn)
+
+    @contextmanager
+    def _write_transaction(self):
+        # BEGIN IMMEDIATE toma el bloqueo de escritura antes de leer la version
+        # de sincronizacion, asi dos escritores no pueden asignar la misma.
+        conn = self._acquire()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+        finally:
+            self._release(conn)
+
+    def add_change_listener(self, callback):
+        # callback() se llama despues de cada commit que escribe en change_log
+        # (sin argumentos y sin tocar SQLite: solo debe despertar a alguien).
+        self._change_listeners.append(callback)
+
+    def _notify_change(self):
+        for callback in list(self._change_listeners):
+            try:
+                callback()
+            except Exception:
+                logger.exception("Fallo un listener de cambios")
+
+    @staticmethod
+    def _next_sync_version(cursor):
+        cursor.execute("SELECT COALESCE(MAX(sync_version), 0) FROM conversations")
+        return cursor.fetchone()[0] + 1
+
+    def close(self):
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._pool_lock:
+                self._pool_created -= 1
 
     @staticmethod
     def _normalize_message_text(message):
@@ -87,66 +238,39 @@ class SQLiteRepository:
             pass
         return {"raw": normalized}
 
-    def init_schema(self):
-        with self._connect() as conn:
-            cursor = conn.cursor()
-
-            cursor.execute(
-                """
-                CREATE TABLE IF NOT EXISTS conversations (
-                    id TEXT PRIMARY KEY,
-                    canal TEXT,
-                    contact_name TEXT,
-                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-                """
-            )
-
-            cursor.execute(
-                """
-                CREATE TABLE IF NOT EXISTS messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    conversation_id TEXT,
-                    sender TEXT,
-                    message TEXT,
-                    message_type TEXT DEFAULT 'text',
-                    file_url TEXT,
-                    file_name TEXT,
-                    file_ext TEXT,
-                    metadata TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-                """
-            )
+    @staticmethod
+    def _enable_incremental_vacuum(conn, schema, vacuum=False):
+        # auto_vacuum solo cambia con un VACUUM. En un archivo sin tablas es
+        # inmediato; con datos reescribe todo el archivo, asi que se deja para el
+        # mantenimiento (enable_incremental_vacuum) y no para el arranque. Despues
+        # basta con "PRAGMA incremental_vacuum" para devolver paginas libres.
+        mode = conn.execute(f"PRAGMA {schema}.auto_vacuum").fetchone()[0]
+        if mode == AUTO_VACUUM_INCREMENTAL:
+            return False
+        empty = conn.execute(f"SELECT COUNT(*) FROM {schema}.sqlite_master").fetchone()[0] == 0
+        if not empty and not vacuum:
+            return False
+        conn.execute(f"PRAGMA {schema}.auto_vacuum = INCREMENTAL")
+        conn.execute(f"VACUUM {schema}")
+        return not empty
 
-            cursor.execute(
-                """
-                CREATE TABLE IF NOT EXISTS system_config (
-                    key TEXT PRIMARY KEY,
-                    value TEXT
-                )
-                """
-            )
+    def enable_incremental_vacuum(self):
+        # Devuelve los esquemas que se reescribieron con VACUUM (una sola vez por archivo).
+        with self._connection() as conn:
+            return [
+                schema
+                for schema in ("main", ARCHIVE_SCHEMA)
+                if self._enable_incremental_vacuum(conn, schema, vacuum=True)
+            ]
 
-            cursor.execute("PRAGMA table_info(conversations)")
-            conversation_columns = {row[1] for row in cursor.fetchall()}
-            if "contact_name" not in conversation_columns:
-                cursor.execute("ALTER TABLE conversations ADD COLUMN contact_name TEXT")
-
-            cursor.execute("PRAGMA table_info(messages)")
-            message_columns = {row[1] for row in cursor.fetchall()}
-            if "message_type" not in message_columns:
-                cursor.execute("ALTER TABLE messages ADD COLUMN message_type TEXT DEFAULT 'text'")
-            if "file_url" not in message_columns:
-                cursor.execute("ALTER TABLE messages ADD COLUMN file_url TEXT")
-            if "file_name" not in message_columns:
-                cursor.execute("ALTER TABLE messages ADD COLUMN file_name TEXT")
-            if "file_ext" not in message_columns:
-                cursor.execute("ALTER TABLE messages ADD COLUMN file_ext TEXT")
-            if "metadata" not in message_columns:
-                cursor.execute("ALTER TABLE messages ADD COLUMN metadata TEXT")
+    def init_schema(self):
+        with self._connection() as conn:
+            for schema in ("main", ARCHIVE_SCHEMA):
+                self._enable_incremental_vacuum(conn, schema)
+            ensure_archive_schema(conn)
+            apply_migrations(conn)
 
-    def save_message(
+    def prepare_message(
         self,
         conversation_id,
         canal,
@@ -158,6 +282,8 @@ class SQLiteRepository:
         file_name=None,
         file_ext=None,
         metadata=None,
+        external_id=None,
+        external_at=None,
     ):
         normalized_conversation_id = str(conversation_id or "").strip()
         normalized_canal = str(canal or "").strip() or "unknown"
@@ -168,6 +294,8 @@ class SQLiteRepository:
         normalized_file_name = self._normalize_optional_text(file_name)
         normalized_file_ext = self._normalize_optional_text(file_ext)
         normalized_metadata = self._normalize_metadata(metadata)
+        normalized_external_id = self._normalize_optional_text(external_id)
+        normalized_external_at = self._normalize_optional_text(external_at)
         normalized_message_type = self._normalize_message_type(
             message_type=message_type,
             has_file_url=bool(normalized_file_url),
@@ -183,14 +311,110 @@ class SQLiteRepository:
                 normalized_message = normalized_file_url
 
         if not normalized_message:
+            return None
+
+        return {
+            "conversation_id": normalized_conversation_id,
+            "canal": normalized_canal,
+            "sender": normalized_sender,
+            "message": normalized_message,
+            "contact_name": normalized_contact_name,
+            "message_type": normalized_message_type,
+            "file_url": normalized_file_url,
+            "file_name": normalized_file_name,
+            "file_ext": normalized_file_ext,
+            "metadata": normalized_metadata,
+            "external_id": normalized_external_id,
+            "external_at": normalized_external_at,
+        }
+
+    def save_message(
+        self,
+        conversation_id,
+        canal,
+        sender,
+        message,
+        contact_name=None,
+        message_type=None,
+        file_url=None,
+        file_name=None,
+        file_ext=None,
+        metadata=None,
+        external_id=None,
+        external_at=None,
+    ):
+        prepared = self.prepare_message(
+            conversation_id=conversation_id,
+            canal=canal,
+            sender=sender,
+            message=message,
+            contact_name=contact_name,
+            message_type=message_type,
+            file_url=file_url,
+            file_name=file_name,
+            file_ext=file_ext,
+            metadata=metadata,
+            external_id=external_id,
+            external_at=external_at,
+        )
+        if prepared is None:
             return False
+        return self.save_messages([prepared])[0]
 
-        with self._connect() as conn:
+    @staticmethod
+    def _filter_duplicates(cursor, messages):
+        # Un reintento de LiveConnect trae el mismo id externo: se descarta con
+        # una consulta al indice unico (conversation_id, external_id).
+        accepted = []
+        saved = []
+        seen = set()
+        for message in messages:
+            external_id = message.get("external_id")
+            if external_id:
+                key = (message["conversation_id"], external_id)
+                if key in seen:
+                    saved.append(False)
+                    continue
+                cursor.execute(
+                    "SELECT 1 FROM messages WHERE conversation_id = ? AND external_id = ?",
+                    key,
+                )
+                if cursor.fetchone():
+                    saved.append(False)
+                    continue
+                seen.add(key)
+            accepted.append(message)
+            saved.append(True)
+        return accepted, saved
+
+    def save_messages(self, messages):
+        # Recibe mensajes ya normalizados por prepare_message y los persiste en una
+        # sola transaccion (un solo commit para todo el lote).
+        if not messages:
+            return []
+
+        with self._write_transaction() as conn:
             cursor = conn.cursor()
-            cursor.execute(
+            messages, saved = self._filter_duplicates(cursor, messages)
+            if not messages:
+                return saved
+            base_version = self._next_sync_version(cursor)
+            cursor.executemany(
                 """
-                INSERT INTO conversations (id, canal, contact_name, updated_at)
-                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                INSERT INTO conversations (
+                    id,
+                    canal,
+                    contact_name,
+                    updated_at,
+                    sync_version,
+                    last_message,
+                    last_message_type,
+                    last_sender,
+                    message_count,
+                    unread_count,
+                    last_external_at
+                )
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP, ?, ?, ?, ?, 1, ?, ?)
                 ON CONFLICT(id) DO UPDATE SET
                     canal = excluded.canal,
                     contact_name = CASE
@@ -198,11 +422,35 @@ class SQLiteRepository:
                         THEN conversations.contact_name
                         ELSE excluded.contact_name
                     END,
-                    updated_at = CURRENT_TIMESTAMP
+                    updated_at = CURRENT_TIMESTAMP,
+                    sync_version = excluded.sync_version,
+                    last_message = excluded.last_message,
+                    last_message_type = excluded.last_message_type,
+                    last_sender = excluded.last_sender,
+                    message_count = conversations.message_count + 1,
+                    unread_count = CASE
+                        WHEN excluded.last_sender = 'usuario'
+                        THEN conversations.unread_count + 1
+                        ELSE 0
+                    END,
+                    last_external_at = COALESCE(excluded.last_external_at, conversations.last_external_at)
                 """,
-                (normalized_conversation_id, normalized_canal, normalized_contact_name),
+                [
+                    (
+                        message["conversation_id"],
+                        message["canal"],
+                        message["contact_name"],
+                        base_version + offset,
+                        message["message"],
+                        message["message_type"],
+                        message["sender"],
+                        1 if message["sender"] == "usuario" else 0,
+                        message.get("external_at"),
+                    )
+                    for offset, message in enumerate(messages)
+                ],
             )
-            cursor.execute(
+            cursor.executemany(
                 """
                 INSERT INTO messages (
                     conversation_id,
@@ -212,69 +460,422 @@ class SQLiteRepository:
                     file_url,
                     file_name,
                     file_ext,
-                    metadata
+                    metadata,
+                    external_id
                 )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (conversation_id, external_id) DO NOTHING
                 """,
-                (
-                    normalized_conversation_id,
-                    normalized_sender,
-                    normalized_message,
-                    normalized_message_type,
-                    normalized_file_url,
-                    normalized_file_name,
-                    normalized_file_ext,
-                    normalized_metadata,
-                ),
+                [
+                    (
+                        message["conversation_id"],
+                        message["sender"],
+                        message["message"],
+                        message["message_type"],
+                        message["file_url"],
+                        message["file_name"],
+                        message["file_ext"],
+                        message["metadata"],
+                        message.get("external_id"),
+                    )
+                    for message in messages
+                ],
             )
-        return True
+        self._notify_change()
+        return saved
 
-    def list_conversations(self):
-        with self._connect() as conn:
+    @staticmethod
+    def _limit_value(limit):
+        # SQLite interpreta LIMIT -1 como "sin limite".
+        return -1 if limit is None else int(limit)
+
+    def list_conversations(self, limit=None, before=None, after=None, since=None):
+        order = "DESC"
+        order_by = "updated_at {order}, id {order}"
+        where = ""
+        params = []
+        if since is not None:
+            # Delta: conversaciones modificadas despues de la version indicada.
+            where = "WHERE sync_version > ?"
+            params.append(since)
+            order = "ASC"
+            order_by = "sync_version {order}"
+        elif before is not None:
+            where = "WHERE (updated_at, id) < (?, ?)"
+            params.extend(before)
+        elif after is not None:
+            where = "WHERE (updated_at, id) > (?, ?)"
+            params.extend(after)
+            order = "ASC"
+        params.append(self._limit_value(limit))
+
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                """
-                SELECT id, canal, contact_name, updated_at
+                f"""
+                SELECT
+                    id,
+                    canal,
+                    contact_name,
+                    updated_at,
+                    sync_version,
+                    last_message,
+                    last_message_type,
+                    last_sender,
+                    message_count,
+                    unread_count,
+                    last_external_at
                 FROM conversations
-                ORDER BY updated_at DESC
-                """
+                {where}
+                ORDER BY {order_by.format(order=order)}
+                LIMIT ?
+                """,
+                params,
             )
             rows = cursor.fetchall()
+        if order == "ASC" and since is None:
+            rows.reverse()
         return [
-            {"id": row[0], "canal": row[1], "contact_name": row[2], "updated_at": row[3]}
+            {
+                "id": row[0],
+                "canal": row[1],
+                "contact_name": row[2],
+                "updated_at": row[3],
+                "sync_version": row[4],
+                "last_message": row[5],
+                "last_message_type": row[6],
+                "last_sender": row[7],
+                "message_count": row[8],
+                "unread_count": row[9],
+                "last_external_at": row[10],
+            }
             for row in rows
         ]
 
-    def list_messages(self, conversation_id):
-        with self._connect() as conn:
+    def conversation_channels(self, conversation_ids=None, canal=None, limit=None):
+        # {id: canal} de las conversaciones pedidas (o de todas las de un canal).
+        criteria = []
+        params = []
+        if conversation_ids is not None:
+            criteria.append("id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps([str(conversation_id) for conversation_id in conversation_ids]))
+        if canal is not None:
+            criteria.append("canal = ?")
+            params.append(str(canal))
+        where = f"WHERE {' AND '.join(criteria)}" if criteria else ""
+        with self._connection() as conn:
+            rows = conn.execute(
+                f"SELECT id, canal FROM conversations {where} ORDER BY id LIMIT ?",
+                (*params, self._limit_value(limit)),
+            ).fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def get_sync_version(self, conversation_id=None):
+        with self._connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(
-                """
-                SELECT sender, message, message_type, file_url, file_name, file_ext, metadata, created_at
-                FROM messages
+            if conversation_id is None:
+                cursor.execute("SELECT COALESCE(MAX(sync_version), 0) FROM conversations")
+            else:
+                cursor.execute(
+                    "SELECT sync_version FROM conversations WHERE id = ?",
+                    (conversation_id,),
+                )
+            row = cursor.fetchone()
+        return row[0] if row and row[0] is not None else 0
+
+    def list_messages(self, conversation_id, limit=None, before=None, after=None, include_archive=False):
+        # Sin cursor y con limite se devuelve la pagina mas reciente; el resultado
+        # siempre sale en orden cronologico.
+        order = "ASC" if limit is None else "DESC"
+        keyset = ""
+        keyset_params = []
+        if before is not None:
+            keyset = "AND (created_at, id) < (?, ?)"
+            keyset_params.extend(before)
+            order = "DESC"
+        elif after is not None:
+            keyset = "AND (created_at, id) > (?, ?)"
+            keyset_params.extend(after)
+            order = "ASC"
+
+        sources = ["messages"]
+        if include_archive:
+            sources.append(f"{ARCHIVE_SCHEMA}.archived_messages")
+        # Cada tabla filtra con su propio indice; UNION descarta la copia que
+        # pueda quedar en ambos archivos si un archivado se interrumpio.
+        selects = []
+        params = []
+        for source in sources:
+            selects.append(
+                f"""
+                SELECT id, sender, message, message_type, file_url, file_name, file_ext, metadata, created_at
+                FROM {source}
                 WHERE conversation_id = ?
+                {keyset}
                 AND TRIM(COALESCE(message, '')) <> ''
-                ORDER BY created_at ASC, id ASC
+                """
+            )
+            params.append(conversation_id)
+            params.extend(keyset_params)
+        params.append(self._limit_value(limit))
+
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""
+                {" UNION ".join(selects)}
+                ORDER BY created_at {order}, id {order}
+                LIMIT ?
+                """,
+                params,
+            )
+            rows = cursor.fetchall()
+        if order == "DESC":
+            rows.reverse()
+        # Adjuntos con copia local (media_sources): la UI los carga desde /media.
+        mirrored = self.media_for_urls([row[4] for row in rows])
+        return [
+            {
+                "id": row[0],
+                "sender": row[1],
+                "message": row[2],
+                "message_type": row[3],
+                "file_url": row[4],
+                "file_name": row[5],
+                "file_ext": row[6],
+                "local_file_url": f"/media/{mirrored[row[4]]}" if row[4] in mirrored else None,
+                "metadata": self._deserialize_metadata(row[7]),
+                "created_at": row[8],
+            }
+            for row in rows
+        ]
+
+    def max_message_id(self):
+        with self._connection() as conn:
+            return conn.execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0]
+
+    def max_change_seq(self):
+        with self._connection() as conn:
+            return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+
+    def changes_after(self, after_seq, limit=None):
+        with self._connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT seq, entity, entity_id, conversation_id, op, created_at
+                FROM change_log
+                WHERE seq > ?
+                ORDER BY seq
+                LIMIT ?
                 """,
-                (conversation_id,),
+                (int(after_seq), self._limit_value(limit)),
+            ).fetchall()
+        return [
+            {
+                "seq": row[0],
+                "entity": row[1],
+                "entity_id": row[2],
+                "conversation_id": row[3],
+                "op": row[4],
+                "created_at": row[5],
+            }
+            for row in rows
+        ]
+
+    def prune_change_log(self, older_than_days):
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "DELETE FROM change_log WHERE created_at < datetime('now', ?)",
+                (f"-{int(older_than_days)} days",),
+            )
+            return cursor.rowcount
+
+    def open_change_probe(self):
+        # Conexion propia de solo lectura: PRAGMA data_version cambia con cada
+        # commit de otra conexion (tambien de otro proceso) sin leer ninguna tabla.
+        return sqlite3.connect(self.db_name, timeout=self.busy_timeout_ms / 1000, check_same_thread=False)
+
+    @staticmethod
+    def data_version(conn):
+        return conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def message_events_after(self, after_id, limit=None):
+        # Mensajes con id > after_id (orden de insercion) junto al resumen actual
+        # de su conversacion; recorre la clave primaria, sin ordenar.
+        with self._connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT
+                    m.id, m.conversation_id, m.sender, m.message, m.message_type,
+                    m.file_url, m.file_name, m.file_ext, m.metadata, m.created_at,
+                    c.canal, c.contact_name, c.updated_at, c.sync_version, c.last_message,
+                    c.last_message_type, c.last_sender, c.message_count, c.unread_count, c.last_external_at,
+                    s.sha256
+                FROM messages m
+                JOIN conversations c ON c.id = m.conversation_id
+                LEFT JOIN media_sources s ON s.url = m.file_url
+                WHERE m.id > ?
+                ORDER BY m.id
+                LIMIT ?
+                """,
+                (int(after_id), self._limit_value(limit)),
+            ).fetchall()
+        return [
+            (
+                {
+                    "id": row[0],
+                    "conversation_id": row[1],
+                    "sender": row[2],
+                    "message": row[3],
+                    "message_type": row[4],
+                    "file_url": row[5],
+                    "file_name": row[6],
+                    "file_ext": row[7],
+                    "local_file_url": f"/media/{row[20]}" if row[20] else None,
+                    "metadata": self._deserialize_metadata(row[8]),
+                    "created_at": row[9],
+                },
+                {
+                    "id": row[1],
+                    "canal": row[10],
+                    "contact_name": row[11],
+                    "updated_at": row[12],
+                    "sync_version": row[13],
+                    "last_message": row[14],
+                    "last_message_type": row[15],
+                    "last_sender": row[16],
+                    "message_count": row[17],
+                    "unread_count": row[18],
+                    "last_external_at": row[19],
+                },
+            )
+            for row in rows
+        ]
+
+    def archive_messages(self, older_than_days=None, inactive_days=None, batch_size=ARCHIVE_BATCH_SIZE):
+        # Mueve al archivo de historico los mensajes antiguos y los de conversaciones
+        # inactivas, en lotes cortos para no bloquear al webhook mientras corre.
+        criteria = []
+        params = []
+        if older_than_days is not None:
+            criteria.append("created_at < datetime('now', ?)")
+            params.append(f"-{int(older_than_days)} days")
+        if inactive_days is not None:
+            criteria.append(
+                "conversation_id IN (SELECT id FROM conversations WHERE updated_at < datetime('now', ?))"
+            )
+            params.append(f"-{int(inactive_days)} days")
+        if not criteria:
+            raise ValueError("older_than_days o inactive_days es requerido")
+        batch_size = max(1, int(batch_size))
+
+        archived = 0
+        freed_pages = 0
+        while True:
+            with self._write_transaction() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    f"SELECT id FROM messages WHERE {' OR '.join(criteria)} ORDER BY id LIMIT ?",
+                    (*params, batch_size),
+                )
+                batch_ids = json.dumps([row[0] for row in cursor.fetchall()])
+                cursor.execute(
+                    f"""
+                    INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.archived_messages (
+                        id, conversation_id, sender, message, message_type,
+                        file_url, file_name, file_ext, metadata, external_id, created_at
+                    )
+                    SELECT
+                        id, conversation_id, sender, message, message_type,
+                        file_url, file_name, file_ext, metadata, external_id, created_at
+                    FROM messages
+                    WHERE id IN (SELECT value FROM json_each(?))
+                    """,
+                    (batch_ids,),
+                )
+                cursor.execute(
+                    "DELETE FROM messages WHERE id IN (SELECT value FROM json_each(?))",
+                    (batch_ids,),
+                )
+                moved = cursor.rowcount
+            if moved <= 0:
+                break
+            self._notify_change()
+            archived += moved
+            freed_pages += self.compact()
+            if moved < batch_size:
+                break
+        return {"archived": archived, "freed_pages": freed_pages}
+
+    def compact(self, max_pages=None):
+        # executescript recorre el PRAGMA hasta el final; execute() solo libera una pagina.
+        pages = "" if max_pages is None else f"({int(max_pages)})"
+        with self._connection() as conn:
+            before = conn.execute("PRAGMA main.freelist_count").fetchone()[0]
+            conn.executescript(f"PRAGMA main.incremental_vacuum{pages}")
+            after = conn.execute("PRAGMA main.freelist_count").fetchone()[0]
+        return before - after
+
+    def search_messages(self, match_query, limit=None, conversation_id=None, canal=None, offset=0, max_id=None):
+        # Orden por relevancia (bm25, pesando texto > nombre de archivo > links) y
+        # luego por id. max_id fija el conjunto de mensajes entre paginas.
+        filters = []
+        params = [match_query]
+        if conversation_id:
+            filters.append("AND messages_fts.conversation_id = ?")
+            params.append(conversation_id)
+        if canal:
+            filters.append("AND conversations.canal = ?")
+            params.append(canal)
+        if max_id is not None:
+            filters.append("AND messages.id <= ?")
+            params.append(max_id)
+        params.extend((self._limit_value(limit), offset))
+
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""
+                SELECT
+                    messages.id,
+                    messages.conversation_id,
+                    conversations.canal,
+                    conversations.contact_name,
+                    messages.sender,
+                    messages.message,
+                    messages.message_type,
+                    messages.created_at,
+                    snippet(messages_fts, -1, char(2), char(3), '...', 12),
+                    {SEARCH_RANK_SQL} AS rank
+                FROM messages_fts
+                JOIN messages ON messages.id = messages_fts.rowid
+                LEFT JOIN conversations ON conversations.id = messages.conversation_id
+                WHERE messages_fts MATCH ?
+                {" ".join(filters)}
+                ORDER BY rank, messages.id
+                LIMIT ? OFFSET ?
+                """,
+                params,
             )
             rows = cursor.fetchall()
         return [
             {
-                "sender": row[0],
-                "message": row[1],
-                "message_type": row[2],
-                "file_url": row[3],
-                "file_name": row[4],
-                "file_ext": row[5],
-                "metadata": self._deserialize_metadata(row[6]),
+                "id": row[0],
+                "conversation_id": row[1],
+                "canal": row[2],
+                "contact_name": row[3],
+                "sender": row[4],
+                "message": row[5],
+                "message_type": row[6],
                 "created_at": row[7],
+                "snippet": row[8],
+                "rank": row[9],
             }
             for row in rows
         ]
 
     def save_balance(self, balance_data):
-        with self._connect() as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """
@@ -285,7 +886,7 @@ class SQLiteRepository:
             )
 
     def get_cached_balance(self):
-        with self._connect() as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """
@@ -301,6 +902,205 @@ class SQLiteRepository:
         return None
 
 
+    def save_token(self, token_data):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                INSERT OR REPLACE INTO system_config (key, value)
+                VALUES (?, ?)
+                """,
+                ("liveconnect_token", json.dumps(token_data)),
+            )
+
+    def get_cached_token(self):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT value FROM system_config
+                WHERE key = ?
+                """,
+                ("liveconnect_token",),
+            )
+            row = cursor.fetchone()
+
+        if row:
+            return json.loads(row[0])
+        return None
+
+    @staticmethod
+    def _outbox_row(row):
+        return {
+            "id": row[0],
+            "kind": row[1],
+            "conversation_id": row[2],
+            "payload": json.loads(row[3]),
+            "status": row[4],
+            "attempts": row[5],
+            "last_error": row[6],
+            "result": json.loads(row[7]) if row[7] else None,
+            "created_at": row[8],
+            "updated_at": row[9],
+        }
+
+    def enqueue_outbox(self, kind, conversation_id, payload):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO outbox (kind, conversation_id, payload) VALUES (?, ?, ?)",
+                (kind, str(conversation_id), json.dumps(payload, ensure_ascii=False)),
+            )
+            return cursor.lastrowid
+
+    def get_outbox(self, outbox_id):
+        with self._connection() as conn:
+            row = conn.execute(
+                f"SELECT {OUTBOX_COLUMNS} FROM outbox WHERE id = ?",
+                (outbox_id,),
+            ).fetchone()
+        return self._outbox_row(row) if row else None
+
+    def claim_outbox(self, limit=1, lease_seconds=OUTBOX_LEASE_SECONDS, now=None):
+        # Solo se toma la cabeza de cada conversacion: mientras un envio esta en
+        # curso (lease vigente) el siguiente de esa conversacion espera. Un lease
+        # vencido (proceso caido a mitad de envio) vuelve a ser reclamable.
+        now = time.time() if now is None else now
+        with self._write_transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT id FROM outbox
+                WHERE id IN (
+                    SELECT MIN(id) FROM outbox
+                    WHERE status IN ('pending', 'sending')
+                    GROUP BY conversation_id
+                )
+                AND (
+                    (status = 'pending' AND next_attempt_at <= ?)
+                    OR (status = 'sending' AND locked_until <= ?)
+                )
+                ORDER BY id
+                LIMIT ?
+                """,
+                (now, now, max(1, int(limit))),
+            )
+            claimed_ids = json.dumps([row[0] for row in cursor.fetchall()])
+            cursor.execute(
+                f"""
+                UPDATE outbox
+                SET status = 'sending', attempts = attempts + 1, locked_until = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id IN (SELECT value FROM json_each(?))
+                RETURNING {OUTBOX_COLUMNS}
+                """,
+                (now + lease_seconds, claimed_ids),
+            )
+            rows = cursor.fetchall()
+        return sorted((self._outbox_row(row) for row in rows), key=lambda item: item["id"])
+
+    def finish_outbox(self, outbox_id, status, result=None, error=None, next_attempt_at=None):
+        # status: sent | failed (terminales) o pending para reintentar en next_attempt_at.
+        with self._connection() as conn:
+            conn.execute(
+                """
+                UPDATE outbox
+                SET status = ?, result = ?, last_error = ?, next_attempt_at = COALESCE(?, next_attempt_at),
+                    locked_until = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+                """,
+                (
+                    status,
+                    json.dumps(result, ensure_ascii=False) if result is not None else None,
+                    error,
+                    next_attempt_at,
+                    outbox_id,
+                ),
+            )
+
+    def save_media(self, sha256, size, content_type=None, file_name=None):
+        # El contenido es el mismo para un mismo sha256: se conserva el primer registro.
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO media (sha256, size, content_type, file_name) VALUES (?, ?, ?, ?)",
+                (sha256, int(size), content_type, file_name),
+            )
+
+    def get_media(self, sha256):
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT sha256, size, content_type, file_name, created_at FROM media WHERE sha256 = ?",
+                (sha256,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"sha256": row[0], "size": row[1], "content_type": row[2], "file_name": row[3], "created_at": row[4]}
+
+    def link_media_source(self, url, sha256):
+        # Los mensajes que ya tenian ese adjunto ganan local_file_url: se sube el
+        # sync_version de sus conversaciones (cambia el ETag de /messages) y se
+        # registra un cambio "media" por mensaje para el stream de eventos.
+        with self._write_transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT sha256 FROM media_sources WHERE url = ?", (url,))
+            row = cursor.fetchone()
+            if row is not None and row[0] == sha256:
+                return
+            cursor.execute(
+                "INSERT OR REPLACE INTO media_sources (url, sha256) VALUES (?, ?)",
+                (url, sha256),
+            )
+            cursor.execute(
+                """
+                INSERT INTO change_log (entity, entity_id, conversation_id, op)
+                SELECT 'message', id, conversation_id, 'media'
+                FROM messages
+                WHERE file_url = ?
+                ORDER BY id
+                """,
+                (url,),
+            )
+            if cursor.rowcount > 0:
+                cursor.execute(
+                    """
+                    UPDATE conversations SET sync_version = ?
+                    WHERE id IN (SELECT conversation_id FROM messages WHERE file_url = ?)
+                    """,
+                    (self._next_sync_version(cursor), url),
+                )
+        self._notify_change()
+
+    def message_media(self, message_ids):
+        # [(id, conversation_id, local_file_url)] de los mensajes con copia local.
+        message_ids = [int(message_id) for message_id in message_ids]
+        if not message_ids:
+            return []
+        with self._connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT m.id, m.conversation_id, s.sha256
+                FROM messages m
+                JOIN media_sources s ON s.url = m.file_url
+                WHERE m.id IN (SELECT value FROM json_each(?))
+                ORDER BY m.id
+                """,
+                (json.dumps(message_ids),),
+            ).fetchall()
+        return [(row[0], row[1], f"/media/{row[2]}") for row in rows]
+
+    def media_for_urls(self, urls):
+        # {url remota: sha256} de las URLs que ya tienen copia local.
+        urls = [url for url in dict.fromkeys(urls) if url]
+        if not urls:
+            return {}
+        with self._connection() as conn:
+            rows = conn.execute(
+                "SELECT url, sha256 FROM media_sources WHERE url IN (SELECT value FROM json_each(?))",
+                (json.dumps(urls),),
+            ).fetchall()
+        return dict(rows)
+
+
 default_repository = SQLiteRepository()
 
 
@@ -323,6 +1123,8 @@ def save_message(
     file_name=None,
     file_ext=None,
     metadata=None,
+    external_id=None,
+    external_at=None,
 ):
     return default_repository.save_message(
         conversation_id=conversation_id,
@@ -335,15 +1137,50 @@ def save_message(
         file_name=file_name,
         file_ext=file_ext,
         metadata=metadata,
+        external_id=external_id,
+        external_at=external_at,
     )
 
 
-def get_conversations():
-    return default_repository.list_conversations()
+def get_conversations(limit=None, before=None, after=None, since=None):
+    return default_repository.list_conversations(limit=limit, before=before, after=after, since=since)
+
+
+def get_sync_version(conversation_id=None):
+    return default_repository.get_sync_version(conversation_id)
+
+
+def get_messages(conversation_id, limit=None, before=None, after=None, include_archive=False):
+    return default_repository.list_messages(
+        conversation_id,
+        limit=limit,
+        before=before,
+        after=after,
+        include_archive=include_archive,
+    )
+
+
+def archive_messages(older_than_days=None, inactive_days=None, batch_size=ARCHIVE_BATCH_SIZE):
+    return default_repository.archive_messages(
+        older_than_days=older_than_days,
+        inactive_days=inactive_days,
+        batch_size=batch_size,
+    )
+
+
+def search_messages(match_query, limit=None, conversation_id=None, canal=None, offset=0, max_id=None):
+    return default_repository.search_messages(
+        match_query,
+        limit=limit,
+        conversation_id=conversation_id,
+        canal=canal,
+        offset=offset,
+        max_id=max_id,
+    )
 
 
-def get_messages(conversation_id):
-    return default_repository.list_messages(conversation_id)
+def max_message_id():
+    return default_repository.max_message_id()
 
 
 def save_balance(balance_data):
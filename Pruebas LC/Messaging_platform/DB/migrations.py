@@ -0,0 +1,482 @@
+import sqlite3
+
+ARCHIVE_SCHEMA = "archive"
+
+
+def _create_base_schema(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS conversations (
+            id TEXT PRIMARY KEY,
+            canal TEXT,
+            contact_name TEXT,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            conversation_id TEXT,
+            sender TEXT,
+            message TEXT,
+            message_type TEXT DEFAULT 'text',
+            file_url TEXT,
+            file_name TEXT,
+            file_ext TEXT,
+            metadata TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS system_config (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+        """
+    )
+
+    # Bases creadas antes del sistema de migraciones pueden no tener estas columnas.
+    cursor.execute("PRAGMA table_info(conversations)")
+    conversation_columns = {row[1] for row in cursor.fetchall()}
+    if "contact_name" not in conversation_columns:
+        cursor.execute("ALTER TABLE conversations ADD COLUMN contact_name TEXT")
+
+    cursor.execute("PRAGMA table_info(messages)")
+    message_columns = {row[1] for row in cursor.fetchall()}
+    if "message_type" not in message_columns:
+        cursor.execute("ALTER TABLE messages ADD COLUMN message_type TEXT DEFAULT 'text'")
+    if "file_url" not in message_columns:
+        cursor.execute("ALTER TABLE messages ADD COLUMN file_url TEXT")
+    if "file_name" not in message_columns:
+        cursor.execute("ALTER TABLE messages ADD COLUMN file_name TEXT")
+    if "file_ext" not in message_columns:
+        cursor.execute("ALTER TABLE messages ADD COLUMN file_ext TEXT")
+    if "metadata" not in message_columns:
+        cursor.execute("ALTER TABLE messages ADD COLUMN metadata TEXT")
+
+
+def _create_list_indexes(cursor):
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_messages_conversation_created
+        ON messages (conversation_id, created_at, id)
+        """
+    )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_conversations_updated
+        ON conversations (updated_at, id)
+        """
+    )
+
+
+def _add_conversation_sync_version(cursor):
+    # Version monotona por conversacion: cada escritura asigna MAX(sync_version) + 1.
+    cursor.execute("ALTER TABLE conversations ADD COLUMN sync_version INTEGER NOT NULL DEFAULT 0")
+    cursor.execute(
+        """
+        UPDATE conversations
+        SET sync_version = ranked.position
+        FROM (
+            SELECT id, ROW_NUMBER() OVER (ORDER BY updated_at, id) AS position
+            FROM conversations
+        ) AS ranked
+        WHERE ranked.id = conversations.id
+        """
+    )
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_conversations_sync_version
+        ON conversations (sync_version)
+        """
+    )
+
+
+def _add_message_external_id(cursor):
+    cursor.execute("ALTER TABLE messages ADD COLUMN external_id TEXT")
+    # Solo la primera aparicion de cada id externo hereda la columna; los
+    # reintentos ya guardados quedan con NULL para no romper el indice unico.
+    cursor.execute(
+        """
+        UPDATE messages
+        SET external_id = candidate.external_id
+        FROM (
+            SELECT MIN(id) AS id, external_id
+            FROM (
+                SELECT
+                    id,
+                    conversation_id,
+                    CAST(
+                        CASE WHEN json_valid(metadata) THEN
+                            COALESCE(
+                                json_extract(metadata, '$.messageUID'),
+                                json_extract(metadata, '$.messageId')
+                            )
+                        END AS TEXT
+                    ) AS external_id
+                FROM messages
+            )
+            WHERE external_id IS NOT NULL AND external_id <> ''
+            GROUP BY conversation_id, external_id
+        ) AS candidate
+        WHERE messages.id = candidate.id
+        """
+    )
+    cursor.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_external_id
+        ON messages (conversation_id, external_id)
+        """
+    )
+
+
+def _add_conversation_summary(cursor):
+    cursor.execute("ALTER TABLE conversations ADD COLUMN last_message TEXT")
+    cursor.execute("ALTER TABLE conversations ADD COLUMN last_message_type TEXT")
+    cursor.execute("ALTER TABLE conversations ADD COLUMN last_sender TEXT")
+    cursor.execute("ALTER TABLE conversations ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("ALTER TABLE conversations ADD COLUMN unread_count INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("ALTER TABLE conversations ADD COLUMN last_external_at TEXT")
+    cursor.execute(
+        """
+        UPDATE conversations
+        SET
+            last_message = latest.message,
+            last_message_type = latest.message_type,
+            last_sender = latest.sender,
+            message_count = stats.total,
+            last_external_at = CASE
+                WHEN json_valid(latest.metadata)
+                THEN CAST(json_extract(latest.metadata, '$.timestamp') AS TEXT)
+            END
+        FROM (
+            SELECT conversation_id, COUNT(*) AS total, MAX(id) AS last_id
+            FROM messages
+            GROUP BY conversation_id
+        ) AS stats
+        JOIN messages AS latest ON latest.id = stats.last_id
+        WHERE conversations.id = stats.conversation_id
+        """
+    )
+    # Pendientes = mensajes del usuario despues de la ultima respuesta del agente.
+    cursor.execute(
+        """
+        UPDATE conversations
+        SET unread_count = (
+            SELECT COUNT(*) FROM messages
+            WHERE messages.conversation_id = conversations.id
+            AND messages.sender = 'usuario'
+            AND messages.id > COALESCE((
+                SELECT MAX(reply.id) FROM messages AS reply
+                WHERE reply.conversation_id = conversations.id
+                AND reply.sender <> 'usuario'
+            ), 0)
+        )
+        """
+    )
+
+
+MESSAGES_FTS_LINKS_SQL = """
+    CASE WHEN json_valid({row}.metadata) THEN (
+        SELECT group_concat(value, ' ') FROM json_each({row}.metadata, '$.links')
+    ) END
+"""
+
+
+def _create_messages_fts(cursor):
+    cursor.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+            message,
+            file_name,
+            links,
+            conversation_id UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+        """
+    )
+    new_links = MESSAGES_FTS_LINKS_SQL.format(row="new")
+    cursor.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts (rowid, message, file_name, links, conversation_id)
+            VALUES (new.id, new.message, new.file_name, {new_links}, new.conversation_id);
+        END
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+            DELETE FROM messages_fts WHERE rowid = old.id;
+        END
+        """
+    )
+    cursor.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS messages_fts_update
+        AFTER UPDATE OF message, file_name, metadata, conversation_id ON messages BEGIN
+            DELETE FROM messages_fts WHERE rowid = old.id;
+            INSERT INTO messages_fts (rowid, message, file_name, links, conversation_id)
+            VALUES (new.id, new.message, new.file_name, {new_links}, new.conversation_id);
+        END
+        """
+    )
+    cursor.execute("DELETE FROM messages_fts")
+    cursor.execute(
+        f"""
+        INSERT INTO messages_fts (rowid, message, file_name, links, conversation_id)
+        SELECT id, message, file_name, {MESSAGES_FTS_LINKS_SQL.format(row="messages")}, conversation_id
+        FROM messages
+        """
+    )
+
+
+def _create_outbox(cursor):
+    # Envios salientes pendientes: sobreviven a un reinicio y se entregan en orden
+    # por conversacion. Los tiempos de reintento y lease son epoch en segundos.
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            conversation_id TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL DEFAULT 0,
+            locked_until REAL,
+            last_error TEXT,
+            result TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    # Solo los envios activos: el indice no crece con el historico entregado.
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_outbox_active_conversation
+        ON outbox (conversation_id, id)
+        WHERE status IN ('pending', 'sending')
+        """
+    )
+
+
+def _create_media(cursor):
+    # Archivos guardados localmente, direccionados por su sha256; media_sources
+    # recuerda que URL remota ya se espejo y con que contenido.
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS media (
+            sha256 TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            content_type TEXT,
+            file_name TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS media_sources (
+            url TEXT PRIMARY KEY,
+            sha256 TEXT NOT NULL REFERENCES media (sha256),
+            mirrored_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+
+CHANGE_LOG_TRIGGERS = (
+    ("change_log_message_insert", "AFTER INSERT ON messages", "'message'", "new.id", "new.conversation_id", "'insert'"),
+    ("change_log_message_update", "AFTER UPDATE ON messages", "'message'", "new.id", "new.conversation_id", "'update'"),
+    ("change_log_message_delete", "AFTER DELETE ON messages", "'message'", "old.id", "old.conversation_id", "'delete'"),
+    ("change_log_conversation_insert", "AFTER INSERT ON conversations", "'conversation'", "new.id", "new.id", "'insert'"),
+    ("change_log_conversation_update", "AFTER UPDATE ON conversations", "'conversation'", "new.id", "new.id", "'update'"),
+    ("change_log_conversation_delete", "AFTER DELETE ON conversations", "'conversation'", "old.id", "old.id", "'delete'"),
+)
+
+
+def _create_change_log(cursor):
+    # Una fila por cambio de mensajes o conversaciones, escrita por triggers en la
+    # misma transaccion que el cambio. SQLite tiene un solo escritor, asi que el
+    # orden de seq es el orden de commit: leer seq > cursor no se salta nada.
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT NOT NULL,
+            entity_id TEXT NOT NULL,
+            conversation_id TEXT,
+            op TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    for name, event, entity, entity_id, conversation_id, op in CHANGE_LOG_TRIGGERS:
+        cursor.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN
+                INSERT INTO change_log (entity, entity_id, conversation_id, op)
+                VALUES ({entity}, {entity_id}, {conversation_id}, {op});
+            END
+            """
+        )
+
+
+def _metadata_id_part(key):
+    return f"""
+        CASE WHEN json_type(metadata, '$.{key}') IN ('text', 'integer') THEN
+            NULLIF(TRIM(CAST(json_extract(metadata, '$.{key}') AS TEXT)), '')
+        END
+    """
+
+
+def _rekey_message_external_id(cursor):
+    # LiveConnect repite el messageUID entre eventos de un mismo mensaje (tipo 0
+    # con el texto, tipo 2 con la tarjeta del documento): la clave pasa a ser
+    # "<messageUID>:<tipo>", como en webhook_service._extract_external_id. Las
+    # filas sin ids de LiveConnect (outbox:, broadcast:, ...) no se tocan.
+    external_id = f"""
+        CASE WHEN json_valid(metadata) THEN
+            COALESCE({_metadata_id_part("messageUID")}, {_metadata_id_part("messageId")})
+            || COALESCE(':' || {_metadata_id_part("tipo")}, '')
+        END
+    """
+    cursor.execute(
+        f"""
+        CREATE TEMP TABLE rekeyed_messages AS
+        SELECT id, conversation_id, {external_id} AS external_id
+        FROM messages
+        WHERE metadata IS NOT NULL
+        """
+    )
+    cursor.execute("DELETE FROM rekeyed_messages WHERE external_id IS NULL")
+    cursor.execute(
+        """
+        UPDATE messages SET external_id = NULL
+        WHERE id IN (SELECT id FROM rekeyed_messages) AND external_id IS NOT NULL
+        """
+    )
+    # Como en el paso 4, solo la primera aparicion de cada clave la conserva.
+    cursor.execute(
+        """
+        UPDATE messages
+        SET external_id = candidate.external_id
+        FROM (
+            SELECT MIN(id) AS id, external_id
+            FROM rekeyed_messages
+            GROUP BY conversation_id, external_id
+        ) AS candidate
+        WHERE messages.id = candidate.id
+        """
+    )
+    cursor.execute("DROP TABLE rekeyed_messages")
+
+
+def _create_message_file_url_index(cursor):
+    # link_media_source busca los mensajes que referencian una URL espejada.
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_messages_file_url
+        ON messages (file_url)
+        WHERE file_url IS NOT NULL
+        """
+    )
+
+
+# Cada paso se aplica una sola vez y en orden; los pendientes corren en una sola transaccion.
+# Nunca reordenar ni editar pasos publicados: agregar uno nuevo al final.
+MIGRATIONS = (
+    (1, "base_schema", _create_base_schema),
+    (2, "list_indexes", _create_list_indexes),
+    (3, "conversation_sync_version", _add_conversation_sync_version),
+    (4, "message_external_id", _add_message_external_id),
+    (5, "conversation_summary", _add_conversation_summary),
+    (6, "messages_fts", _create_messages_fts),
+    (7, "outbox", _create_outbox),
+    (8, "media", _create_media),
+    (9, "change_log", _create_change_log),
+    (10, "message_external_id_tipo", _rekey_message_external_id),
+    (11, "message_file_url_index", _create_message_file_url_index),
+)
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    try:
+        row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] or 0
+
+
+def ensure_archive_schema(conn, schema=ARCHIVE_SCHEMA):
+    # El archivo de historico se adjunta a cada conexion; su tabla conserva el id
+    # original para que los cursores (created_at, id) sigan siendo validos.
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {schema}.archived_messages (
+            id INTEGER PRIMARY KEY,
+            conversation_id TEXT,
+            sender TEXT,
+            message TEXT,
+            message_type TEXT DEFAULT 'text',
+            file_url TEXT,
+            file_name TEXT,
+            file_ext TEXT,
+            metadata TEXT,
+            external_id TEXT,
+            created_at DATETIME,
+            archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE INDEX IF NOT EXISTS {schema}.idx_archived_messages_conversation_created
+        ON archived_messages (conversation_id, created_at, id)
+        """
+    )
+
+
+def apply_migrations(conn, migrations=MIGRATIONS):
+    if current_version(conn) >= migrations[-1][0]:
+        return []
+
+    applied = []
+    cursor = conn.cursor()
+    # BEGIN IMMEDIATE serializa el arranque de varios procesos sobre el mismo archivo.
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        version = current_version(conn)
+        for migration_version, name, step in migrations:
+            if migration_version <= version:
+                continue
+            step(cursor)
+            cursor.execute(
+                "INSERT INTO schema_version (version, name) VALUES (?, ?)",
+                (migration_version, name),
+            )
+            applied.append(migration_version)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return applied
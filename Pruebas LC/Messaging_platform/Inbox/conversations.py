@@ -1,5 +1,56 @@
+from DB.cursors import encode_cursor
 from DB.database import get_conversations as repository_get_conversations
+from DB.database import get_sync_version as repository_get_sync_version
+from Inbox.paging import (
+    build_page,
+    error_page,
+    fetch_page,
+    parse_keyset,
+    parse_limit,
+    parse_since_version,
+)
 
 
-def get_conversations():
-    return repository_get_conversations()
+def _conversation_cursor(conversation):
+    return conversation.get("updated_at"), conversation.get("id")
+
+
+def get_conversations_version():
+    return repository_get_sync_version()
+
+
+def get_conversations(limit=None, before=None, after=None, since=None):
+    try:
+        page_size = parse_limit(limit)
+        since_version = parse_since_version(since)
+        before_key, after_key = parse_keyset(before, after)
+    except ValueError as error:
+        return error_page(error)
+
+    # La version se lee antes que las filas: un cambio concurrente puede llegar
+    # repetido en el siguiente delta, pero nunca se pierde.
+    version = get_conversations_version()
+
+    if since_version is not None:
+        conversations = repository_get_conversations(limit=page_size + 1, since=since_version)
+        has_more = len(conversations) > page_size
+        conversations = conversations[:page_size]
+        if has_more:
+            version = conversations[-1]["sync_version"]
+    else:
+        conversations, has_more = fetch_page(
+            repository_get_conversations,
+            limit=page_size,
+            before=before_key,
+            after=after_key,
+            newest_first=True,
+        )
+
+    return build_page(
+        conversations,
+        has_more,
+        page_size,
+        _conversation_cursor,
+        newest_first=True,
+        sync=encode_cursor(version),
+    )
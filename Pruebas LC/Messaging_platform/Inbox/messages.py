@@ -1,8 +1,44 @@
+import asyncio
+import time
+
 from DB.database import get_messages as repository_get_messages
+from DB.database import get_sync_version as repository_get_sync_version
+from Inbox.paging import build_page, error_page, fetch_page, parse_keyset, parse_limit
+from services.long_poll import Waiter, default_conversation_waiters, parse_wait
+
+
+def _message_cursor(message):
+    return message.get("created_at"), message.get("id")
+
+
+def get_messages_version(conversation_id):
+    return repository_get_sync_version(conversation_id)
+
+
+def _parse_flag(value):
+    return str(value or "").strip().lower() in ("1", "true", "si", "yes")
+
 
+def get_messages(conversation_id, limit=None, before=None, after=None, since=None, archived=None):
+    # Los mensajes son solo de insercion: "since" equivale a "after" y el cursor
+    # de sincronizacion es el del mensaje mas nuevo entregado.
+    if since:
+        after = since
+    # El historico archivado solo se consulta cuando el cliente lo pide.
+    include_archive = _parse_flag(archived)
+    try:
+        page_size = parse_limit(limit)
+        before_key, after_key = parse_keyset(before, after)
+    except ValueError as error:
+        return error_page(error)
 
-def get_messages(conversation_id):
-    messages = repository_get_messages(conversation_id)
+    messages, has_more = fetch_page(
+        lambda **options: repository_get_messages(conversation_id, include_archive=include_archive, **options),
+        limit=page_size,
+        before=before_key,
+        after=after_key,
+        newest_first=False,
+    )
     normalized = []
     for message in messages:
         sender = "usuario" if message.get("sender") == "usuario" else "agent"
@@ -17,13 +53,75 @@ def get_messages(conversation_id):
             continue
         normalized.append(
             {
+                "id": message.get("id"),
                 "sender": sender,
                 "message": text,
                 "message_type": message.get("message_type") or "text",
                 "file_url": message.get("file_url"),
                 "file_name": message.get("file_name"),
                 "file_ext": message.get("file_ext"),
+                "local_file_url": message.get("local_file_url"),
                 "metadata": message.get("metadata"),
+                "created_at": message.get("created_at"),
             }
         )
-    return normalized
+    page = build_page(normalized, has_more, page_size, _message_cursor, newest_first=False)
+    page["sync"] = page["paging"]["after"] or after
+    return page
+
+
+def _register_and_fetch(waiters, conversation_id, waiter, after, limit):
+    # La espera se registra antes de consultar: un mensaje que llegue entre la
+    # consulta y la espera igual la despierta.
+    waiters.add(conversation_id, waiter)
+    try:
+        return get_messages(conversation_id, limit=limit, after=after)
+    except BaseException:
+        waiters.discard(conversation_id, waiter)
+        raise
+
+
+def poll_messages(conversation_id, after=None, wait=None, limit=None, waiters=default_conversation_waiters):
+    # Long-poll: responde en cuanto haya mensajes despues de "after" o al vencer
+    # "wait" (pagina vacia con el mismo "sync" para volver a preguntar).
+    try:
+        timeout = parse_wait(wait)
+    except ValueError as error:
+        return error_page(error)
+
+    conversation_id = str(conversation_id)
+    deadline = time.monotonic() + timeout
+    while True:
+        waiter = Waiter()
+        page = _register_and_fetch(waiters, conversation_id, waiter, after, limit)
+        try:
+            remaining = deadline - time.monotonic()
+            if not page["ok"] or page["data"] or remaining <= 0:
+                return page
+            waiter.event.wait(remaining)
+        finally:
+            waiters.discard(conversation_id, waiter)
+
+
+async def poll_messages_async(conversation_id, after=None, wait=None, limit=None, waiters=default_conversation_waiters):
+    try:
+        timeout = parse_wait(wait)
+    except ValueError as error:
+        return error_page(error)
+
+    conversation_id = str(conversation_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        waiter = Waiter(loop)
+        page = await asyncio.to_thread(_register_and_fetch, waiters, conversation_id, waiter, after, limit)
+        try:
+            remaining = deadline - loop.time()
+            if not page["ok"] or page["data"] or remaining <= 0:
+                return page
+            try:
+                await asyncio.wait_for(waiter.future, remaining)
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            waiters.discard(conversation_id, waiter)
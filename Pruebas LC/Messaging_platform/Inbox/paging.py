@@ -0,0 +1,68 @@
+from DB.cursors import decode_cursor, encode_cursor
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def parse_limit(raw_limit):
+    if raw_limit is None or str(raw_limit).strip() == "":
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(str(raw_limit).strip())
+    except ValueError:
+        raise ValueError("limit debe ser numerico") from None
+    if limit <= 0:
+        raise ValueError("limit debe ser mayor a cero")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def parse_since_version(since):
+    if not since:
+        return None
+    version = decode_cursor(since, 1)[0]
+    if not isinstance(version, int) or version < 0:
+        raise ValueError("cursor invalido")
+    return version
+
+
+def parse_keyset(before, after, size=2):
+    if before and after:
+        raise ValueError("before y after no se pueden combinar")
+    decoded_before = decode_cursor(before, size) if before else None
+    decoded_after = decode_cursor(after, size) if after else None
+    return decoded_before, decoded_after
+
+
+def fetch_page(fetch, limit, before, after, newest_first):
+    # Se pide una fila extra para saber si quedan mas en la direccion solicitada;
+    # esa fila es siempre la mas lejana al cursor.
+    rows = fetch(limit=limit + 1, before=before, after=after)
+    has_more = len(rows) > limit
+    if has_more:
+        trim_from_start = (after is not None) == newest_first
+        rows = rows[-limit:] if trim_from_start else rows[:limit]
+    return rows, has_more
+
+
+def build_page(items, has_more, limit, cursor_of, newest_first, sync=None):
+    before_cursor = None
+    after_cursor = None
+    if items:
+        oldest, newest = (items[-1], items[0]) if newest_first else (items[0], items[-1])
+        before_cursor = encode_cursor(*cursor_of(oldest))
+        after_cursor = encode_cursor(*cursor_of(newest))
+    return {
+        "ok": True,
+        "data": items,
+        "paging": {
+            "limit": limit,
+            "has_more": has_more,
+            "before": before_cursor,
+            "after": after_cursor,
+        },
+        "sync": sync,
+    }
+
+
+def error_page(error):
+    return {"ok": False, "status_code": 400, "error": str(error)}
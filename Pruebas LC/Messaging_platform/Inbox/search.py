@@ -0,0 +1,74 @@
+import re
+
+from DB.cursors import decode_cursor
+from DB.database import max_message_id as repository_max_message_id
+from DB.database import search_messages as repository_search_messages
+from Inbox.paging import build_page, error_page, parse_limit
+
+MAX_SEARCH_TERMS = 16
+MAX_QUERY_LENGTH = 200
+# bm25 depende de estadisticas de todo el indice: cada mensaje nuevo cambia
+# todos los puntajes, asi que el cursor no puede llevar el puntaje. La primera
+# pagina fija el ultimo id de mensaje y las siguientes avanzan por posicion
+# dentro de esos mensajes, hasta MAX_SEARCH_RESULTS resultados.
+MAX_SEARCH_RESULTS = 1000
+# El snippet marca las coincidencias con estos caracteres de control para que el
+# cliente arme el resaltado sin interpretar HTML.
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def build_match_query(raw_query):
+    # Cada termino va entre comillas para que la sintaxis de FTS5 (AND, NEAR, *, ")
+    # nunca llegue desde el usuario; el ultimo se busca por prefijo.
+    text = str(raw_query or "").strip()[:MAX_QUERY_LENGTH]
+    terms = _TOKEN_PATTERN.findall(text)[:MAX_SEARCH_TERMS]
+    if not terms:
+        raise ValueError("q es requerido")
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _parse_search_cursor(after):
+    # Cursor (ultimo id de mensaje, posicion); sin cursor se empieza una busqueda nueva.
+    if not after:
+        return None, 0
+    max_id, offset = decode_cursor(after, 2)
+    if not isinstance(max_id, int) or not isinstance(offset, int) or max_id < 0 or offset < 0:
+        raise ValueError("cursor invalido")
+    return max_id, offset
+
+
+def search_messages(query, conversation_id=None, canal=None, limit=None, after=None):
+    try:
+        match_query = build_match_query(query)
+        page_size = parse_limit(limit)
+        max_id, offset = _parse_search_cursor(after)
+    except ValueError as error:
+        return error_page(error)
+
+    if max_id is None:
+        max_id = repository_max_message_id()
+    take = max(0, min(page_size, MAX_SEARCH_RESULTS - offset))
+    rows = []
+    if take:
+        rows = repository_search_messages(
+            match_query,
+            limit=take + 1,
+            conversation_id=(conversation_id or "").strip() or None,
+            canal=(canal or "").strip() or None,
+            offset=offset,
+            max_id=max_id,
+        )
+    has_more = len(rows) > take and offset + take < MAX_SEARCH_RESULTS
+    rows = rows[:take]
+
+    # Los resultados van del mas relevante al menos relevante; solo se avanza con "after".
+    next_offset = offset + len(rows)
+    page = build_page(rows, has_more, page_size, lambda _row: (max_id, next_offset), newest_first=False)
+    page["paging"]["before"] = None
+    page["highlight"] = {"start": HIGHLIGHT_START, "end": HIGHLIGHT_END}
+    return page
@@ -0,0 +1,239 @@
+import asyncio
+import json
+from urllib.parse import parse_qsl
+
+from App import app, _status_from_result
+from Inbox.messages import poll_messages_async
+from metodos.Transfer import transfer_async
+from services.change_bus import default_change_bus
+from services.config_cache import get_balance_async, get_channels_async, get_webhook_async, set_webhook_async
+from services.events import default_event_hub, parse_conversation_filter, parse_event_id
+from services.liveconnect_async_client import default_async_client
+from services.outbox import default_outbox
+from services.retention import default_retention_worker
+from services.threaded_wsgi import ThreadedWsgiToAsgi
+
+# Entrada ASGI (p. ej. `uvicorn asgi:application`): las rutas que esperan a
+# LiveConnect corren en el event loop, el resto sigue en Flask sobre un pool de
+# hilos (ThreadedWsgiToAsgi), asi una request lenta no frena a las demas. Los envios
+# (/sendMessage, /sendQuickAnswer, /sendFile) solo escriben en el outbox, asi
+# que tambien van a Flask.
+MAX_BODY_BYTES = 10 * 1024 * 1024
+
+flask_application = ThreadedWsgiToAsgi(app)
+
+
+async def _transfer(payload, query):
+    return await transfer_async(payload), 200
+
+
+async def _balance(payload, query):
+    result = await get_balance_async()
+    return result, _status_from_result(result)
+
+
+async def _channels(payload, query):
+    result = await get_channels_async(query)
+    return result, _status_from_result(result)
+
+
+async def _set_webhook(payload, query):
+    result = await set_webhook_async(payload or {})
+    return result, _status_from_result(result)
+
+
+async def _get_webhook(payload, query):
+    id_canal = (payload or {}).get("id_canal") if isinstance(payload, dict) else None
+    if id_canal is None:
+        return {"ok": False, "error": "id_canal es requerido"}, 400
+    result = await get_webhook_async(id_canal)
+    return result, _status_from_result(result)
+
+
+ASYNC_ROUTES = {
+    ("POST", "/transfer"): _transfer,
+    ("GET", "/balance"): _balance,
+    ("GET", "/config/balance"): _balance,
+    ("GET", "/config/channels"): _channels,
+    ("POST", "/config/setWebhook"): _set_webhook,
+    ("POST", "/setWebhook"): _set_webhook,
+    ("POST", "/config/getWebhook"): _get_webhook,
+    ("POST", "/getWebhook"): _get_webhook,
+}
+
+
+async def _events(scope, receive, send):
+    # /events fuera de Flask: cada stream abierto ocuparia un hilo del pool. Aqui
+    # cada cliente es un future en el event loop.
+    headers = dict(scope.get("headers") or [])
+    params = parse_qsl(scope.get("query_string", b"").decode("latin-1"))
+    after_id = parse_event_id(
+        headers.get(b"last-event-id", b"").decode("latin-1") or dict(params).get("last_event_id")
+    )
+    conversation_ids = parse_conversation_filter([value for key, value in params if key == "conversation_id"])
+
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream; charset=utf-8"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ],
+        }
+    )
+    disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+    stream = default_event_hub.stream_async(after_id, conversation_ids)
+    try:
+        while True:
+            # Se espera el siguiente evento o la desconexion, lo que ocurra primero.
+            chunk = asyncio.ensure_future(stream.__anext__())
+            await asyncio.wait({chunk, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if not chunk.done():
+                chunk.cancel()
+                try:
+                    await chunk
+                except (asyncio.CancelledError, StopAsyncIteration):
+                    pass
+                break
+            try:
+                body = chunk.result()
+            except StopAsyncIteration:
+                break
+            await send({"type": "http.response.body", "body": body.encode("utf-8"), "more_body": True})
+    finally:
+        disconnected.cancel()
+        await stream.aclose()
+
+
+async def _wait_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _poll_messages(scope, receive, send, conversation_id):
+    # Long-poll en el event loop: cada espera es un future, miles de clientes
+    # inactivos no ocupan hilos ni conexiones de SQLite.
+    query = _parse_query(scope.get("query_string", b""))
+    disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+    poll = asyncio.ensure_future(
+        poll_messages_async(conversation_id, after=query.get("after"), wait=query.get("wait"), limit=query.get("limit"))
+    )
+    try:
+        await asyncio.wait({poll, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+        if not poll.done():
+            poll.cancel()
+            return
+        result = poll.result()
+    finally:
+        disconnected.cancel()
+    await _send_json(send, _status_from_result(result), result, [(b"cache-control", b"no-store")])
+
+
+def _long_poll_conversation(path):
+    # /messages/<conversation_id>/poll, igual que la ruta de Flask.
+    prefix, suffix = "/messages/", "/poll"
+    if not (path.startswith(prefix) and path.endswith(suffix)):
+        return None
+    conversation_id = path[len(prefix):-len(suffix)]
+    return conversation_id if conversation_id and "/" not in conversation_id else None
+
+
+STREAMING_ROUTES = {
+    ("GET", "/events"): _events,
+}
+
+
+def _parse_query(query_string):
+    # Igual que request.args.to_dict(): se queda con el primer valor de cada clave.
+    query = {}
+    for key, value in parse_qsl(query_string.decode("latin-1"), keep_blank_values=True):
+        query.setdefault(key, value)
+    return query
+
+
+async def _read_body(receive):
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise ValueError("El body supera el maximo permitido")
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _send_json(send, status, result, extra_headers=()):
+    body = json.dumps(result, ensure_ascii=False).encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("ascii")),
+                *extra_headers,
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            default_retention_worker.start()
+            default_outbox.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await default_async_client.aclose()
+            default_retention_worker.close(timeout=5)
+            default_outbox.close(timeout=5)
+            default_event_hub.close(timeout=5)
+            default_change_bus.close(timeout=5)
+            flask_application.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+
+    handler = None
+    if scope["type"] == "http":
+        streaming = STREAMING_ROUTES.get((scope["method"], scope["path"]))
+        if streaming is not None:
+            await streaming(scope, receive, send)
+            return
+        conversation_id = _long_poll_conversation(scope["path"]) if scope["method"] == "GET" else None
+        if conversation_id is not None:
+            await _poll_messages(scope, receive, send, conversation_id)
+            return
+        handler = ASYNC_ROUTES.get((scope["method"], scope["path"]))
+    if handler is None:
+        await flask_application(scope, receive, send)
+        return
+
+    try:
+        body = await _read_body(receive)
+    except ValueError as error:
+        await _send_json(send, 413, {"ok": False, "error": str(error)})
+        return
+    if body is None:
+        return
+
+    try:
+        payload = json.loads(body) if body else None
+    except ValueError:
+        payload = None
+    result, status = await handler(payload, _parse_query(scope.get("query_string", b"")))
+    await _send_json(send, status, result)
@@ -0,0 +1,127 @@
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metodos.Proxy as proxy_module
+import metodos.Token as token_module
+import services.liveconnect_async_client as async_client_module
+from metodos.Transfer import transfer, transfer_async
+from services.liveconnect_async_client import AsyncLiveConnectClient
+from services.liveconnect_client import LiveConnectClient
+
+CALLS = 1000
+WORKER_THREADS = 32
+UPSTREAM_DELAY_SECONDS = 0.2
+
+RESPONSE = b'{"ok":true}'
+
+
+class SlowUpstream:
+    # Stub asyncio en otro proceso (no compite por el GIL): responde tras
+    # UPSTREAM_DELAY_SECONDS y registra cuantas llamadas llegan a estar en vuelo.
+
+    def __init__(self):
+        self.in_flight = multiprocessing.Value("i", 0)
+        self.max_in_flight_value = multiprocessing.Value("i", 0)
+        self.ports = multiprocessing.Queue()
+        self.process = None
+
+    @property
+    def max_in_flight(self):
+        return self.max_in_flight_value.value
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                self.in_flight.value += 1
+                self.max_in_flight_value.value = max(self.max_in_flight_value.value, self.in_flight.value)
+                await asyncio.sleep(UPSTREAM_DELAY_SECONDS)
+                self.in_flight.value -= 1
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(RESPONSE)}\r\n\r\n".encode("ascii")
+                    + RESPONSE
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    async def _serve(self):
+        server = await asyncio.start_server(self._handle, "127.0.0.1", 0, backlog=4096)
+        self.ports.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+
+    def _run(self):
+        asyncio.run(self._serve())
+
+    def start(self):
+        self.process = multiprocessing.Process(target=self._run, daemon=True)
+        self.process.start()
+        return f"http://127.0.0.1:{self.ports.get(timeout=10)}/prod"
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join()
+
+    def reset(self):
+        self.max_in_flight_value.value = 0
+
+
+def _run_threads(base_url):
+    proxy_module.default_client = LiveConnectClient(base_url=base_url, pool_maxsize=WORKER_THREADS)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=WORKER_THREADS) as executor:
+        results = list(executor.map(transfer, [{"id_conversacion": str(index)} for index in range(CALLS)]))
+    elapsed = time.perf_counter() - started
+    proxy_module.default_client.close()
+    return elapsed, results
+
+
+async def _run_async(base_url):
+    client = AsyncLiveConnectClient(base_url=base_url)
+    async_client_module.default_async_client = client
+    started = time.perf_counter()
+    results = await asyncio.gather(*(transfer_async({"id_conversacion": str(index)}) for index in range(CALLS)))
+    elapsed = time.perf_counter() - started
+    await client.aclose()
+    return elapsed, results
+
+
+def _compare(upstream, base_url):
+    for label, run in (
+        (f"hilos ({WORKER_THREADS} workers)", lambda: _run_threads(base_url)),
+        ("asyncio (un solo hilo)", lambda: asyncio.run(_run_async(base_url))),
+    ):
+        upstream.reset()
+        elapsed, results = run()
+        failed = sum(1 for result in results if not result.get("ok"))
+        print(
+            f"{label:<22} {CALLS} llamadas de {UPSTREAM_DELAY_SECONDS * 1000:.0f} ms: "
+            f"{elapsed:.2f} s, max en vuelo={upstream.max_in_flight}, fallidas={failed}"
+        )
+
+
+def main():
+    token_module.default_token_manager.set_token("bench-token", time.time() + 3600)
+    upstream = SlowUpstream()
+    base_url = upstream.start()
+
+    try:
+        _compare(upstream, base_url)
+    finally:
+        upstream.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bench_async_proxy
+import metodos.Proxy as proxy_module
+import metodos.SendMessage as send_message_module
+import metodos.Token as token_module
+from DB.database import SQLiteRepository
+from metodos.SendMessage import send_message
+from services.broadcast import BROADCAST_CONCURRENCY, prepare_broadcast, stream_broadcast
+from services.liveconnect_client import LiveConnectClient
+
+RECIPIENTS = 500
+bench_async_proxy.UPSTREAM_DELAY_SECONDS = 0.05
+
+
+def _sequential(repository):
+    # Lo que hacia un cliente antes: una llamada y una transaccion por destinatario.
+    send_message_module.save_message = repository.save_message
+    started = time.perf_counter()
+    failed = 0
+    for index in range(RECIPIENTS):
+        if not send_message({"id_conversacion": f"conv-{index}", "mensaje": "Promo"}).get("ok"):
+            failed += 1
+    return time.perf_counter() - started, failed
+
+
+def _broadcast(repository):
+    _, plan = prepare_broadcast(
+        {"mensaje": "Promo", "id_conversaciones": [f"conv-{index}" for index in range(RECIPIENTS)]},
+        repository,
+    )
+    started = time.perf_counter()
+    summary = list(stream_broadcast(plan, repository=repository))[-1]
+    return time.perf_counter() - started, summary["failed"]
+
+
+def main():
+    token_module.default_token_manager.set_token("bench-token", time.time() + 3600)
+    upstream = bench_async_proxy.SlowUpstream()
+    base_url = upstream.start()
+    # Sin la capa de resiliencia: se mide el fan-out, no el limite por endpoint.
+    proxy_module.default_client = LiveConnectClient(base_url=base_url, pool_maxsize=BROADCAST_CONCURRENCY)
+
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for label, run in (("secuencial", _sequential), (f"broadcast ({BROADCAST_CONCURRENCY} en paralelo)", _broadcast)):
+                repository = SQLiteRepository(db_name=os.path.join(temp_dir, f"{run.__name__}.db"))
+                repository.init_schema()
+                upstream.reset()
+                elapsed, failed = run(repository)
+                repository.close()
+                print(
+                    f"{label:<28} {RECIPIENTS} destinatarios, upstream de {bench_async_proxy.UPSTREAM_DELAY_SECONDS * 1000:.0f} ms: "
+                    f"{elapsed:.2f} s ({RECIPIENTS / elapsed:.0f}/s), max en vuelo={upstream.max_in_flight}, fallidos={failed}"
+                )
+    finally:
+        proxy_module.default_client.close()
+        upstream.stop()
+
+
+if __name__ == "__main__":
+    main()
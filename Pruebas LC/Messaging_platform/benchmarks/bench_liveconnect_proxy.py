@@ -0,0 +1,130 @@
+import json
+import os
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+import urllib3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.liveconnect_client import LiveConnectClient
+
+THREADS = 8
+REQUESTS_PER_THREAD = 100
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Sin esto cabeceras y cuerpo salen en dos escrituras y Nagle agrega ~40 ms.
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        body = json.dumps({"ok": True, "status": "sent"}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PerCallClient(LiveConnectClient):
+    # Comportamiento anterior: requests.post de modulo, una conexion nueva por llamada.
+    def request(self, method, path, timeout=None, **kwargs):
+        kwargs.setdefault("verify", self.verify)
+        return requests.request(
+            method,
+            self.url_for(path),
+            timeout=timeout if timeout is not None else self.timeout_for(path),
+            **kwargs,
+        )
+
+
+def _start_stub(temp_dir):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    scheme = "http"
+    # Con openssl disponible el stub usa TLS, que es donde mas pesa el handshake.
+    if shutil.which("openssl"):
+        cert = os.path.join(temp_dir, "cert.pem")
+        key = os.path.join(temp_dir, "key.pem")
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", key,
+             "-out", cert, "-days", "1", "-subj", "/CN=127.0.0.1"],
+            check=True,
+            capture_output=True,
+        )
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://127.0.0.1:{server.server_address[1]}/prod"
+
+
+def _measure(app, client):
+    import metodos.Proxy as proxy_module
+
+    proxy_module.default_client = client
+    latencies = []
+    lock = threading.Lock()
+    start = threading.Barrier(THREADS)
+
+    def worker(thread_index):
+        http = app.test_client()
+        local = []
+        start.wait()
+        for index in range(REQUESTS_PER_THREAD):
+            started = time.perf_counter()
+            response = http.post(
+                "/sendMessage",
+                json={"id_conversacion": f"bench-{thread_index}", "mensaje": f"Hola {index}"},
+            )
+            local.append(time.perf_counter() - started)
+            if not (response.get_json() or {}).get("ok"):
+                raise RuntimeError(response.get_data(as_text=True))
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000
+
+
+def main():
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # App crea database.db en el directorio actual al importarse.
+        os.chdir(temp_dir)
+        from App import app
+        import metodos.Token as token_module
+
+        token_module.default_token_manager.set_token("bench-token", time.time() + 3600)
+
+        server, base_url = _start_stub(temp_dir)
+        try:
+            for label, client_class in (("requests.post por llamada", PerCallClient), ("sesion compartida", LiveConnectClient)):
+                client = client_class(base_url=base_url, verify=False)
+                p50, p99 = _measure(app, client)
+                client.close()
+                print(f"[{base_url.split(':')[0]}] {label:<26} p50={p50:.2f} ms  p99={p99:.2f} ms")
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
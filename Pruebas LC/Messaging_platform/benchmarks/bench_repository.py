@@ -0,0 +1,123 @@
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from DB.database import SQLiteRepository
+from DB.migrations import ARCHIVE_SCHEMA
+
+SEED_MESSAGES = 2000
+READ_ITERATIONS = 2000
+WRITE_SECONDS = 2.0
+WRITE_TRANSACTION_ROWS = 200
+
+
+class PerCallRepository(SQLiteRepository):
+    # Comportamiento anterior: una conexion nueva por llamada, journal por defecto.
+    # El historico se adjunta igual que en SQLiteRepository (lo usa init_schema).
+    def _connect(self):
+        conn = sqlite3.connect(self.db_name)
+        conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (self.archive_name,))
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        conn = self._connect()
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+def _percentile(samples, percentile):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _seed(repository):
+    repository.init_schema()
+    for index in range(SEED_MESSAGES):
+        repository.save_message(f"conv-{index % 20}", "web", "usuario", f"Mensaje {index}")
+
+
+def bench_read_overhead(repository):
+    latencies = []
+    for _ in range(READ_ITERATIONS):
+        started = time.perf_counter()
+        repository.get_cached_balance()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def bench_reads_during_writes(repository):
+    stop = threading.Event()
+    writes = {"transactions": 0}
+
+    def writer():
+        while not stop.is_set():
+            with repository._connection() as conn:
+                for index in range(WRITE_TRANSACTION_ROWS):
+                    conn.execute(
+                        "INSERT INTO messages (conversation_id, sender, message) VALUES (?, ?, ?)",
+                        ("conv-bench", "usuario", f"Carga {index}"),
+                    )
+                time.sleep(0.005)
+            writes["transactions"] += 1
+
+    thread = threading.Thread(target=writer, daemon=True)
+    thread.start()
+
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + WRITE_SECONDS
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            repository.list_messages("conv-1")
+        except sqlite3.OperationalError:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+
+    stop.set()
+    thread.join()
+    return latencies, errors, writes["transactions"]
+
+
+def _report(label, latencies):
+    if not latencies:
+        print(f"  {label}: sin muestras")
+        return
+    print(
+        f"  {label}: n={len(latencies)} "
+        f"p50={statistics.median(latencies) * 1000:.3f}ms "
+        f"p99={_percentile(latencies, 99) * 1000:.3f}ms"
+    )
+
+
+def main():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        scenarios = (
+            ("conexion por llamada", PerCallRepository(db_name=os.path.join(temp_dir, "per_call.db"), busy_timeout_ms=1000)),
+            ("pool + WAL", SQLiteRepository(db_name=os.path.join(temp_dir, "pooled.db"))),
+        )
+        for label, repository in scenarios:
+            _seed(repository)
+            print(f"[{label}]")
+            _report("lectura simple", bench_read_overhead(repository))
+            latencies, errors, transactions = bench_reads_during_writes(repository)
+            _report("list_messages con escrituras en curso", latencies)
+            print(f"  transacciones de escritura={transactions} lecturas bloqueadas={errors}")
+            repository.close()
+
+
+if __name__ == "__main__":
+    main()
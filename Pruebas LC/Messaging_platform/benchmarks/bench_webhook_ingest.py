@@ -0,0 +1,76 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from DB.database import SQLiteRepository
+from services.webhook_service import process_incoming_webhook
+from services.write_behind import WriteBehindQueue
+
+THREADS = 16
+WEBHOOKS_PER_THREAD = 200
+
+
+class FullSyncRepository(SQLiteRepository):
+    # synchronous=FULL hace fsync en cada commit, como un despliegue que prioriza durabilidad.
+    def _connect(self):
+        conn = super()._connect()
+        conn.execute("PRAGMA synchronous = FULL")
+        return conn
+
+
+def _payload(thread_index, index):
+    return {
+        "id_conversacion": f"conv-{thread_index}",
+        "canal": "whatsapp",
+        "message": {"texto": f"Mensaje {index}", "messageId": f"{thread_index}-{index}"},
+        "contact_data": {"name": f"Contacto {thread_index}"},
+    }
+
+
+def _ingest(target):
+    start = threading.Barrier(THREADS + 1)
+
+    def worker(thread_index):
+        start.wait()
+        for index in range(WEBHOOKS_PER_THREAD):
+            result = process_incoming_webhook(_payload(thread_index, index), repository=target)
+            if not result.get("ok"):
+                raise RuntimeError(result)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return THREADS * WEBHOOKS_PER_THREAD / (time.perf_counter() - started)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for repository_class in (SQLiteRepository, FullSyncRepository):
+            label = "synchronous=FULL" if repository_class is FullSyncRepository else "synchronous=NORMAL"
+
+            direct = repository_class(db_name=os.path.join(temp_dir, f"direct_{repository_class.__name__}.db"), pool_size=THREADS)
+            direct.init_schema()
+            direct_rate = _ingest(direct)
+            direct.close()
+
+            grouped = repository_class(db_name=os.path.join(temp_dir, f"grouped_{repository_class.__name__}.db"), pool_size=THREADS)
+            grouped.init_schema()
+            writer = WriteBehindQueue(grouped)
+            grouped_rate = _ingest(writer)
+            writer.close()
+            grouped.close()
+
+            print(f"[{label}] transaccion por webhook: {direct_rate:.0f} webhooks/s")
+            print(f"[{label}] commit agrupado:         {grouped_rate:.0f} webhooks/s")
+
+
+if __name__ == "__main__":
+    main()
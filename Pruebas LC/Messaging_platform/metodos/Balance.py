@@ -1,20 +1,14 @@
+import asyncio
+import time
+
 import requests
-from metodos.Token import obtener_token
+from metodos.Proxy import call_liveconnect, call_liveconnect_async, upstream_error
 from DB.database import save_balance
 
-def get_balance(expected_idc=None):
-    token = obtener_token()
-    headers = {"PageGearToken": token}
+BALANCE_REQUEST = {"method": "GET", "path": "proxy/balance"}
 
-    try:
-        res = requests.get(
-            "https://api.liveconnect.chat/prod/proxy/balance",
-            headers=headers,
-            timeout=20
-        )
-    except requests.RequestException as e:
-        return {"ok": False, "error": f"Error de red en balance: {str(e)}"}
 
+def _complete_balance(res, expected_idc=None):
     try:
         payload = res.json()
     except ValueError:
@@ -54,6 +48,25 @@ def get_balance(expected_idc=None):
         "detail": data
     }
 
-    save_balance(result)
+    # fetched_at permite servir este balance tras un reinicio sabiendo su antiguedad.
+    save_balance({**result, "fetched_at": time.time()})
 
     return result
+
+def get_balance(expected_idc=None):
+    try:
+        res = call_liveconnect(BALANCE_REQUEST)
+    except requests.RequestException as e:
+        return upstream_error(e, "balance")
+
+    return _complete_balance(res, expected_idc)
+
+
+async def get_balance_async(expected_idc=None):
+    try:
+        res = await call_liveconnect_async(BALANCE_REQUEST)
+    except requests.RequestException as e:
+        return upstream_error(e, "balance")
+
+    # save_balance escribe en SQLite: fuera del event loop.
+    return await asyncio.to_thread(_complete_balance, res, expected_idc)
@@ -1,37 +1,38 @@
 import requests
-from metodos.Token import obtener_token
+from metodos.Proxy import call_liveconnect, call_liveconnect_async, normalize_response, upstream_error
 
-def get_channels(filters=None):
-    token = obtener_token()
-    headers = {
-        "Accept": "application/json",
-        "PageGearToken": token
-    }
 
+def _prepare_channels(filters=None):
     clean_filters = {}
     if isinstance(filters, dict):
         for key, value in filters.items():
             if value is not None and str(value).strip() != "":
                 clean_filters[key] = value
 
+    return {
+        "method": "GET",
+        "path": "channels/list",
+        "headers": {"Accept": "application/json"},
+        "params": clean_filters
+    }
+
+
+def _complete_channels(res):
+    return normalize_response(res)
+
+def get_channels(filters=None):
     try:
-        res = requests.get(
-            "https://api.liveconnect.chat/prod/channels/list",
-            headers=headers,
-            params=clean_filters,
-            timeout=20
-        )
+        res = call_liveconnect(_prepare_channels(filters))
     except requests.RequestException as e:
-        return {"ok": False, "error": f"Error de red en channels/list: {str(e)}"}
+        return upstream_error(e, "channels/list")
+
+    return _complete_channels(res)
 
-    try:
-        payload = res.json()
-    except ValueError:
-        payload = {"raw_response": res.text}
 
-    if isinstance(payload, dict):
-        payload.setdefault("ok", res.ok)
-        payload["status_code"] = res.status_code
-        return payload
+async def get_channels_async(filters=None):
+    try:
+        res = await call_liveconnect_async(_prepare_channels(filters))
+    except requests.RequestException as e:
+        return upstream_error(e, "channels/list")
 
-    return {"ok": res.ok, "status_code": res.status_code, "data": payload}
+    return _complete_channels(res)
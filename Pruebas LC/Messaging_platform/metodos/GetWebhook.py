@@ -1,35 +1,44 @@
 import requests
-from metodos.Token import obtener_token
+from metodos.Proxy import call_liveconnect, call_liveconnect_async, normalize_response, upstream_error
 
-def get_webhook(id_canal):
+
+def _prepare_get_webhook(id_canal):
     normalized_channel = str(id_canal).strip()
     if not normalized_channel:
-        return {"ok": False, "status_code": 400, "error": "id_canal es requerido"}
+        return {"ok": False, "status_code": 400, "error": "id_canal es requerido"}, None
 
-    token = obtener_token()
-    headers = {
-        "Content-Type": "application/json",
-        "PageGearToken": token
+    return None, {
+        "method": "POST",
+        "path": "proxy/getWebhook",
+        "headers": {"Content-Type": "application/json"},
+        "json": {"id_canal": normalized_channel}
     }
 
+
+def _complete_get_webhook(res):
+    return normalize_response(res)
+
+def get_webhook(id_canal):
+    error, request = _prepare_get_webhook(id_canal)
+    if error:
+        return error
+
     try:
-        res = requests.post(
-            "https://api.liveconnect.chat/prod/proxy/getWebhook",
-            json={"id_canal": normalized_channel},
-            headers=headers,
-            timeout=20
-        )
+        res = call_liveconnect(request)
     except requests.RequestException as e:
-        return {"ok": False, "status_code": 502, "error": f"Error de red en getWebhook: {str(e)}"}
+        return upstream_error(e, "getWebhook")
 
-    try:
-        payload = res.json()
-    except ValueError:
-        payload = {"raw_response": res.text}
+    return _complete_get_webhook(res)
+
+
+async def get_webhook_async(id_canal):
+    error, request = _prepare_get_webhook(id_canal)
+    if error:
+        return error
 
-    if isinstance(payload, dict):
-        payload.setdefault("ok", res.ok)
-        payload["status_code"] = res.status_code
-        return payload
+    try:
+        res = await call_liveconnect_async(request)
+    except requests.RequestException as e:
+        return upstream_error(e, "getWebhook")
 
-    return {"ok": res.ok, "status_code": res.status_code, "data": payload}
+    return _complete_get_webhook(res)
@@ -0,0 +1,92 @@
+import time
+
+import requests
+
+from metodos.Token import obtener_token, obtener_token_async, renovar_token, renovar_token_async
+from services.liveconnect_client import default_client
+from services.resilience import UpstreamUnavailable
+
+UNAUTHORIZED = 401
+# Tiempo maximo que una llamada en lote espera turno en el limite local de requests.
+RATE_LIMIT_WAIT_SECONDS = 120
+
+
+def _request_options(token, request):
+    headers = {**request.get("headers", {}), "PageGearToken": token}
+    options = {"headers": headers}
+    for key in ("json", "params"):
+        if key in request:
+            options[key] = request[key]
+    return options
+
+
+def normalize_response(response):
+    # Respuesta de LiveConnect como dict con ok y status_code, sea JSON o no.
+    try:
+        payload = response.json()
+    except ValueError:
+        payload = {"raw_response": response.text}
+
+    if isinstance(payload, dict):
+        payload.setdefault("ok", response.ok)
+        payload["status_code"] = response.status_code
+        return payload
+
+    return {"ok": response.ok, "status_code": response.status_code, "data": payload}
+
+
+def upstream_error(error, operation):
+    if isinstance(error, UpstreamUnavailable):
+        # Rechazo local: 429/503 con retry_after para que el cliente espere en vez de insistir.
+        result = {"ok": False, "status_code": error.status_code, "error": f"{operation}: {str(error)}"}
+        if error.retry_after is not None:
+            result["retry_after"] = round(error.retry_after, 1)
+        return result
+    return {"ok": False, "status_code": 502, "error": f"Error de red en {operation}: {str(error)}"}
+
+
+def call_liveconnect(request):
+    # request: {"method", "path", "headers"?, "json"?, "params"?}; el token se agrega aqui.
+    token = obtener_token()
+    res = default_client.request(request["method"], request["path"], **_request_options(token, request))
+    if res.status_code == UNAUTHORIZED:
+        # Token revocado o expirado antes de tiempo: se renueva una vez y se reintenta.
+        token = renovar_token(token)
+        res = default_client.request(request["method"], request["path"], **_request_options(token, request))
+    return res
+
+
+def call_liveconnect_waiting(request, operation, max_wait=RATE_LIMIT_WAIT_SECONDS):
+    # Para envios en lote: el limite local (429 de UpstreamUnavailable) nunca llego
+    # a LiveConnect, asi que se espera el turno. Un circuito abierto o un error de
+    # red se devuelve como error sin reintentar. Retorna (error, respuesta).
+    deadline = time.monotonic() + max_wait
+    while True:
+        try:
+            return None, call_liveconnect(request)
+        except UpstreamUnavailable as error:
+            if error.status_code != 429 or time.monotonic() >= deadline:
+                return upstream_error(error, operation), None
+            time.sleep(error.retry_after or 0.1)
+        except requests.RequestException as error:
+            return upstream_error(error, operation), None
+
+
+async def call_liveconnect_async(request):
+    # httpx solo se requiere en el camino async.
+    from services.liveconnect_async_client import default_async_client
+
+    token = await obtener_token_async()
+    res = await default_async_client.request(
+        request["method"],
+        request["path"],
+        **_request_options(token, request),
+    )
+    if res.status_code == UNAUTHORIZED:
+        token = await renovar_token_async(token)
+        res = await default_async_client.request(
+            request["method"],
+            request["path"],
+            **_request_options(token, request),
+        )
+    return res
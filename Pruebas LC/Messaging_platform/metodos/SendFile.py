@@ -1,6 +1,8 @@
-import requests
+import asyncio
 import re
-from metodos.Token import obtener_token
+
+import requests
+from metodos.Proxy import call_liveconnect, call_liveconnect_async, normalize_response, upstream_error
 from DB.database import save_message
 
 
@@ -16,22 +18,9 @@ def _normalize_extension(value):
     return _normalize_text(value).lower().lstrip(".")
 
 
-def _normalize_response(response):
-    try:
-        payload = response.json()
-    except ValueError:
-        payload = {"raw_response": response.text}
-
-    if isinstance(payload, dict):
-        payload.setdefault("ok", response.ok)
-        payload["status_code"] = response.status_code
-        return payload
-
-    return {"ok": response.ok, "status_code": response.status_code, "data": payload}
-
-def send_file(data):
+def _prepare_send_file(data):
     if not isinstance(data, dict):
-        return {"ok": False, "status_code": 400, "error": "Payload JSON invalido"}
+        return {"ok": False, "status_code": 400, "error": "Payload JSON invalido"}, None
 
     conversation_id = _normalize_text(data.get("id_conversacion"))
     file_url = _normalize_text(data.get("url"))
@@ -39,48 +28,43 @@ def send_file(data):
     extension = _normalize_extension(data.get("extension"))
 
     if not conversation_id:
-        return {"ok": False, "status_code": 400, "error": "id_conversacion es requerido"}
+        return {"ok": False, "status_code": 400, "error": "id_conversacion es requerido"}, None
     if not file_url:
-        return {"ok": False, "status_code": 400, "error": "url es requerido"}
+        return {"ok": False, "status_code": 400, "error": "url es requerido"}, None
     if not re.fullmatch(r"https?://\S+", file_url):
-        return {"ok": False, "status_code": 400, "error": "url invalida"}
+        return {"ok": False, "status_code": 400, "error": "url invalida"}, None
     if not file_name:
-        return {"ok": False, "status_code": 400, "error": "nombre es requerido"}
+        return {"ok": False, "status_code": 400, "error": "nombre es requerido"}, None
     if not extension:
-        return {"ok": False, "status_code": 400, "error": "extension es requerida"}
+        return {"ok": False, "status_code": 400, "error": "extension es requerida"}, None
     if not re.fullmatch(r"[a-zA-Z0-9]+", extension):
-        return {"ok": False, "status_code": 400, "error": "extension invalida"}
-
-    token = obtener_token()
-    headers = {
-        "Content-Type": "application/json",
-        "PageGearToken": token
+        return {"ok": False, "status_code": 400, "error": "extension invalida"}, None
+
+    return None, {
+        "method": "POST",
+        "path": "proxy/sendFile",
+        "headers": {"Content-Type": "application/json"},
+        "json": {
+            "id_conversacion": conversation_id,
+            "url": file_url,
+            "nombre": file_name,
+            "extension": extension
+        }
     }
 
-    payload = {
-        "id_conversacion": conversation_id,
-        "url": file_url,
-        "nombre": file_name,
-        "extension": extension
-    }
 
-    try:
-        res = requests.post(
-            "https://api.liveconnect.chat/prod/proxy/sendFile",
-            json=payload,
-            headers=headers,
-            timeout=20
-        )
-    except requests.RequestException as error:
-        return {
-            "ok": False,
-            "status_code": 502,
-            "error": f"Error de red en sendFile: {str(error)}"
-        }
+def _network_error(error):
+    return upstream_error(error, "sendFile")
 
-    response_payload = _normalize_response(res)
+
+def _complete_send_file(data, request, res, external_id=None):
+    response_payload = normalize_response(res)
 
     if res.ok:
+        conversation_id = request["json"]["id_conversacion"]
+        file_url = request["json"]["url"]
+        file_name = request["json"]["nombre"]
+        extension = request["json"]["extension"]
         canal = str(data.get("canal") or data.get("id_canal") or "proxy").strip()
         final_name = file_name
         suffix = f".{extension}"
@@ -101,6 +85,7 @@ def send_file(data):
                     "nombre": final_name,
                     "extension": extension,
                 },
+                external_id=external_id,
             )
         except Exception as error:
             warnings = response_payload.get("warnings")
@@ -110,3 +95,29 @@ def send_file(data):
             response_payload["warnings"] = warnings
 
     return response_payload
+
+
+def send_file(data):
+    error, request = _prepare_send_file(data)
+    if error:
+        return error
+
+    try:
+        res = call_liveconnect(request)
+    except requests.RequestException as error:
+        return _network_error(error)
+
+    return _complete_send_file(data, request, res)
+
+
+async def send_file_async(data):
+    error, request = _prepare_send_file(data)
+    if error:
+        return error
+
+    try:
+        res = await call_liveconnect_async(request)
+    except requests.RequestException as error:
+        return _network_error(error)
+
+    return await asyncio.to_thread(_complete_send_file, data, request, res)
@@ -1,5 +1,7 @@
+import asyncio
+
 import requests
-from metodos.Token import obtener_token
+from metodos.Proxy import call_liveconnect, call_liveconnect_async, normalize_response, upstream_error
 from DB.database import save_message
 
 
@@ -11,61 +13,41 @@ def _normalize_text(value):
     return ""
 
 
-def _normalize_response(response):
-    try:
-        payload = response.json()
-    except ValueError:
-        payload = {"raw_response": response.text}
-
-    if isinstance(payload, dict):
-        payload.setdefault("ok", response.ok)
-        payload["status_code"] = response.status_code
-        return payload
-
-    return {"ok": response.ok, "status_code": response.status_code, "data": payload}
-
-def send_message(data):
+def _prepare_send_message(data):
     if not isinstance(data, dict):
-        return {"ok": False, "status_code": 400, "error": "Payload JSON invalido"}
+        return {"ok": False, "status_code": 400, "error": "Payload JSON invalido"}, None
 
     conversation_id = str(data.get("id_conversacion", "")).strip()
     message_text = _normalize_text(data.get("mensaje"))
     if not conversation_id:
-        return {"ok": False, "status_code": 400, "error": "id_conversacion es requerido"}
+        return {"ok": False, "status_code": 400, "error": "id_conversacion es requerido"}, None
     if not message_text:
-        return {"ok": False, "status_code": 400, "error": "mensaje es requerido"}
+        return {"ok": False, "status_code": 400, "error": "mensaje es requerido"}, None
 
-    token = obtener_token()
-    headers = {
-        "Content-Type": "application/json",
-        "PageGearToken": token
+    return None, {
+        "method": "POST",
+        "path": "proxy/sendMessage",
+        "headers": {"Content-Type": "application/json"},
+        "json": {
+            "id_conversacion": conversation_id,
+            "mensaje": message_text
+        }
     }
 
-    payload = {
-        "id_conversacion": conversation_id,
-        "mensaje": message_text
-    }
 
-    try:
-        res = requests.post(
-            "https://api.liveconnect.chat/prod/proxy/sendMessage",
-            json=payload,
-            headers=headers,
-            timeout=20
-        )
-    except requests.RequestException as error:
-        return {
-            "ok": False,
-            "status_code": 502,
-            "error": f"Error de red en sendMessage: {str(error)}"
-        }
+def _network_error(error):
+    return upstream_error(error, "sendMessage")
+
 
-    response_payload = _normalize_response(res)
+def _complete_send_message(data, request, res, external_id=None):
+    response_payload = normalize_response(res)
 
     if res.ok:
+        conversation_id = request["json"]["id_conversacion"]
+        message_text = request["json"]["mensaje"]
         canal = str(data.get("canal") or data.get("id_canal") or "proxy").strip()
         try:
-            save_message(conversation_id, canal, "agent", message_text)
+            save_message(conversation_id, canal, "agent", message_text, external_id=external_id)
         except Exception as error:
             warnings = response_payload.get("warnings")
             if not isinstance(warnings, list):
@@ -74,3 +56,30 @@ def send_message(data):
             response_payload["warnings"] = warnings
 
     return response_payload
+
+
+def send_message(data):
+    error, request = _prepare_send_message(data)
+    if error:
+        return error
+
+    try:
+        res = call_liveconnect(request)
+    except requests.RequestException as error:
+        return _network_error(error)
+
+    return _complete_send_message(data, request, res)
+
+
+async def send_message_async(data):
+    error, request = _prepare_send_message(data)
+    if error:
+        return error
+
+    try:
+        res = await call_liveconnect_async(request)
+    except requests.RequestException as error:
+        return _network_error(error)
+
+    # El guardado en SQLite corre fuera del event loop.
+    return await asyncio.to_thread(_complete_send_message, data, request, res)
@@ -1,5 +1,7 @@
+import asyncio
+
 import requests
-from metodos.Token import obtener_token
+from metodos.Proxy import call_liveconnect, call_liveconnect_async, normalize_response, upstream_error
 from DB.database import save_message
 
 
@@ -71,77 +73,56 @@ def _build_quick_answer_log_message(data, response_payload, answer_id, variables
     return f"QuickAnswer {answer_id}"
 
 
-def _normalize_response(response):
-    try:
-        payload = response.json()
-    except ValueError:
-        payload = {"raw_response": response.text}
-
-    if isinstance(payload, dict):
-        payload.setdefault("ok", response.ok)
-        payload["status_code"] = response.status_code
-        return payload
-
-    return {"ok": response.ok, "status_code": response.status_code, "data": payload}
-
-def send_quick_answer(data):
+def _prepare_send_quick_answer(data):
     if not isinstance(data, dict):
-        return {"ok": False, "status_code": 400, "error": "Payload JSON invalido"}
+        return {"ok": False, "status_code": 400, "error": "Payload JSON invalido"}, None
 
     conversation_id = str(data.get("id_conversacion", "")).strip()
     if not conversation_id:
-        return {"ok": False, "status_code": 400, "error": "id_conversacion es requerido"}
+        return {"ok": False, "status_code": 400, "error": "id_conversacion es requerido"}, None
 
     raw_answer_id = data.get("id_respuesta")
     try:
         answer_id = int(raw_answer_id)
     except (TypeError, ValueError):
-        return {"ok": False, "status_code": 400, "error": "id_respuesta debe ser numerico"}
+        return {"ok": False, "status_code": 400, "error": "id_respuesta debe ser numerico"}, None
 
     variables = data.get("variables", {})
     if variables is None:
         variables = {}
     if not isinstance(variables, dict):
-        return {"ok": False, "status_code": 400, "error": "variables debe ser un objeto JSON"}
-
-    token = obtener_token()
-    headers = {
-        "Content-Type": "application/json",
-        "PageGearToken": token
+        return {"ok": False, "status_code": 400, "error": "variables debe ser un objeto JSON"}, None
+
+    return None, {
+        "method": "POST",
+        "path": "proxy/sendQuickAnswer",
+        "headers": {"Content-Type": "application/json"},
+        "json": {
+            "id_conversacion": conversation_id,
+            "id_respuesta": answer_id,
+            "variables": variables
+        }
     }
 
-    payload = {
-        "id_conversacion": conversation_id,
-        "id_respuesta": answer_id,
-        "variables": variables
-    }
 
-    try:
-        res = requests.post(
-            "https://api.liveconnect.chat/prod/proxy/sendQuickAnswer",
-            json=payload,
-            headers=headers,
-            timeout=20
-        )
-    except requests.RequestException as error:
-        return {
-            "ok": False,
-            "status_code": 502,
-            "error": f"Error de red en sendQuickAnswer: {str(error)}"
-        }
+def _network_error(error):
+    return upstream_error(error, "sendQuickAnswer")
+
 
-    response_payload = _normalize_response(res)
+def _complete_send_quick_answer(data, request, res, external_id=None):
+    response_payload = normalize_response(res)
 
     if res.ok:
+        conversation_id = request["json"]["id_conversacion"]
         canal = str(data.get("canal") or data.get("id_canal") or "proxy").strip()
         quick_answer_message = _build_quick_answer_log_message(
             data=data,
             response_payload=response_payload,
-            answer_id=answer_id,
-            variables=variables,
+            answer_id=request["json"]["id_respuesta"],
+            variables=request["json"]["variables"],
         )
         try:
-            save_message(conversation_id, canal, "agent", quick_answer_message)
+            save_message(conversation_id, canal, "agent", quick_answer_message, external_id=external_id)
         except Exception as error:
             warnings = response_payload.get("warnings")
             if not isinstance(warnings, list):
@@ -150,3 +131,29 @@ def send_quick_answer(data):
             response_payload["warnings"] = warnings
 
     return response_payload
+
+
+def send_quick_answer(data):
+    error, request = _prepare_send_quick_answer(data)
+    if error:
+        return error
+
+    try:
+        res = call_liveconnect(request)
+    except requests.RequestException as error:
+        return _network_error(error)
+
+    return _complete_send_quick_answer(data, request, res)
+
+
+async def send_quick_answer_async(data):
+    error, request = _prepare_send_quick_answer(data)
+    if error:
+        return error
+
+    try:
+        res = await call_liveconnect_async(request)
+    except requests.RequestException as error:
+        return _network_error(error)
+
+    return await asyncio.to_thread(_complete_send_quick_answer, data, request, res)
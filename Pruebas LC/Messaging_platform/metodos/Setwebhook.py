@@ -1,31 +1,32 @@
 import requests
-from metodos.Token import obtener_token
+from metodos.Proxy import call_liveconnect, call_liveconnect_async, normalize_response, upstream_error
 
-def set_webhook(data):
-    token = obtener_token()
-    headers = {
-        "Content-Type": "application/json",
-        "PageGearToken": token
+
+def _prepare_set_webhook(data):
+    return {
+        "method": "POST",
+        "path": "proxy/setWebhook",
+        "headers": {"Content-Type": "application/json"},
+        "json": data
     }
 
+
+def _complete_set_webhook(res):
+    return normalize_response(res)
+
+def set_webhook(data):
     try:
-        res = requests.post(
-            "https://api.liveconnect.chat/prod/proxy/setWebhook",
-            json=data,
-            headers=headers,
-            timeout=20
-        )
+        res = call_liveconnect(_prepare_set_webhook(data))
     except requests.RequestException as e:
-        return {"ok": False, "error": f"Error de red en setWebhook: {str(e)}"}
+        return upstream_error(e, "setWebhook")
+
+    return _complete_set_webhook(res)
 
-    try:
-        payload = res.json()
-    except ValueError:
-        payload = {"raw_response": res.text}
 
-    if isinstance(payload, dict):
-        payload.setdefault("ok", res.ok)
-        payload["status_code"] = res.status_code
-        return payload
+async def set_webhook_async(data):
+    try:
+        res = await call_liveconnect_async(_prepare_set_webhook(data))
+    except requests.RequestException as e:
+        return upstream_error(e, "setWebhook")
 
-    return {"ok": res.ok, "status_code": res.status_code, "data": payload}
+    return _complete_set_webhook(res)
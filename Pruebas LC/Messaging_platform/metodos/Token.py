@@ -1,29 +1,50 @@
+import atexit
+import logging
+
 import requests
-import time
 
-TOKEN = None
-TOKEN_EXPIRA = 0
+from DB.database import default_repository
+from services.liveconnect_client import default_client
+from services.token_manager import TokenManager
+from services.upstream_metrics import default_metrics
 
 KEY = ""
 SECRET = ""
 
-def obtener_token():
-    global TOKEN, TOKEN_EXPIRA
-
-    # Reutiliza token si sigue válido
-    if TOKEN and time.time() < TOKEN_EXPIRA:
-        return TOKEN
+logger = logging.getLogger(__name__)
 
-    url = "https://api.liveconnect.chat/prod/account/token"
+def _solicitar_token():
     body = {"cKey": KEY, "privateKey": SECRET}
-    response = requests.post(url, json=body)
+    response = default_client.post("account/token", json=body)
     data = response.json()
 
     # El token se encuentra en 'PageGearToken'
-    TOKEN = data.get("PageGearToken")
-    
-    # LiveConnect define expiración 8 horas, se le resta 1 minuto por seguridad
-    TOKEN_EXPIRA = time.time() + 28800 - 60
+    token = data.get("PageGearToken") if isinstance(data, dict) else None
+    if not token:
+        raise requests.RequestException("LiveConnect no devolvio PageGearToken")
+
+    # Nunca se registra el valor del token.
+    logger.info("Nuevo token de LiveConnect generado")
+    return token
+
+
+# El token se persiste en system_config para sobrevivir reinicios y
+# compartirse entre workers.
+default_token_manager = TokenManager(_solicitar_token, repository=default_repository, metrics=default_metrics)
+atexit.register(default_token_manager.close)
+
+
+def obtener_token():
+    return default_token_manager.get_token()
+
+
+async def obtener_token_async():
+    return await default_token_manager.get_token_async()
+
+
+def renovar_token(token_rechazado):
+    return default_token_manager.refresh(stale_token=token_rechazado)
+
 
-    print("🔑 Nuevo token generado:", TOKEN[:20] + "...")  # Muestra solo inicio
-    return TOKEN
+async def renovar_token_async(token_rechazado):
+    return await default_token_manager.refresh_async(token_rechazado)
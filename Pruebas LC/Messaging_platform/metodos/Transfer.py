@@ -1,17 +1,32 @@
 import requests
-from metodos.Token import obtener_token
+from metodos.Proxy import call_liveconnect, call_liveconnect_async, normalize_response, upstream_error
 
-def transfer(data):
-    token = obtener_token()
-    headers = {
-        "Content-Type": "application/json",
-        "PageGearToken": token
+
+def _prepare_transfer(data):
+    return {
+        "method": "POST",
+        "path": "proxy/transfer",
+        "headers": {"Content-Type": "application/json"},
+        "json": data
     }
 
-    res = requests.post(
-        "https://api.liveconnect.chat/prod/proxy/transfer",
-        json=data,
-        headers=headers
-    )
 
-    return res.json()
+def _complete_transfer(res):
+    return normalize_response(res)
+
+def transfer(data):
+    try:
+        res = call_liveconnect(_prepare_transfer(data))
+    except requests.RequestException as e:
+        return upstream_error(e, "transfer")
+
+    return _complete_transfer(res)
+
+
+async def transfer_async(data):
+    try:
+        res = await call_liveconnect_async(_prepare_transfer(data))
+    except requests.RequestException as e:
+        return upstream_error(e, "transfer")
+
+    return _complete_transfer(res)
@@ -1,5 +1,24 @@
-from services.webhook_service import process_incoming_webhook
+from services.media_store import MIRROR_INCOMING_MEDIA, default_media_mirror, mirror_allowed
+from services.webhook_service import _extract_file_payload, process_incoming_webhook, process_incoming_webhooks
+from services.write_behind import default_write_queue
+
+
+def _mirror_attachment(data):
+    file_payload = _extract_file_payload(data) if MIRROR_INCOMING_MEDIA and isinstance(data, dict) else None
+    if file_payload and mirror_allowed(file_payload["url"]):
+        default_media_mirror.submit(file_payload["url"])
 
 
 def procesar_webhook(data):
-    return process_incoming_webhook(data)
+    result = process_incoming_webhook(data, repository=default_write_queue)
+    if result.get("status") == "ok":
+        _mirror_attachment(data)
+    return result
+
+
+def procesar_webhooks(payloads):
+    result = process_incoming_webhooks(payloads)
+    for item in result["results"]:
+        if item.get("status") == "ok":
+            _mirror_attachment(payloads[item["index"]])
+    return result
@@ -0,0 +1,203 @@
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from DB.database import default_repository
+from metodos.Proxy import call_liveconnect_waiting, normalize_response
+from metodos.SendMessage import _prepare_send_message
+from metodos.SendQuickAnswer import _build_quick_answer_log_message, _prepare_send_quick_answer
+
+
+# Envios simultaneos hacia LiveConnect; no debe superar POOL_MAXSIZE del cliente.
+BROADCAST_CONCURRENCY = 32
+BROADCAST_MAX_RECIPIENTS = 10000
+# Filas de log del agente que se guardan por transaccion.
+BROADCAST_PERSIST_BATCH = 500
+
+logger = logging.getLogger(__name__)
+
+
+def _recipient_entries(raw_recipients):
+    # Acepta ids sueltos o {"id_conversacion", "variables"}; descarta repetidos.
+    entries = {}
+    for item in raw_recipients:
+        variables = None
+        if isinstance(item, dict):
+            variables = item.get("variables")
+            item = item.get("id_conversacion")
+        conversation_id = str(item if item is not None else "").strip()
+        if not conversation_id:
+            raise ValueError("id_conversaciones contiene un id vacio")
+        if variables is not None and not isinstance(variables, dict):
+            raise ValueError(f"variables de {conversation_id} debe ser un objeto JSON")
+        entries.setdefault(conversation_id, variables or {})
+    return entries
+
+
+def prepare_broadcast(payload, repository=default_repository):
+    if not isinstance(payload, dict):
+        return {"ok": False, "status_code": 400, "error": "Payload JSON invalido"}, None
+
+    has_message = payload.get("mensaje") is not None
+    has_answer = payload.get("id_respuesta") is not None
+    if has_message == has_answer:
+        return {"ok": False, "status_code": 400, "error": "mensaje o id_respuesta es requerido (solo uno)"}, None
+
+    raw_recipients = payload.get("id_conversaciones")
+    canal = str(payload.get("canal") or "").strip() or None
+    if raw_recipients is None and canal is None:
+        return {"ok": False, "status_code": 400, "error": "id_conversaciones o canal es requerido"}, None
+    if raw_recipients is not None and not isinstance(raw_recipients, list):
+        return {"ok": False, "status_code": 400, "error": "id_conversaciones debe ser una lista"}, None
+
+    common_variables = payload.get("variables") or {}
+    if not isinstance(common_variables, dict):
+        return {"ok": False, "status_code": 400, "error": "variables debe ser un objeto JSON"}, None
+
+    try:
+        entries = _recipient_entries(raw_recipients) if raw_recipients is not None else None
+    except ValueError as error:
+        return {"ok": False, "status_code": 400, "error": str(error)}, None
+
+    # Con canal se toman sus conversaciones; con ambos, solo las ids de ese canal.
+    channels = repository.conversation_channels(
+        conversation_ids=list(entries) if entries is not None else None,
+        canal=canal,
+        limit=BROADCAST_MAX_RECIPIENTS + 1,
+    )
+    if entries is None:
+        entries = {conversation_id: {} for conversation_id in channels}
+    elif canal is not None:
+        entries = {key: value for key, value in entries.items() if key in channels}
+    if not entries:
+        return {"ok": False, "status_code": 400, "error": "No hay conversaciones para el broadcast"}, None
+    if len(entries) > BROADCAST_MAX_RECIPIENTS:
+        return {
+            "ok": False,
+            "status_code": 413,
+            "error": f"El broadcast supera el maximo de {BROADCAST_MAX_RECIPIENTS} destinatarios",
+        }, None
+
+    kind = "sendMessage" if has_message else "sendQuickAnswer"
+    recipients = []
+    for conversation_id, variables in entries.items():
+        if kind == "sendMessage":
+            data = {"id_conversacion": conversation_id, "mensaje": payload.get("mensaje")}
+        else:
+            data = {
+                "id_conversacion": conversation_id,
+                "id_respuesta": payload.get("id_respuesta"),
+                "variables": {**common_variables, **variables},
+                "registro_visual": payload.get("registro_visual"),
+            }
+        recipients.append((conversation_id, channels.get(conversation_id) or "proxy", data))
+
+    return None, {"broadcast_id": uuid.uuid4().hex[:12], "kind": kind, "recipients": recipients}
+
+
+def _deliver(kind, data):
+    # Devuelve (resultado, texto para el log del agente o None si no se envio).
+    prepare = _prepare_send_message if kind == "sendMessage" else _prepare_send_quick_answer
+    error, request = prepare(data)
+    if error:
+        return error, None
+
+    error, res = call_liveconnect_waiting(request, kind)
+    if error:
+        return error, None
+
+    payload = normalize_response(res)
+    if not res.ok or payload.get("ok") is False:
+        return payload, None
+    if kind == "sendMessage":
+        return payload, request["json"]["mensaje"]
+    log_message = _build_quick_answer_log_message(
+        data=data,
+        response_payload=payload,
+        answer_id=request["json"]["id_respuesta"],
+        variables=request["json"]["variables"],
+    )
+    return payload, log_message
+
+
+def _result_line(conversation_id, result):
+    line = {
+        "type": "result",
+        "id_conversacion": conversation_id,
+        "ok": result.get("ok") is not False,
+        "status_code": result.get("status_code"),
+    }
+    if not line["ok"]:
+        line["error"] = result.get("error") or result.get("message") or result.get("raw_response")
+    return line
+
+
+def stream_broadcast(plan, repository=default_repository, concurrency=BROADCAST_CONCURRENCY):
+    # Generador: un resultado por destinatario a medida que termina y al final un
+    # resumen. Los logs del agente se guardan en lotes (una transaccion por lote).
+    started = time.perf_counter()
+    broadcast_id = plan["broadcast_id"]
+    pending_rows = []
+    counts = {"sent": 0, "failed": 0}
+    warnings = []
+
+    def flush():
+        if not pending_rows:
+            return
+        try:
+            repository.save_messages(pending_rows)
+        except Exception as error:
+            logger.exception("No se pudo guardar el log del broadcast %s", broadcast_id)
+            warnings.append(f"No se pudieron guardar {len(pending_rows)} mensajes localmente: {str(error)}")
+        pending_rows.clear()
+
+    def collect(conversation_id, canal, result, log_message):
+        counts["sent" if log_message is not None else "failed"] += 1
+        if log_message is not None:
+            pending_rows.append(
+                repository.prepare_message(
+                    conversation_id=conversation_id,
+                    canal=canal,
+                    sender="agent",
+                    message=log_message,
+                    metadata={"source": "broadcast", "broadcast_id": broadcast_id},
+                    external_id=f"broadcast:{broadcast_id}",
+                )
+            )
+            if len(pending_rows) >= BROADCAST_PERSIST_BATCH:
+                flush()
+        return _result_line(conversation_id, result)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, int(concurrency)), thread_name_prefix="broadcast")
+    futures = {
+        executor.submit(_deliver, plan["kind"], data): (conversation_id, canal)
+        for conversation_id, canal, data in plan["recipients"]
+    }
+    pending = set(futures)
+    try:
+        for future in as_completed(futures):
+            pending.discard(future)
+            conversation_id, canal = futures[future]
+            yield collect(conversation_id, canal, *future.result())
+    finally:
+        # Si el cliente corta el stream se cancela lo que no salio y se guarda
+        # el log de lo que ya estaba en vuelo.
+        for future in pending:
+            future.cancel()
+        for future in pending:
+            if not future.cancelled():
+                collect(*futures[future], *future.result())
+        executor.shutdown(wait=True)
+        flush()
+
+    yield {
+        "type": "summary",
+        "broadcast_id": broadcast_id,
+        "kind": plan["kind"],
+        "total": len(plan["recipients"]),
+        "sent": counts["sent"],
+        "failed": counts["failed"],
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        "warnings": warnings,
+    }
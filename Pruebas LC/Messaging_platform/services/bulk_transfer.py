@@ -0,0 +1,123 @@
+import logging
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from DB.database import default_repository
+from metodos.Proxy import call_liveconnect_waiting
+from metodos.Transfer import _complete_transfer, _prepare_transfer
+from services.resilience import ENDPOINT_LIMITS
+
+
+# El limite de proxy/transfer (5/s, rafaga 10) acota el ritmo real; mas hilos
+# solo esperarian turno.
+BULK_TRANSFER_CONCURRENCY = 8
+# Todo el lote corre dentro de un request: se aceptan las conversaciones que ese
+# limite deja transferir en BULK_TRANSFER_MAX_SECONDS, por debajo de los timeouts
+# de los proxies (como el long-poll, que corta a los 55 s).
+BULK_TRANSFER_MAX_SECONDS = 50
+_TRANSFER_RATE, _TRANSFER_BURST = ENDPOINT_LIMITS["proxy/transfer"]
+BULK_TRANSFER_MAX_CONVERSATIONS = int(_TRANSFER_RATE * BULK_TRANSFER_MAX_SECONDS + _TRANSFER_BURST)
+DEFAULT_TRANSFER_STATE = 1
+
+logger = logging.getLogger(__name__)
+
+
+def prepare_bulk_transfer(payload, repository=default_repository):
+    if not isinstance(payload, dict):
+        return {"ok": False, "status_code": 400, "error": "Payload JSON invalido"}, None
+
+    raw_ids = payload.get("id_conversaciones")
+    if not isinstance(raw_ids, list) or not raw_ids:
+        return {"ok": False, "status_code": 400, "error": "id_conversaciones debe ser una lista no vacia"}, None
+    try:
+        target_channel = int(payload.get("id_canal"))
+    except (TypeError, ValueError):
+        return {"ok": False, "status_code": 400, "error": "id_canal debe ser numerico"}, None
+
+    conversation_ids = [str(item if item is not None else "").strip() for item in raw_ids]
+    if not all(conversation_ids):
+        return {"ok": False, "status_code": 400, "error": "id_conversaciones contiene un id vacio"}, None
+    conversation_ids = list(dict.fromkeys(conversation_ids))
+    if len(conversation_ids) > BULK_TRANSFER_MAX_CONVERSATIONS:
+        return {
+            "ok": False,
+            "status_code": 413,
+            "error": f"La transferencia supera el maximo de {BULK_TRANSFER_MAX_CONVERSATIONS} conversaciones",
+        }, None
+
+    channels = repository.conversation_channels(conversation_ids=conversation_ids)
+    message = str(payload.get("mensaje") or "").strip()
+    conversations = []
+    for conversation_id in conversation_ids:
+        data = {"id_conversacion": conversation_id, "id_canal": target_channel, "estado": payload.get("estado", DEFAULT_TRANSFER_STATE)}
+        if message:
+            data["mensaje"] = message
+        conversations.append((conversation_id, channels.get(conversation_id) or "proxy", data))
+
+    return None, {"bulk_id": uuid.uuid4().hex[:12], "id_canal": target_channel, "conversations": conversations}
+
+
+def _transfer_one(data):
+    error, res = call_liveconnect_waiting(_prepare_transfer(data), "transfer")
+    return error or _complete_transfer(res)
+
+
+def run_bulk_transfer(plan, repository=default_repository, concurrency=BULK_TRANSFER_CONCURRENCY):
+    # Cada conversacion se transfiere por separado: un error no detiene al resto.
+    started = time.perf_counter()
+    conversations = plan["conversations"]
+    with ThreadPoolExecutor(max_workers=max(1, int(concurrency)), thread_name_prefix="bulk-transfer") as executor:
+        outcomes = list(executor.map(_transfer_one, [data for _, _, data in conversations]))
+
+    results = []
+    log_rows = []
+    errors = Counter()
+    for (conversation_id, canal, _), outcome in zip(conversations, outcomes):
+        ok = outcome.get("ok") is not False
+        result = {"id_conversacion": conversation_id, "ok": ok, "status_code": outcome.get("status_code")}
+        if ok:
+            log_rows.append(
+                repository.prepare_message(
+                    conversation_id=conversation_id,
+                    canal=canal,
+                    sender="agent",
+                    message=f"Conversacion transferida al canal {plan['id_canal']}",
+                    message_type="structured",
+                    metadata={
+                        "source": "transfer",
+                        "bulk_id": plan["bulk_id"],
+                        "id_canal": plan["id_canal"],
+                        "status_code": outcome.get("status_code"),
+                    },
+                    external_id=f"transfer:{plan['bulk_id']}",
+                )
+            )
+        else:
+            result["error"] = str(outcome.get("error") or outcome.get("message") or outcome.get("raw_response"))
+            errors[result["error"]] += 1
+        results.append(result)
+
+    warnings = []
+    try:
+        repository.save_messages(log_rows)
+    except Exception as error:
+        logger.exception("No se pudo guardar el log de la transferencia %s", plan["bulk_id"])
+        warnings.append(f"No se pudieron guardar {len(log_rows)} mensajes localmente: {str(error)}")
+
+    failed = len(results) - len(log_rows)
+    return {
+        "ok": failed == 0,
+        # 207: el lote corrio pero algunas conversaciones fallaron (ver results).
+        "status_code": 200 if failed == 0 else 207,
+        "bulk_id": plan["bulk_id"],
+        "id_canal": plan["id_canal"],
+        "total": len(results),
+        "transferred": len(log_rows),
+        "failed": failed,
+        "errors": [{"error": error, "count": count} for error, count in errors.most_common()],
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        "warnings": warnings,
+        "results": results,
+    }
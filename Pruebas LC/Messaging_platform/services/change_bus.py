@@ -0,0 +1,152 @@
+import atexit
+import logging
+import os
+import threading
+
+from DB.database import default_repository
+
+
+# Cada cuanto se revisa si otro proceso hizo commit; los commits del propio
+# proceso despiertan al bus en el acto.
+TAIL_INTERVAL_SECONDS = 0.5
+CHANGE_BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeBus:
+    # Publica a los suscriptores del proceso las filas nuevas de change_log, en
+    # orden de seq. Un solo hilo por proceso sigue la tabla: el repositorio lo
+    # despierta despues de cada commit local y PRAGMA data_version delata los
+    # commits de otros workers. Sin suscriptores el hilo no toca SQLite.
+
+    def __init__(self, repository=default_repository, tail_interval=TAIL_INTERVAL_SECONDS, batch_size=CHANGE_BATCH_SIZE):
+        self.repository = repository
+        self.tail_interval = tail_interval
+        self.batch_size = batch_size
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._seq = None
+        self._probe = None
+        self._probe_pid = None
+        self._data_version = None
+        self._thread = None
+        self._closed = False
+        repository.add_change_listener(self.notify)
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def start(self):
+        with self._lock:
+            if self._closed or (self._thread and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._run, name="change-bus", daemon=True)
+            self._thread.start()
+
+    def close(self, timeout=None):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        self._wakeup.set()
+        if thread:
+            thread.join(timeout)
+        self._close_probe()
+
+    def notify(self):
+        # Lo llama el repositorio despues de cada commit; no toca SQLite.
+        if self._subscribers:
+            self._wakeup.set()
+
+    def subscribe(self, callback, entities=None):
+        # callback(changes) corre en el hilo del bus con los cambios nuevos de las
+        # entidades pedidas ("message", "conversation"; None = todas).
+        key = object()
+        if self._seq is None:
+            seq = self.repository.max_change_seq()
+            with self._poll_lock:
+                if self._seq is None:
+                    self._seq = seq
+        with self._lock:
+            self._subscribers[key] = (callback, frozenset(entities) if entities else None)
+        self.start()
+        self._wakeup.set()
+
+        def unsubscribe():
+            with self._lock:
+                self._subscribers.pop(key, None)
+                if not self._subscribers:
+                    # Sin oyentes no se sigue la tabla; al volver se parte del final.
+                    self._seq = None
+
+        return unsubscribe
+
+    def poll(self):
+        # Lee y publica un lote; devuelve cuantos cambios leyo.
+        with self._poll_lock:
+            if self._seq is None:
+                return 0
+            changes = self.repository.changes_after(self._seq, limit=self.batch_size)
+            if not changes:
+                return 0
+            self._seq = changes[-1]["seq"]
+            self._publish(changes)
+            return len(changes)
+
+    def _publish(self, changes):
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+        for callback, entities in subscribers:
+            selected = changes if entities is None else [change for change in changes if change["entity"] in entities]
+            if not selected:
+                continue
+            try:
+                callback(selected)
+            except Exception:
+                logger.exception("Fallo un suscriptor del bus de cambios")
+
+    def _data_changed(self):
+        if self._probe_pid != os.getpid():
+            # La conexion de sondeo no debe cruzar un fork.
+            self._probe = self.repository.open_change_probe()
+            self._probe_pid = os.getpid()
+            self._data_version = None
+        version = self.repository.data_version(self._probe)
+        changed = version != self._data_version
+        self._data_version = version
+        return changed
+
+    def _close_probe(self):
+        probe = self._probe
+        self._probe = None
+        self._probe_pid = None
+        if probe is not None:
+            probe.close()
+
+    def _run(self):
+        while True:
+            woken = self._wakeup.wait(self.tail_interval if self._subscribers else None)
+            self._wakeup.clear()
+            if self._closed:
+                return
+            if not self._subscribers:
+                continue
+            try:
+                # Se consulta siempre para que un commit local ya leido no
+                # provoque otra lectura en el siguiente intervalo.
+                committed = self._data_changed()
+                if not woken and not committed:
+                    continue
+                while self.poll() >= self.batch_size:
+                    pass
+            except Exception:
+                logger.exception("No se pudo leer change_log")
+
+
+default_change_bus = ChangeBus()
+atexit.register(default_change_bus.close)
@@ -0,0 +1,289 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+
+from DB.database import get_cached_balance
+from metodos.Balance import get_balance as fetch_balance, get_balance_async as fetch_balance_async
+from metodos.Channels import _prepare_channels, get_channels as fetch_channels, get_channels_async as fetch_channels_async
+from metodos.GetWebhook import get_webhook as fetch_webhook, get_webhook_async as fetch_webhook_async
+from metodos.Setwebhook import set_webhook as push_webhook, set_webhook_async as push_webhook_async
+
+
+# Segundos que una respuesta se sirve sin revalidar. Pasado el TTL se sigue
+# sirviendo al instante y se refresca en segundo plano, hasta MAX_STALE_SECONDS.
+DEFAULT_TTL_SECONDS = 60
+CACHE_TTLS = {
+    "balance": 60,
+    "channels/list": 300,
+    # Cada worker tiene su propia cache: un setWebhook en otro proceso solo se
+    # nota aqui al vencer el TTL.
+    "getWebhook": 60,
+}
+MAX_STALE_SECONDS = 24 * 60 * 60
+# Las claves salen de parametros del request (/config/channels, id_canal): se
+# guardan a lo sumo MAX_ENTRIES y se descarta la usada hace mas tiempo.
+MAX_ENTRIES = 256
+
+logger = logging.getLogger(__name__)
+
+
+class StaleWhileRevalidateCache:
+    # Cache en memoria de respuestas de LiveConnect por (endpoint, parametros).
+    # Solo guarda respuestas exitosas; si el refresco falla se sigue sirviendo el
+    # valor anterior. Cada respuesta indica su antiguedad en "cache".
+
+    def __init__(
+        self,
+        ttls=None,
+        default_ttl=DEFAULT_TTL_SECONDS,
+        max_stale=MAX_STALE_SECONDS,
+        clock=time.time,
+        max_entries=MAX_ENTRIES,
+    ):
+        self.ttls = dict(CACHE_TTLS if ttls is None else ttls)
+        self.default_ttl = default_ttl
+        self.max_stale = max_stale
+        self.clock = clock
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        # invalidate() sube la generacion de la clave; una consulta (en primer
+        # plano o de refresco) iniciada antes no guarda su resultado. Se borra al
+        # terminar la ultima consulta en curso de esa clave.
+        self._generations = {}
+        self._fetching = {}
+        self._refreshing = set()
+        # Clave -> [lock, llamadores]; el lock se borra al soltarlo el ultimo.
+        self._key_locks = {}
+        self._async_key_locks = {}
+        self._lock = threading.Lock()
+
+    def _ttl(self, key):
+        return self.ttls.get(key[0], self.default_ttl)
+
+    def _acquire_slot(self, locks, key, factory):
+        with self._lock:
+            slot = locks.setdefault(key, [factory(), 0])
+            slot[1] += 1
+        return slot
+
+    def _release_slot(self, locks, key, slot):
+        with self._lock:
+            slot[1] -= 1
+            if not slot[1]:
+                locks.pop(key, None)
+
+    @contextmanager
+    def _key_lock(self, key):
+        slot = self._acquire_slot(self._key_locks, key, threading.Lock)
+        try:
+            with slot[0]:
+                yield
+        finally:
+            self._release_slot(self._key_locks, key, slot)
+
+    @asynccontextmanager
+    async def _async_key_lock(self, key):
+        slot = self._acquire_slot(self._async_key_locks, key, asyncio.Lock)
+        try:
+            async with slot[0]:
+                yield
+        finally:
+            self._release_slot(self._async_key_locks, key, slot)
+
+    def _begin_fetch(self, key):
+        with self._lock:
+            self._fetching[key] = self._fetching.get(key, 0) + 1
+            return self._generations.get(key, 0)
+
+    def _end_fetch(self, key):
+        with self._lock:
+            remaining = self._fetching.pop(key, 1) - 1
+            if remaining:
+                self._fetching[key] = remaining
+            else:
+                self._generations.pop(key, None)
+
+    @staticmethod
+    def _annotate(value, age, hit, stale):
+        return {**value, "cache": {"hit": hit, "age_seconds": round(max(0.0, age), 1), "stale": stale}}
+
+    def peek(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            return None
+        value, fetched_at = entry
+        return value, self.clock() - fetched_at
+
+    def store(self, key, value, fetched_at=None, generation=None):
+        with self._lock:
+            # Una consulta iniciada antes de invalidar no debe revivir el valor viejo.
+            if generation is not None and generation != self._generations.get(key, 0):
+                return False
+            self._entries[key] = (value, self.clock() if fetched_at is None else fetched_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def _remember(self, key, result, generation=None):
+        if isinstance(result, dict) and result.get("ok") is not False:
+            return self.store(key, result, generation=generation)
+        return False
+
+    def _revalidate(self, key, fetch):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        generation = self._begin_fetch(key)
+
+        def run():
+            try:
+                self._remember(key, fetch(), generation=generation)
+            except Exception:
+                logger.exception("Fallo el refresco en segundo plano de %s", key[0])
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+                self._end_fetch(key)
+
+        threading.Thread(target=run, name=f"cache-refresh-{key[0]}", daemon=True).start()
+
+    def _cached(self, key, fetch):
+        cached = self.peek(key)
+        if cached is None:
+            return None
+        value, age = cached
+        if age < self._ttl(key):
+            return self._annotate(value, age, hit=True, stale=False)
+        if age < self.max_stale:
+            self._revalidate(key, fetch)
+            return self._annotate(value, age, hit=True, stale=True)
+        return None
+
+    def _fallback(self, key, result, generation=None):
+        if self._remember(key, result, generation=generation):
+            return self._annotate(result, 0, hit=False, stale=False)
+        cached = self.peek(key)
+        if cached is None:
+            return result
+        value, age = cached
+        stale = self._annotate(value, age, hit=True, stale=True)
+        stale["warning"] = f"LiveConnect no respondio; se muestran datos de hace {round(age)} s"
+        return stale
+
+    def get(self, key, fetch):
+        cached = self._cached(key, fetch)
+        if cached is not None:
+            return cached
+        # Un solo llamador por clave va al upstream; el resto espera su resultado.
+        with self._key_lock(key):
+            cached = self._cached(key, fetch)
+            if cached is not None:
+                return cached
+            generation = self._begin_fetch(key)
+            try:
+                return self._fallback(key, fetch(), generation)
+            finally:
+                self._end_fetch(key)
+
+    async def get_async(self, key, fetch, fetch_async):
+        cached = self._cached(key, fetch)
+        if cached is not None:
+            return cached
+        async with self._async_key_lock(key):
+            cached = self._cached(key, fetch)
+            if cached is not None:
+                return cached
+            generation = self._begin_fetch(key)
+            try:
+                return self._fallback(key, await fetch_async(), generation)
+            finally:
+                self._end_fetch(key)
+
+
+default_config_cache = StaleWhileRevalidateCache()
+
+
+def _seed_balance(cache):
+    # El ultimo balance persistido en system_config sirve tras un reinicio.
+    if cache.peek(("balance",)) is not None:
+        return
+    persisted = get_cached_balance()
+    if isinstance(persisted, dict) and isinstance(persisted.get("fetched_at"), (int, float)):
+        value = {key: item for key, item in persisted.items() if key != "fetched_at"}
+        cache.store(("balance",), value, fetched_at=persisted["fetched_at"])
+
+
+def _channels_key(filters):
+    params = _prepare_channels(filters)["params"]
+    return ("channels/list", tuple(sorted((str(key), str(value).strip()) for key, value in params.items())))
+
+
+def _webhook_key(id_canal):
+    return ("getWebhook", str(id_canal).strip())
+
+
+def get_balance(cache=default_config_cache):
+    _seed_balance(cache)
+    return cache.get(("balance",), fetch_balance)
+
+
+async def get_balance_async(cache=default_config_cache):
+    # get_cached_balance lee SQLite: se hace fuera del event loop.
+    if cache.peek(("balance",)) is None:
+        await asyncio.to_thread(_seed_balance, cache)
+    return await cache.get_async(("balance",), fetch_balance, fetch_balance_async)
+
+
+def get_channels(filters=None, cache=default_config_cache):
+    return cache.get(_channels_key(filters), lambda: fetch_channels(filters))
+
+
+async def get_channels_async(filters=None, cache=default_config_cache):
+    return await cache.get_async(
+        _channels_key(filters),
+        lambda: fetch_channels(filters),
+        lambda: fetch_channels_async(filters),
+    )
+
+
+def get_webhook(id_canal, cache=default_config_cache):
+    if not str(id_canal).strip():
+        return fetch_webhook(id_canal)
+    return cache.get(_webhook_key(id_canal), lambda: fetch_webhook(id_canal))
+
+
+async def get_webhook_async(id_canal, cache=default_config_cache):
+    if not str(id_canal).strip():
+        return await fetch_webhook_async(id_canal)
+    return await cache.get_async(
+        _webhook_key(id_canal),
+        lambda: fetch_webhook(id_canal),
+        lambda: fetch_webhook_async(id_canal),
+    )
+
+
+def _invalidate_webhook(data, result, cache):
+    if isinstance(data, dict) and data.get("id_canal") is not None and result.get("ok") is not False:
+        cache.invalidate(_webhook_key(data["id_canal"]))
+    return result
+
+
+def set_webhook(data, cache=default_config_cache):
+    return _invalidate_webhook(data, push_webhook(data), cache)
+
+
+async def set_webhook_async(data, cache=default_config_cache):
+    return _invalidate_webhook(data, await push_webhook_async(data), cache)
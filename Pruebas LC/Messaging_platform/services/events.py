@@ -0,0 +1,318 @@
+import asyncio
+import atexit
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from DB.database import default_repository
+from services.change_bus import default_change_bus
+
+
+# Mensajes recientes que se guardan en memoria para reanudar con Last-Event-ID
+# sin ir a SQLite.
+EVENT_BUFFER_SIZE = 2000
+EVENT_READ_BATCH = 500
+# Mas atras del buffer se relee de SQLite; por encima de este limite se pide al
+# cliente que recargue (evento resync).
+REPLAY_LIMIT = 1000
+HEARTBEAT_SECONDS = 15
+SSE_RETRY_MS = 3000
+
+logger = logging.getLogger(__name__)
+
+
+def parse_event_id(value):
+    try:
+        event_id = int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+    return event_id if event_id >= 0 else None
+
+
+def parse_conversation_filter(values):
+    # ?conversation_id=a&conversation_id=b (o "a,b"); vacio = todas.
+    conversation_ids = {part.strip() for value in values or () for part in str(value).split(",") if part.strip()}
+    return frozenset(conversation_ids) or None
+
+
+def format_sse(event):
+    data = json.dumps(event["data"], ensure_ascii=False)
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {data}\n\n"
+
+
+def _entries_from_rows(rows):
+    # Una entrada por mensaje: (id, conversation_id, eventos). conversation.updated
+    # va solo con el ultimo mensaje de cada conversacion del lote.
+    last_for_conversation = {message["conversation_id"]: message["id"] for message, _ in rows}
+    entries = []
+    for message, conversation in rows:
+        events = [{"id": message["id"], "event": "message.created", "data": message}]
+        if last_for_conversation[message["conversation_id"]] == message["id"]:
+            events.append({"id": message["id"], "event": "conversation.updated", "data": conversation})
+        entries.append((message["id"], message["conversation_id"], events))
+    return entries
+
+
+def _select(entries, conversation_ids):
+    # El filtro por conversacion aplica a message.created; conversation.updated
+    # siempre se entrega (lo usa el sidebar).
+    events = []
+    for _, conversation_id, entry_events in entries:
+        for event in entry_events:
+            if conversation_ids is None or event["event"] != "message.created" or conversation_id in conversation_ids:
+                events.append(event)
+    return events
+
+
+class MessageEventHub:
+    # Consumidor del bus de cambios: mientras haya streams abiertos, cada lote con
+    # mensajes insertados (de este u otro proceso) hace leer de SQLite los
+    # mensajes con id mayor al ultimo visto y despierta a los streams en espera.
+
+    def __init__(
+        self,
+        repository=default_repository,
+        bus=default_change_bus,
+        buffer_size=EVENT_BUFFER_SIZE,
+        read_batch=EVENT_READ_BATCH,
+    ):
+        self.repository = repository
+        self.bus = bus
+        self.read_batch = read_batch
+        self._cond = threading.Condition()
+        self._entries = deque(maxlen=buffer_size)
+        # El buffer tiene todos los mensajes con floor < id <= head.
+        self._head = None
+        self._floor = None
+        # message.updated (p. ej. un adjunto ya espejado): (serial, head al
+        # registrarlo, conversation_id, evento). Solo se reenvian desde memoria.
+        self._updates = deque(maxlen=buffer_size)
+        self._update_serial = 0
+        self._subscribers = 0
+        self._async_waiters = set()
+        self._unsubscribe_bus = None
+
+    def close(self, timeout=None):
+        with self._cond:
+            unsubscribe_bus, self._unsubscribe_bus = self._unsubscribe_bus, None
+        if unsubscribe_bus:
+            unsubscribe_bus()
+
+    def subscribe(self):
+        head = None
+        if self._head is None:
+            head = self.repository.max_message_id()
+        with self._cond:
+            self._subscribers += 1
+            if self._head is None:
+                self._head = self._floor = head
+                self._entries.clear()
+            if self._unsubscribe_bus is None:
+                self._unsubscribe_bus = self.bus.subscribe(self._on_changes, entities=("message",))
+            return self._head
+
+    def unsubscribe(self):
+        with self._cond:
+            self._subscribers -= 1
+            if self._subscribers > 0:
+                return
+            # Sin oyentes el buffer deja de estar al dia: se descarta.
+            self._subscribers = 0
+            self._head = self._floor = None
+            self._entries.clear()
+            self._updates.clear()
+            unsubscribe_bus, self._unsubscribe_bus = self._unsubscribe_bus, None
+        if unsubscribe_bus:
+            unsubscribe_bus()
+
+    def _on_changes(self, changes):
+        media_ids = [change["entity_id"] for change in changes if change["op"] == "media"]
+        try:
+            if any(change["op"] == "insert" for change in changes):
+                while self._read_new() >= self.read_batch:
+                    pass
+            if media_ids:
+                self._read_media(media_ids)
+        except Exception:
+            logger.exception("No se pudieron leer los mensajes nuevos")
+
+    def _read_media(self, message_ids):
+        rows = self.repository.message_media(message_ids)
+        if not rows:
+            return
+        with self._cond:
+            if self._head is None:
+                return
+            for message_id, conversation_id, local_file_url in rows:
+                self._update_serial += 1
+                data = {"id": message_id, "conversation_id": conversation_id, "local_file_url": local_file_url}
+                event = {"event": "message.updated", "data": data}
+                self._updates.append((self._update_serial, self._head, conversation_id, event))
+            self._cond.notify_all()
+            waiters = list(self._async_waiters)
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    def _update_cursor_after(self, after_id):
+        # Al reanudar con Last-Event-ID se reenvian los message.updated que
+        # siguen en memoria desde ese id (repetir uno no tiene efecto).
+        with self._cond:
+            if after_id is not None:
+                for serial, head, _, _ in self._updates:
+                    if head >= after_id:
+                        return serial - 1
+            return self._update_serial
+
+    def _read_new(self):
+        head = self._head
+        if head is None:
+            return 0
+        rows = self.repository.message_events_after(head, limit=self.read_batch)
+        if not rows:
+            return 0
+        entries = _entries_from_rows(rows)
+        with self._cond:
+            if self._head != head:
+                return 0
+            for entry in entries:
+                if len(self._entries) == self._entries.maxlen:
+                    self._floor = self._entries[0][0]
+                self._entries.append(entry)
+            self._head = entries[-1][0]
+            self._cond.notify_all()
+            waiters = list(self._async_waiters)
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+        return len(rows)
+
+    def _collect(self, cursor, conversation_ids, update_cursor=None):
+        # (eventos, nuevo cursor, nuevo cursor de updates) desde el buffer, o None
+        # si el cursor quedo atras.
+        with self._cond:
+            if self._head is None or cursor < self._floor:
+                return None
+            # El buffer esta ordenado por id: se recorre desde el final.
+            entries = []
+            for entry in reversed(self._entries):
+                if entry[0] <= cursor:
+                    break
+                entries.append(entry)
+            entries.reverse()
+            events = _select(entries, conversation_ids)
+            if update_cursor is not None:
+                # Van despues de los mensajes y con el id del head, asi el
+                # Last-Event-ID del cliente nunca retrocede.
+                for serial, _, conversation_id, event in self._updates:
+                    if serial > update_cursor and (conversation_ids is None or conversation_id in conversation_ids):
+                        events.append({**event, "id": self._head})
+                update_cursor = self._update_serial
+            return events, self._head, update_cursor
+
+    def _replay(self, cursor, conversation_ids):
+        rows = self.repository.message_events_after(cursor, limit=REPLAY_LIMIT + 1)
+        if len(rows) > REPLAY_LIMIT:
+            head = self.repository.max_message_id()
+            return [{"id": head, "event": "resync", "data": {"reason": "Demasiados eventos pendientes"}}], head
+        if not rows:
+            return [], cursor
+        return _select(_entries_from_rows(rows), conversation_ids), rows[-1][0]["id"]
+
+    def _idle(self, cursor, update_cursor):
+        return self._head == cursor and (update_cursor is None or update_cursor == self._update_serial)
+
+    def wait(self, cursor, conversation_ids=None, timeout=HEARTBEAT_SECONDS):
+        # Bloquea hasta que haya eventos despues de cursor o venza el timeout.
+        events, cursor, _ = self._wait(cursor, None, conversation_ids, timeout)
+        return events, cursor
+
+    def _wait(self, cursor, update_cursor, conversation_ids, timeout):
+        # Con update_cursor tambien entrega los message.updated posteriores.
+        deadline = time.monotonic() + timeout
+        while True:
+            collected = self._collect(cursor, conversation_ids, update_cursor)
+            if collected is None:
+                return (*self._replay(cursor, conversation_ids), update_cursor)
+            events, cursor, update_cursor = collected
+            remaining = deadline - time.monotonic()
+            if events or remaining <= 0:
+                return events, cursor, update_cursor
+            with self._cond:
+                if self._idle(cursor, update_cursor):
+                    self._cond.wait(remaining)
+
+    async def wait_async(self, cursor, conversation_ids=None, timeout=HEARTBEAT_SECONDS):
+        # Igual que wait pero sin ocupar un hilo: cada espera es un future.
+        events, cursor, _ = await self._wait_async(cursor, None, conversation_ids, timeout)
+        return events, cursor
+
+    async def _wait_async(self, cursor, update_cursor, conversation_ids, timeout):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            collected = self._collect(cursor, conversation_ids, update_cursor)
+            if collected is None:
+                events, cursor = await asyncio.to_thread(self._replay, cursor, conversation_ids)
+                return events, cursor, update_cursor
+            events, cursor, update_cursor = collected
+            remaining = deadline - loop.time()
+            if events or remaining <= 0:
+                return events, cursor, update_cursor
+            waiter = (loop, loop.create_future())
+            with self._cond:
+                if not self._idle(cursor, update_cursor):
+                    continue
+                self._async_waiters.add(waiter)
+            try:
+                await asyncio.wait_for(waiter[1], remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._cond:
+                    self._async_waiters.discard(waiter)
+
+    def stream(self, after_id=None, conversation_ids=None, heartbeat=HEARTBEAT_SECONDS):
+        # Generador SSE para Flask; el comentario ": ping" mantiene viva la conexion
+        # y permite detectar al cliente que se fue.
+        cursor = self.subscribe()
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            update_cursor = self._update_cursor_after(after_id)
+            if after_id is not None:
+                cursor = after_id
+            while True:
+                events, cursor, update_cursor = self._wait(cursor, update_cursor, conversation_ids, heartbeat)
+                if not events:
+                    yield ": ping\n\n"
+                for event in events:
+                    yield format_sse(event)
+        finally:
+            self.unsubscribe()
+
+    async def stream_async(self, after_id=None, conversation_ids=None, heartbeat=HEARTBEAT_SECONDS):
+        cursor = await asyncio.to_thread(self.subscribe)
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            update_cursor = self._update_cursor_after(after_id)
+            if after_id is not None:
+                cursor = after_id
+            while True:
+                events, cursor, update_cursor = await self._wait_async(
+                    cursor, update_cursor, conversation_ids, heartbeat
+                )
+                if not events:
+                    yield ": ping\n\n"
+                for event in events:
+                    yield format_sse(event)
+        finally:
+            self.unsubscribe()
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+default_event_hub = MessageEventHub()
+atexit.register(default_event_hub.close)
@@ -0,0 +1,142 @@
+import asyncio
+import itertools
+import json
+import time
+
+import httpx
+import requests
+
+from services.liveconnect_client import BASE_URL, DEFAULT_TIMEOUT, ENDPOINT_TIMEOUTS, POOL_MAXSIZE
+from services.resilience import default_upstream
+from services.upstream_metrics import default_metrics
+
+# En asyncio una conexion en espera no ocupa un hilo: el limite se fija por
+# llamadas simultaneas hacia LiveConnect y no por workers.
+MAX_CONNECTIONS = 1000
+MAX_KEEPALIVE_CONNECTIONS = POOL_MAXSIZE
+# httpcore recorre todas las conexiones del pool por cada request en cola; con
+# cientos en vuelo conviene repartirlas en varios pools chicos (round robin).
+POOL_SHARDS = 16
+
+
+class UpstreamResponse:
+    # Misma interfaz que usan los metodos de requests.Response (ok, status_code,
+    # text, headers, json) para compartir el paso de normalizacion.
+
+    def __init__(self, status_code, text, headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers if headers is not None else {}
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class AsyncLiveConnectClient:
+    # Version asyncio de LiveConnectClient. Los errores de red se traducen a
+    # requests.RequestException para que los metodos manejen un solo tipo.
+
+    def __init__(
+        self,
+        base_url=BASE_URL,
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        timeouts=None,
+        default_timeout=DEFAULT_TIMEOUT,
+        verify=True,
+        pool_shards=POOL_SHARDS,
+        resilience=None,
+        metrics=None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.pool_shards = max(1, min(int(pool_shards), int(max_connections)))
+        self.limits = httpx.Limits(
+            max_connections=max(1, max_connections // self.pool_shards),
+            max_keepalive_connections=max(1, max_keepalive_connections // self.pool_shards),
+        )
+        self.timeouts = dict(ENDPOINT_TIMEOUTS if timeouts is None else timeouts)
+        self.default_timeout = default_timeout
+        self.verify = verify
+        self.resilience = resilience
+        self.metrics = metrics
+        self._clients = []
+        self._next_client = itertools.count()
+        self._loop = None
+
+    @property
+    def client(self):
+        # httpx.AsyncClient queda atado al event loop donde se creo.
+        loop = asyncio.get_running_loop()
+        if not self._clients or self._loop is not loop:
+            self._clients = [
+                httpx.AsyncClient(limits=self.limits, verify=self.verify)
+                for _ in range(self.pool_shards)
+            ]
+            self._loop = loop
+        return self._clients[next(self._next_client) % len(self._clients)]
+
+    def timeout_for(self, path):
+        connect, read = self.timeouts.get(path.strip("/"), self.default_timeout)
+        return httpx.Timeout(read, connect=connect)
+
+    def url_for(self, path):
+        return f"{self.base_url}/{path.strip('/')}"
+
+    async def _send(self, method, path, timeout, kwargs):
+        try:
+            return await self.client.request(method, self.url_for(path), timeout=timeout, **kwargs)
+        except httpx.ConnectTimeout as error:
+            # Se distingue porque el request no salio y siempre se puede reintentar.
+            raise requests.ConnectTimeout(str(error) or "ConnectTimeout") from error
+        except httpx.TimeoutException as error:
+            raise requests.Timeout(str(error) or "Timeout") from error
+        except httpx.HTTPError as error:
+            raise requests.ConnectionError(str(error) or type(error).__name__) from error
+
+    async def request(self, method, path, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = self.timeout_for(path)
+        elif isinstance(timeout, tuple):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+
+        async def send():
+            started = time.perf_counter()
+            try:
+                response = await self._send(method, path, timeout, kwargs)
+            except requests.RequestException as error:
+                if self.metrics is not None:
+                    self.metrics.observe_call(path, time.perf_counter() - started, error=error)
+                raise
+            if self.metrics is not None:
+                self.metrics.observe_call(
+                    path,
+                    time.perf_counter() - started,
+                    status_code=response.status_code,
+                    request_bytes=len(response.request.content),
+                    response_bytes=len(response.content),
+                )
+            return UpstreamResponse(response.status_code, response.text, response.headers)
+
+        if self.resilience is None:
+            return await send()
+        return await self.resilience.call_async(path, send)
+
+    async def get(self, path, **kwargs):
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request("POST", path, **kwargs)
+
+    async def aclose(self):
+        clients = self._clients
+        self._clients = []
+        self._loop = None
+        for client in clients:
+            await client.aclose()
+
+
+default_async_client = AsyncLiveConnectClient(resilience=default_upstream, metrics=default_metrics)
@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from services.resilience import default_upstream
+from services.upstream_metrics import default_metrics
+
+
+BASE_URL = "https://api.liveconnect.chat/prod"
+
+# Conexiones keep-alive reutilizables hacia LiveConnect; debe cubrir los hilos
+# que atienden requests a la vez (threaded de Flask o los workers de gunicorn).
+POOL_MAXSIZE = 32
+
+# (conexion, lectura) en segundos.
+DEFAULT_TIMEOUT = (5, 20)
+ENDPOINT_TIMEOUTS = {
+    "account/token": (5, 15),
+    "proxy/sendMessage": (5, 20),
+    "proxy/sendQuickAnswer": (5, 20),
+    "proxy/sendFile": (5, 30),
+    "proxy/transfer": (5, 20),
+    "proxy/balance": (5, 20),
+    "proxy/setWebhook": (5, 20),
+    "proxy/getWebhook": (5, 20),
+    "channels/list": (5, 20),
+}
+
+
+class LiveConnectClient:
+    # Una sola sesion HTTP compartida: evita el handshake TCP+TLS en cada
+    # request proxied. Los errores de red se propagan como requests.RequestException.
+    # Con resilience cada llamada pasa por limite, circuito y reintentos; con
+    # metrics se registra cada intento (latencia, status y bytes).
+
+    def __init__(
+        self,
+        base_url=BASE_URL,
+        pool_maxsize=POOL_MAXSIZE,
+        timeouts=None,
+        default_timeout=DEFAULT_TIMEOUT,
+        verify=True,
+        resilience=None,
+        metrics=None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.pool_maxsize = max(1, int(pool_maxsize))
+        self.timeouts = dict(ENDPOINT_TIMEOUTS if timeouts is None else timeouts)
+        self.default_timeout = default_timeout
+        self.verify = verify
+        self.resilience = resilience
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._session = None
+        self._session_pid = None
+
+    def _build_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    @property
+    def session(self):
+        # Igual que el pool de SQLite: las conexiones no deben cruzar un fork.
+        if self._session is None or self._session_pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._session_pid != os.getpid():
+                    self._session = self._build_session()
+                    self._session_pid = os.getpid()
+        return self._session
+
+    def timeout_for(self, path):
+        return self.timeouts.get(path.strip("/"), self.default_timeout)
+
+    def url_for(self, path):
+        return f"{self.base_url}/{path.strip('/')}"
+
+    def request(self, method, path, timeout=None, **kwargs):
+        # verify va en cada llamada: session.verify lo pisa REQUESTS_CA_BUNDLE.
+        kwargs.setdefault("verify", self.verify)
+
+        def send():
+            started = time.perf_counter()
+            try:
+                response = self.session.request(
+                    method,
+                    self.url_for(path),
+                    timeout=timeout if timeout is not None else self.timeout_for(path),
+                    **kwargs,
+                )
+            except requests.RequestException as error:
+                if self.metrics is not None:
+                    self.metrics.observe_call(path, time.perf_counter() - started, error=error)
+                raise
+            if self.metrics is not None:
+                self.metrics.observe_call(
+                    path,
+                    time.perf_counter() - started,
+                    status_code=response.status_code,
+                    request_bytes=len(response.request.body or b""),
+                    response_bytes=len(response.content),
+                )
+            return response
+
+        if self.resilience is None:
+            return send()
+        return self.resilience.call(path, send)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def close(self):
+        with self._lock:
+            session = self._session
+            self._session = None
+        if session is not None:
+            session.close()
+
+
+default_client = LiveConnectClient(resilience=default_upstream, metrics=default_metrics)
@@ -0,0 +1,96 @@
+import atexit
+import threading
+
+from services.change_bus import default_change_bus
+
+
+LONG_POLL_DEFAULT_SECONDS = 25
+# Por debajo de los timeouts tipicos de proxies (60s) para no cortar la espera.
+LONG_POLL_MAX_SECONDS = 55
+
+
+def parse_wait(raw_wait):
+    if raw_wait is None or str(raw_wait).strip() == "":
+        return LONG_POLL_DEFAULT_SECONDS
+    try:
+        seconds = float(str(raw_wait).strip())
+    except ValueError:
+        raise ValueError("wait debe ser numerico") from None
+    if not seconds >= 0:
+        raise ValueError("wait no puede ser negativo")
+    return min(seconds, LONG_POLL_MAX_SECONDS)
+
+
+class Waiter:
+    # Sin loop espera un hilo (threading.Event); con loop es un future del event
+    # loop, asi una espera async no ocupa ningun hilo.
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+class ConversationWaiters:
+    # Esperas de long-poll agrupadas por conversacion. Las despiertan los inserts
+    # de mensajes que publica el bus de cambios (de este u otro proceso); una
+    # espera no consulta SQLite ni retiene conexiones del pool.
+
+    def __init__(self, bus=default_change_bus):
+        self.bus = bus
+        self._lock = threading.Lock()
+        self._subscribe_lock = threading.Lock()
+        self._waiters = {}
+        self._unsubscribe_bus = None
+
+    def add(self, conversation_id, waiter):
+        with self._subscribe_lock:
+            if self._unsubscribe_bus is None:
+                # La suscripcion queda abierta: un cliente de long-poll reconecta
+                # enseguida y el bus sin cambios solo sondea data_version.
+                self._unsubscribe_bus = self.bus.subscribe(self._on_changes, entities=("message",))
+        with self._lock:
+            self._waiters.setdefault(conversation_id, set()).add(waiter)
+
+    def discard(self, conversation_id, waiter):
+        with self._lock:
+            waiters = self._waiters.get(conversation_id)
+            if waiters is None:
+                return
+            waiters.discard(waiter)
+            if not waiters:
+                del self._waiters[conversation_id]
+
+    def count(self):
+        with self._lock:
+            return sum(len(waiters) for waiters in self._waiters.values())
+
+    def close(self):
+        with self._subscribe_lock:
+            unsubscribe_bus, self._unsubscribe_bus = self._unsubscribe_bus, None
+        if unsubscribe_bus:
+            unsubscribe_bus()
+
+    def _on_changes(self, changes):
+        conversation_ids = {change["conversation_id"] for change in changes if change["op"] == "insert"}
+        woken = []
+        with self._lock:
+            for conversation_id in conversation_ids:
+                woken.extend(self._waiters.pop(conversation_id, ()))
+        for waiter in woken:
+            waiter.wake()
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+default_conversation_waiters = ConversationWaiters()
+atexit.register(default_conversation_waiters.close)
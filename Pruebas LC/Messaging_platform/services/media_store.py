@@ -0,0 +1,328 @@
+import atexit
+import hashlib
+import ipaddress
+import logging
+import mimetypes
+import os
+import queue
+import re
+import socket
+import tempfile
+import threading
+from urllib.parse import unquote, urljoin, urlsplit
+
+import requests
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import NEED_DATA, Data, Epilogue, File, MultipartDecoder
+from werkzeug.utils import send_file
+
+from DB.database import default_repository
+
+
+MEDIA_DIR = "media"
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+# Las rutas /media/<sha256> nunca cambian de contenido: cache de un anio.
+MEDIA_CACHE_MAX_AGE = 365 * 24 * 3600
+# URL publica con la que LiveConnect descarga nuestros archivos; si es None se
+# usa la URL con la que llego la peticion.
+PUBLIC_BASE_URL = None
+MIRROR_INCOMING_MEDIA = True
+# El webhook no esta autenticado: solo se descarga del CDN de LiveConnect y
+# nunca de una IP privada, de loopback o link-local (SSRF).
+MIRROR_ALLOWED_HOSTS = ("cdn.liveconnect.chat",)
+MIRROR_MAX_REDIRECTS = 3
+MIRROR_TIMEOUT_SECONDS = 30
+DEFAULT_CONTENT_TYPE = "application/octet-stream"
+# Cualquiera puede subir archivos y el CDN manda el tipo que quiera: solo estos
+# tipos se muestran en linea. El resto (html, svg, js...) se descarga como
+# adjunto para que nunca se ejecute en el origen del Inbox.
+INLINE_CONTENT_TYPES = frozenset(
+    {"image/png", "image/jpeg", "image/gif", "image/webp", "image/bmp", "application/pdf"}
+)
+INLINE_CONTENT_TYPE_PREFIXES = ("audio/", "video/")
+MEDIA_SECURITY_HEADERS = {"X-Content-Type-Options": "nosniff", "Content-Security-Policy": "sandbox"}
+
+SHA256_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class MediaTooLarge(ValueError):
+    pass
+
+
+def _guess_content_type(file_name):
+    return mimetypes.guess_type(file_name or "")[0] or DEFAULT_CONTENT_TYPE
+
+
+def inline_allowed(content_type):
+    content_type = (content_type or "").split(";", 1)[0].strip().lower()
+    return content_type in INLINE_CONTENT_TYPES or content_type.startswith(INLINE_CONTENT_TYPE_PREFIXES)
+
+
+def media_url(sha256, base_url=""):
+    return f"{(base_url or '').rstrip('/')}/media/{sha256}"
+
+
+def mirror_allowed(url, allowed_hosts=MIRROR_ALLOWED_HOSTS):
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+    except ValueError:
+        return False
+    return parts.scheme in ("http", "https") and host in allowed_hosts
+
+
+def _check_public_address(url):
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    try:
+        infos = socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise ValueError("no se pudo resolver el host") from None
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%", 1)[0])
+        if not address.is_global:
+            raise ValueError("la url apunta a una direccion no publica")
+
+
+class MediaStore:
+    # Archivos direccionados por contenido: el nombre en disco es el sha256, asi
+    # que subir dos veces lo mismo ocupa un solo archivo.
+
+    def __init__(
+        self,
+        root=MEDIA_DIR,
+        repository=default_repository,
+        max_bytes=MAX_UPLOAD_BYTES,
+        allowed_hosts=MIRROR_ALLOWED_HOSTS,
+    ):
+        self.root = root
+        self.repository = repository
+        self.max_bytes = max_bytes
+        self.allowed_hosts = allowed_hosts
+
+    def path_for(self, sha256):
+        sha256 = str(sha256 or "").lower()
+        if not SHA256_PATTERN.fullmatch(sha256):
+            return None
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def get(self, sha256):
+        path = self.path_for(sha256)
+        if path is None or not os.path.isfile(path):
+            return None, None
+        record = self.repository.get_media(sha256.lower())
+        if record is None:
+            return None, None
+        return os.path.abspath(path), record
+
+    def serve(self, sha256, environ):
+        path, record = self.get(sha256)
+        if path is None:
+            return None
+        inline = inline_allowed(record["content_type"])
+        # conditional=True: Range, If-None-Match y envio con wsgi.file_wrapper.
+        response = send_file(
+            path,
+            environ,
+            mimetype=record["content_type"] if inline else DEFAULT_CONTENT_TYPE,
+            as_attachment=not inline,
+            download_name=record["file_name"] or record["sha256"],
+            conditional=True,
+            etag=record["sha256"],
+            max_age=MEDIA_CACHE_MAX_AGE,
+        )
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        response.headers.update(MEDIA_SECURITY_HEADERS)
+        return response
+
+    def _spool(self, chunks):
+        # Escribe a un temporal mientras calcula el hash; nada queda completo en memoria.
+        tmp_dir = os.path.join(self.root, ".tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise MediaTooLarge(f"El archivo supera el maximo de {self.max_bytes} bytes")
+                    digest.update(chunk)
+                    handle.write(chunk)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path, digest.hexdigest(), size
+
+    def _store(self, tmp_path, sha256, size, content_type, file_name):
+        path = self.path_for(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+        file_name = file_name or sha256
+        self.repository.save_media(sha256, size, content_type or _guess_content_type(file_name), file_name)
+        return self.repository.get_media(sha256)
+
+    def save_chunks(self, chunks, content_type=None, file_name=None):
+        return self._store(*self._spool(chunks), content_type, file_name)
+
+    def _multipart_file_chunks(self, stream, boundary, field_name, parts):
+        # Solo se guarda la primera parte de archivo con ese nombre; el resto se descarta.
+        decoder = MultipartDecoder(boundary.encode("latin-1"))
+        current = False
+        while True:
+            event = decoder.next_event()
+            if event is NEED_DATA:
+                decoder.receive_data(stream.read(CHUNK_SIZE) or None)
+            elif isinstance(event, File):
+                current = event.name == field_name and not parts
+                if current:
+                    parts.append(event)
+            elif isinstance(event, Data):
+                if current and event.data:
+                    yield event.data
+                if not event.more_data:
+                    current = False
+            elif isinstance(event, Epilogue):
+                return
+
+    def save_multipart(self, stream, content_type_header, field_name="file"):
+        mimetype, options = parse_options_header(content_type_header or "")
+        boundary = options.get("boundary")
+        if mimetype != "multipart/form-data" or not boundary:
+            return {"ok": False, "status_code": 400, "error": "Se esperaba multipart/form-data"}
+
+        parts = []
+        try:
+            tmp_path, sha256, size = self._spool(self._multipart_file_chunks(stream, boundary, field_name, parts))
+        except MediaTooLarge as error:
+            return {"ok": False, "status_code": 413, "error": str(error)}
+        except ValueError as error:
+            return {"ok": False, "status_code": 400, "error": f"multipart invalido: {str(error)}"}
+        if not parts or not parts[0].filename:
+            os.remove(tmp_path)
+            return {"ok": False, "status_code": 400, "error": f"{field_name} es requerido"}
+
+        part = parts[0]
+        record = self._store(tmp_path, sha256, size, part.headers.get("Content-Type"), os.path.basename(part.filename))
+        return {"ok": True, "status_code": 201, "data": self.describe(record)}
+
+    def describe(self, record):
+        return {**record, "url": media_url(record["sha256"])}
+
+    def resolve_send_file(self, data, base_url):
+        # sendFile con media_id: LiveConnect descarga el archivo desde /media.
+        if not isinstance(data, dict) or not data.get("media_id") or data.get("url"):
+            return None, data
+        _, record = self.get(data.get("media_id"))
+        if record is None:
+            return {"ok": False, "status_code": 404, "error": "media_id no encontrado"}, None
+        file_name = record["file_name"] or record["sha256"]
+        resolved = {**data, "url": media_url(record["sha256"], PUBLIC_BASE_URL or base_url)}
+        resolved.setdefault("nombre", file_name)
+        if not resolved.get("extension") and "." in file_name:
+            resolved["extension"] = file_name.rsplit(".", 1)[1]
+        return None, resolved
+
+    def _check_mirror_url(self, url):
+        if not mirror_allowed(url, self.allowed_hosts):
+            raise ValueError("url no permitida para espejar")
+        _check_public_address(url)
+
+    def _open_mirror(self, url, session):
+        # Las redirecciones se siguen a mano para validar cada destino.
+        for _ in range(MIRROR_MAX_REDIRECTS + 1):
+            self._check_mirror_url(url)
+            response = session.get(url, stream=True, timeout=MIRROR_TIMEOUT_SECONDS, allow_redirects=False)
+            if not response.is_redirect:
+                return response
+            response.close()
+            url = urljoin(url, response.headers["Location"])
+        raise ValueError("demasiadas redirecciones")
+
+    def mirror(self, url, session=None):
+        # Descarga en streaming un adjunto remoto y recuerda su sha256.
+        if not mirror_allowed(url, self.allowed_hosts):
+            raise ValueError("url no permitida para espejar")
+        known = self.repository.media_for_urls([url])
+        if url in known:
+            return self.repository.get_media(known[url])
+
+        with self._open_mirror(url, session or requests) as response:
+            response.raise_for_status()
+            declared = response.headers.get("Content-Length")
+            if declared and declared.isdigit() and int(declared) > self.max_bytes:
+                raise MediaTooLarge(f"El archivo supera el maximo de {self.max_bytes} bytes")
+            content_type = parse_options_header(response.headers.get("Content-Type") or "")[0] or None
+            file_name = unquote(urlsplit(url).path.rsplit("/", 1)[-1]) or None
+            record = self.save_chunks(response.iter_content(CHUNK_SIZE), content_type, file_name)
+        self.repository.link_media_source(url, record["sha256"])
+        return record
+
+
+class MediaMirror:
+    # Espeja en segundo plano los adjuntos de los webhooks para que el Inbox
+    # los sirva desde /media en vez de ir al CDN de LiveConnect.
+
+    def __init__(self, store):
+        self.store = store
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._thread = None
+        self._closed = False
+
+    def start(self):
+        with self._lock:
+            if self._closed or (self._thread and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._run, name="media-mirror", daemon=True)
+            self._thread.start()
+
+    def submit(self, url):
+        if not url:
+            return False
+        with self._lock:
+            if self._closed or url in self._pending:
+                return False
+            self._pending.add(url)
+            self._queue.put(url)
+        self.start()
+        return True
+
+    def close(self, timeout=None):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+            self._queue.put(_STOP)
+        if thread:
+            thread.join(timeout)
+
+    def _run(self):
+        while True:
+            url = self._queue.get()
+            if url is _STOP:
+                return
+            try:
+                self.store.mirror(url)
+            except Exception:
+                logger.warning("No se pudo espejar %s", url, exc_info=True)
+            finally:
+                with self._lock:
+                    self._pending.discard(url)
+
+
+default_media_store = MediaStore()
+default_media_mirror = MediaMirror(default_media_store)
+atexit.register(default_media_mirror.close)
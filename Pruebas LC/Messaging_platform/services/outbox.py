@@ -0,0 +1,160 @@
+import atexit
+import logging
+import random
+import threading
+import time
+
+import requests
+
+from DB.database import OUTBOX_LEASE_SECONDS, default_repository
+from metodos.Proxy import call_liveconnect, upstream_error
+from metodos.SendFile import _complete_send_file, _prepare_send_file
+from metodos.SendMessage import _complete_send_message, _prepare_send_message
+from metodos.SendQuickAnswer import _complete_send_quick_answer, _prepare_send_quick_answer
+
+
+# Envios simultaneos hacia LiveConnect; cada worker entrega uno a la vez.
+OUTBOX_WORKERS = 8
+OUTBOX_POLL_SECONDS = 1.0
+OUTBOX_MAX_ATTEMPTS = 10
+OUTBOX_RETRY_BASE_SECONDS = 2
+OUTBOX_RETRY_MAX_SECONDS = 300
+
+OUTBOX_KINDS = {
+    "sendMessage": (_prepare_send_message, _complete_send_message),
+    "sendQuickAnswer": (_prepare_send_quick_answer, _complete_send_quick_answer),
+    "sendFile": (_prepare_send_file, _complete_send_file),
+}
+
+logger = logging.getLogger(__name__)
+
+
+def _is_retryable_status(status_code):
+    return status_code == 429 or status_code >= 500
+
+
+class OutboxDispatcher:
+    # Los envios se guardan en la tabla outbox antes de responder (202) y un pool
+    # de workers los entrega. Entrega al menos una vez: si el proceso cae a mitad
+    # de un envio, el lease vence y se reenvia; el guardado local usa
+    # external_id "outbox:<id>" para no duplicar el mensaje del agente.
+
+    def __init__(
+        self,
+        repository=default_repository,
+        workers=OUTBOX_WORKERS,
+        poll_interval=OUTBOX_POLL_SECONDS,
+        max_attempts=OUTBOX_MAX_ATTEMPTS,
+        lease_seconds=OUTBOX_LEASE_SECONDS,
+    ):
+        self.repository = repository
+        self.workers = max(1, int(workers))
+        self.poll_interval = poll_interval
+        self.max_attempts = max(1, int(max_attempts))
+        self.lease_seconds = lease_seconds
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._closed = False
+
+    def start(self):
+        with self._lock:
+            if self._closed or any(thread.is_alive() for thread in self._threads):
+                return
+            self._threads = [
+                threading.Thread(target=self._run, name=f"outbox-worker-{index}", daemon=True)
+                for index in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def enqueue(self, kind, data):
+        prepare, _ = OUTBOX_KINDS[kind]
+        error, request = prepare(data)
+        if error:
+            return error
+        outbox_id = self.repository.enqueue_outbox(kind, request["json"]["id_conversacion"], data)
+        self.start()
+        self._wakeup.set()
+        return {"ok": True, "status_code": 202, "outbox_id": outbox_id, "status": "pending"}
+
+    def status(self, outbox_id):
+        item = self.repository.get_outbox(outbox_id)
+        if item is None:
+            return {"ok": False, "status_code": 404, "error": "outbox_id no encontrado"}
+        return {"ok": True, "data": item}
+
+    def close(self, timeout=None):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            threads = self._threads
+        self._stop.set()
+        self._wakeup.set()
+        for thread in threads:
+            thread.join(timeout)
+
+    def process_next(self):
+        items = self.repository.claim_outbox(limit=1, lease_seconds=self.lease_seconds)
+        if not items:
+            return False
+        item = items[0]
+        try:
+            self._deliver(item)
+        except Exception as error:
+            logger.exception("Fallo la entrega del outbox %s", item["id"])
+            self._retry(item, {"ok": False, "error": f"Error interno: {str(error)}"})
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self.process_next():
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _deliver(self, item):
+        prepare, complete = OUTBOX_KINDS[item["kind"]]
+        data = item["payload"]
+        error, request = prepare(data)
+        if error:
+            self.repository.finish_outbox(item["id"], "failed", result=error, error=error["error"])
+            return
+
+        try:
+            res = call_liveconnect(request)
+        except requests.RequestException as error:
+            self._retry(item, upstream_error(error, item["kind"]))
+            return
+        if _is_retryable_status(res.status_code):
+            self._retry(item, {"ok": False, "status_code": res.status_code, "error": f"LiveConnect respondio {res.status_code}"})
+            return
+
+        result = complete(data, request, res, external_id=f"outbox:{item['id']}")
+        if result.get("ok") is False:
+            reason = result.get("error") or result.get("message") or f"LiveConnect respondio {res.status_code}"
+            self.repository.finish_outbox(item["id"], "failed", result=result, error=str(reason))
+        else:
+            self.repository.finish_outbox(item["id"], "sent", result=result)
+
+    def _retry(self, item, result):
+        if item["attempts"] >= self.max_attempts:
+            self.repository.finish_outbox(item["id"], "failed", result=result, error=result.get("error"))
+            return
+        # Backoff exponencial con jitter; retry_after del rechazo local tiene prioridad.
+        delay = result.get("retry_after")
+        if delay is None:
+            ceiling = min(OUTBOX_RETRY_MAX_SECONDS, OUTBOX_RETRY_BASE_SECONDS * 2 ** (item["attempts"] - 1))
+            delay = random.uniform(ceiling / 2, ceiling)
+        self.repository.finish_outbox(
+            item["id"],
+            "pending",
+            result=result,
+            error=result.get("error"),
+            next_attempt_at=time.time() + delay,
+        )
+
+
+default_outbox = OutboxDispatcher()
+atexit.register(default_outbox.close, 5)
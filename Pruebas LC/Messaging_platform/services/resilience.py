@@ -0,0 +1,326 @@
+import asyncio
+import random
+import threading
+import time
+
+import requests
+
+from services.upstream_metrics import default_metrics
+
+# (requests por segundo, rafaga) por endpoint de LiveConnect. Valores
+# conservadores: el upstream no publica sus limites.
+DEFAULT_LIMIT = (5, 10)
+ENDPOINT_LIMITS = {
+    "account/token": (1, 2),
+    "proxy/sendMessage": (50, 100),
+    "proxy/sendQuickAnswer": (50, 100),
+    "proxy/sendFile": (5, 10),
+    "proxy/transfer": (5, 10),
+    "proxy/balance": (2, 5),
+    "proxy/setWebhook": (1, 3),
+    "proxy/getWebhook": (2, 5),
+    "channels/list": (2, 5),
+}
+# Solo se reintentan llamadas de lectura o idempotentes; un envio de mensaje
+# repetido llegaria duplicado al cliente final.
+RETRYABLE_ENDPOINTS = frozenset(
+    {"account/token", "proxy/balance", "proxy/getWebhook", "proxy/setWebhook", "channels/list"}
+)
+RETRY_STATUS_CODES = frozenset({429, 502, 503, 504})
+
+MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY_SECONDS = 0.2
+RETRY_MAX_DELAY_SECONDS = 2.0
+# Espera maxima por un token del bucket antes de rechazar con 429.
+RATE_LIMIT_MAX_WAIT_SECONDS = 1.0
+
+FAILURE_THRESHOLD = 5
+RECOVERY_TIMEOUT_SECONDS = 30
+
+
+class UpstreamUnavailable(requests.RequestException):
+    # Rechazo local (limite o circuito abierto): el request no llego a LiveConnect.
+
+    def __init__(self, message, status_code=503, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, max_wait):
+        # Reserva un token y devuelve cuanto esperar para usarlo, o None si la
+        # espera superaria max_wait (en ese caso no se consume nada).
+        with self._lock:
+            self._refill(self.clock())
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+    def snapshot(self):
+        with self._lock:
+            self._refill(self.clock())
+            return {
+                "rate": self.rate,
+                "capacity": self.capacity,
+                "tokens": round(max(0.0, self._tokens), 2),
+            }
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold=FAILURE_THRESHOLD,
+        recovery_timeout=RECOVERY_TIMEOUT_SECONDS,
+        clock=time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self._state == self.OPEN:
+                remaining = self._opened_at + self.recovery_timeout - self.clock()
+                if remaining > 0:
+                    raise UpstreamUnavailable(
+                        "LiveConnect no disponible (circuito abierto)",
+                        retry_after=remaining,
+                    )
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._state == self.HALF_OPEN:
+                # Una sola llamada de prueba; el resto falla rapido hasta conocer el resultado.
+                if self._trial_in_flight:
+                    raise UpstreamUnavailable(
+                        "LiveConnect no disponible (circuito en prueba)",
+                        retry_after=1.0,
+                    )
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        # La llamada admitida no llego a LiveConnect: no cuenta como resultado,
+        # pero libera la prueba del estado semiabierto.
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = self.clock()
+
+    def snapshot(self):
+        with self._lock:
+            retry_in = 0.0
+            if self._state == self.OPEN:
+                retry_in = max(0.0, self._opened_at + self.recovery_timeout - self.clock())
+            return {
+                "state": self._state,
+                "failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "retry_in": round(retry_in, 2),
+            }
+
+
+def _retry_after_seconds(response):
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("Retry-After")
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class ResilientUpstream:
+    # Envuelve cada llamada a LiveConnect: limite por endpoint, circuito compartido
+    # y reintentos con backoff exponencial y jitter completo.
+
+    def __init__(
+        self,
+        limits=None,
+        retryable=RETRYABLE_ENDPOINTS,
+        max_attempts=MAX_ATTEMPTS,
+        base_delay=RETRY_BASE_DELAY_SECONDS,
+        max_delay=RETRY_MAX_DELAY_SECONDS,
+        max_wait=RATE_LIMIT_MAX_WAIT_SECONDS,
+        breaker=None,
+        clock=time.monotonic,
+        metrics=None,
+    ):
+        self.limits = dict(ENDPOINT_LIMITS if limits is None else limits)
+        self.retryable = frozenset(retryable)
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait
+        self.breaker = breaker or CircuitBreaker(clock=clock)
+        self.clock = clock
+        self.metrics = metrics
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, endpoint):
+        bucket = self._buckets.get(endpoint)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(endpoint)
+                if bucket is None:
+                    rate, capacity = self.limits.get(endpoint, DEFAULT_LIMIT)
+                    bucket = TokenBucket(rate, capacity, clock=self.clock)
+                    self._buckets[endpoint] = bucket
+        return bucket
+
+    def _admit(self, endpoint):
+        # Primero el circuito: con el circuito abierto no se gasta un token.
+        try:
+            self.breaker.before_call()
+        except UpstreamUnavailable:
+            self._observe_rejection(endpoint, "circuit")
+            raise
+        bucket = self._bucket(endpoint)
+        wait = bucket.reserve(self.max_wait)
+        if wait is None:
+            self.breaker.release()
+            self._observe_rejection(endpoint, "rate_limit")
+            raise UpstreamUnavailable(
+                f"Limite de requests alcanzado para {endpoint}",
+                status_code=429,
+                retry_after=1 / bucket.rate,
+            )
+        return wait
+
+    def _observe_rejection(self, endpoint, reason):
+        if self.metrics is not None:
+            self.metrics.observe_rejection(endpoint, reason)
+
+    def _observe_retry(self, endpoint, delay):
+        if self.metrics is not None:
+            self.metrics.observe_retry(endpoint, delay)
+
+    def _record(self, response=None, error=None):
+        if error is not None or response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def _retry_delay(self, endpoint, attempt, response=None, error=None):
+        if attempt >= self.max_attempts:
+            return None
+        if error is not None:
+            # ConnectTimeout garantiza que el request no salio: se puede repetir siempre.
+            if isinstance(error, requests.ConnectTimeout):
+                pass
+            elif endpoint not in self.retryable or not isinstance(error, (requests.ConnectionError, requests.Timeout)):
+                return None
+        elif endpoint not in self.retryable or response.status_code not in RETRY_STATUS_CODES:
+            return None
+        else:
+            retry_after = _retry_after_seconds(response)
+            if retry_after is not None:
+                return retry_after if retry_after <= self.max_delay else None
+        return random.random() * min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+
+    def call(self, path, send):
+        endpoint = path.strip("/")
+        attempt = 0
+        while True:
+            attempt += 1
+            wait = self._admit(endpoint)
+            try:
+                if wait:
+                    time.sleep(wait)
+                response = send()
+            except requests.RequestException as error:
+                self._record(error=error)
+                delay = self._retry_delay(endpoint, attempt, error=error)
+                if delay is None:
+                    raise
+            except Exception as error:
+                # Cualquier otro error tambien resuelve la prueba del circuito;
+                # si no, el estado semiabierto quedaria bloqueado.
+                self._record(error=error)
+                raise
+            except BaseException:
+                # Interrupcion o cancelacion: no hubo respuesta de LiveConnect.
+                self.breaker.release()
+                raise
+            else:
+                self._record(response=response)
+                delay = self._retry_delay(endpoint, attempt, response=response)
+                if delay is None:
+                    return response
+            self._observe_retry(endpoint, delay)
+            time.sleep(delay)
+
+    async def call_async(self, path, send):
+        endpoint = path.strip("/")
+        attempt = 0
+        while True:
+            attempt += 1
+            wait = self._admit(endpoint)
+            try:
+                if wait:
+                    await asyncio.sleep(wait)
+                response = await send()
+            except requests.RequestException as error:
+                self._record(error=error)
+                delay = self._retry_delay(endpoint, attempt, error=error)
+                if delay is None:
+                    raise
+            except Exception as error:
+                self._record(error=error)
+                raise
+            except BaseException:
+                self.breaker.release()
+                raise
+            else:
+                self._record(response=response)
+                delay = self._retry_delay(endpoint, attempt, response=response)
+                if delay is None:
+                    return response
+            self._observe_retry(endpoint, delay)
+            await asyncio.sleep(delay)
+
+    def snapshot(self):
+        endpoints = {}
+        for endpoint in sorted(set(self.limits) | set(self._buckets)):
+            endpoints[endpoint] = {
+                **self._bucket(endpoint).snapshot(),
+                "retryable": endpoint in self.retryable,
+            }
+        return {"circuit": self.breaker.snapshot(), "endpoints": endpoints}
+
+
+default_upstream = ResilientUpstream(metrics=default_metrics)
@@ -0,0 +1,108 @@
+import atexit
+import logging
+import threading
+import time
+
+from DB.database import ARCHIVE_BATCH_SIZE, default_repository
+
+
+MESSAGE_RETENTION_DAYS = 180
+INACTIVE_CONVERSATION_DAYS = 90
+# change_log solo sirve para que los consumidores se pongan al dia; no es historico.
+CHANGE_LOG_RETENTION_DAYS = 7
+RETENTION_INTERVAL_SECONDS = 6 * 60 * 60
+# El archivado automatico es opcional: lo archivado sale de /search y el Inbox
+# solo lo muestra al pedir historial (?archived=1). Sin el, el worker solo
+# depura change_log y el archivado se corre con POST /config/retention.
+AUTO_ARCHIVE = False
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_days(value, default, field_name):
+    if value is None or str(value).strip() == "":
+        return default
+    try:
+        days = int(str(value).strip())
+    except ValueError:
+        raise ValueError(f"{field_name} debe ser numerico") from None
+    if days < 0:
+        raise ValueError(f"{field_name} no puede ser negativo")
+    return days
+
+
+def run_retention(
+    repository=default_repository,
+    older_than_days=None,
+    inactive_days=None,
+    batch_size=ARCHIVE_BATCH_SIZE,
+):
+    try:
+        message_days = _parse_days(older_than_days, MESSAGE_RETENTION_DAYS, "older_than_days")
+        conversation_days = _parse_days(inactive_days, INACTIVE_CONVERSATION_DAYS, "inactive_days")
+    except ValueError as error:
+        return {"ok": False, "status_code": 400, "error": str(error)}
+
+    started = time.perf_counter()
+    # El VACUUM unico que activa auto_vacuum corre aqui, no al arrancar.
+    vacuumed = repository.enable_incremental_vacuum()
+    result = repository.archive_messages(
+        older_than_days=message_days,
+        inactive_days=conversation_days,
+        batch_size=batch_size,
+    )
+    pruned_changes = repository.prune_change_log(CHANGE_LOG_RETENTION_DAYS)
+    return {
+        "ok": True,
+        "older_than_days": message_days,
+        "inactive_days": conversation_days,
+        "archived": result["archived"],
+        "freed_pages": result["freed_pages"],
+        "vacuumed": vacuumed,
+        "pruned_changes": pruned_changes,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+class RetentionWorker:
+    # Ejecuta la retencion en segundo plano cada cierto intervalo; los lotes
+    # cortos de archive_messages dejan pasar las escrituras del webhook. Con
+    # archive=False solo depura change_log.
+
+    def __init__(self, repository=default_repository, interval=RETENTION_INTERVAL_SECONDS, archive=AUTO_ARCHIVE):
+        self.repository = repository
+        self.interval = interval
+        self.archive = archive
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._stop.is_set() or (self._thread and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._run, name="retention-worker", daemon=True)
+            self._thread.start()
+
+    def close(self, timeout=None):
+        self._stop.set()
+        thread = self._thread
+        if thread:
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.archive:
+                    result = run_retention(self.repository)
+                    if result["archived"]:
+                        logger.info("Retencion: %s mensajes archivados", result["archived"])
+                else:
+                    self.repository.prune_change_log(CHANGE_LOG_RETENTION_DAYS)
+            except Exception:
+                logger.exception("Fallo la retencion de mensajes")
+            self._stop.wait(self.interval)
+
+
+default_retention_worker = RetentionWorker()
+atexit.register(default_retention_worker.close)
@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+
+# Requests de Flask que pueden correr a la vez bajo ASGI; un stream largo
+# (p. ej. /broadcast) ocupa uno de estos hilos mientras dura.
+WSGI_WORKER_THREADS = 32
+
+
+class ThreadedWsgiToAsgi(WsgiToAsgi):
+    # WsgiToAsgi corre cada request con thread_sensitive=True, es decir todas en
+    # un mismo hilo y de a una. Aqui cada request va a un hilo del pool.
+
+    def __init__(self, wsgi_application, max_workers=WSGI_WORKER_THREADS, duplicate_header_limit=100):
+        super().__init__(wsgi_application, duplicate_header_limit)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="wsgi")
+
+    async def __call__(self, scope, receive, send):
+        instance = _ThreadedWsgiToAsgiInstance(self.wsgi_application, self.duplicate_header_limit, self.executor)
+        await instance(scope, receive, send)
+
+    def close(self, wait=False):
+        self.executor.shutdown(wait=wait)
+
+
+class _ThreadedWsgiToAsgiInstance(WsgiToAsgiInstance):
+    # Escrito contra asgiref==3.12.1 (requirements.txt): se reimplementa
+    # run_wsgi_app con lo que WsgiToAsgiInstance.__call__ deja listo (scope,
+    # sync_send) y sus metodos build_environ y start_response. Al subir asgiref
+    # hay que revisar que eso siga igual; tests/test_threaded_wsgi.py lo cubre.
+
+    def __init__(self, wsgi_application, duplicate_header_limit, executor):
+        super().__init__(wsgi_application, duplicate_header_limit)
+        self.executor = executor
+
+    async def run_wsgi_app(self, body):
+        await sync_to_async(self._serve, thread_sensitive=False, executor=self.executor)(body)
+
+    def _send_start(self):
+        if not self.response_started:
+            self.response_started = True
+            self.sync_send(self.response_start)
+
+    def _serve(self, body):
+        try:
+            environ = self.build_environ(self.scope, body)
+        except ValueError:
+            # Demasiados headers repetidos (duplicate_header_limit).
+            self.sync_send({"type": "http.response.start", "status": 400, "headers": [(b"content-type", b"text/plain")]})
+            self.sync_send({"type": "http.response.body", "body": b"Bad Request: Too many duplicate headers"})
+            return
+        output = self.wsgi_application(environ, self.start_response)
+        try:
+            bytes_sent = 0
+            for chunk in output:
+                self._send_start()
+                # No se envia mas de lo que declara Content-Length.
+                if self.response_content_length is not None:
+                    chunk = chunk[: self.response_content_length - bytes_sent]
+                self.sync_send({"type": "http.response.body", "body": chunk, "more_body": True})
+                bytes_sent += len(chunk)
+                if bytes_sent == self.response_content_length:
+                    break
+        finally:
+            # PEP 3333: el iterable se cierra siempre (p. ej. archivos de send_file).
+            if hasattr(output, "close"):
+                output.close()
+        self._send_start()
+        self.sync_send({"type": "http.response.body"})
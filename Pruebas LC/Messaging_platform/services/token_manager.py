@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import threading
+import time
+
+# LiveConnect define expiracion de 8 horas; se resta 1 minuto por seguridad.
+TOKEN_TTL_SECONDS = 28800 - 60
+# La renovacion en segundo plano ocurre este tiempo antes de expirar, asi el
+# request casi nunca espera a /account/token.
+REFRESH_MARGIN_SECONDS = 600
+REFRESH_RETRY_SECONDS = 30
+
+logger = logging.getLogger(__name__)
+
+
+class TokenManager:
+    # Single-flight: un solo hilo renueva el token mientras el resto espera el
+    # mismo resultado. El token puede persistirse (system_config) para que un
+    # reinicio u otro worker lo reutilice en lugar de pedir uno nuevo.
+
+    def __init__(
+        self,
+        fetch_token,
+        repository=None,
+        ttl=TOKEN_TTL_SECONDS,
+        refresh_margin=REFRESH_MARGIN_SECONDS,
+        retry_delay=REFRESH_RETRY_SECONDS,
+        clock=time.time,
+        metrics=None,
+    ):
+        self.fetch_token = fetch_token
+        self.repository = repository
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.retry_delay = retry_delay
+        self.clock = clock
+        self.metrics = metrics
+        # (token, expira_en) en una sola tupla: se lee sin lock en el camino rapido.
+        self._state = (None, 0)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._closed = False
+
+    def _is_fresh(self, token, expires_at):
+        return bool(token) and self.clock() < expires_at
+
+    def get_token(self):
+        token, expires_at = self._state
+        if self._is_fresh(token, expires_at):
+            return token
+        return self.refresh(stale_token=token)
+
+    async def get_token_async(self):
+        token, expires_at = self._state
+        if self._is_fresh(token, expires_at):
+            return token
+        # La espera del lock y la llamada HTTP van en un hilo para no bloquear el loop.
+        return await asyncio.to_thread(self.refresh, token)
+
+    def refresh(self, stale_token=None):
+        # stale_token es el token que el llamador ya sabe invalido (expirado o 401);
+        # si otro hilo ya lo reemplazo se devuelve el nuevo sin volver a pedirlo.
+        with self._lock:
+            token, expires_at = self._state
+            if token != stale_token and self._is_fresh(token, expires_at):
+                return token
+
+            started = time.perf_counter()
+            persisted = self._load_persisted()
+            if persisted and persisted[0] != stale_token and self._is_fresh(*persisted):
+                self._set_state(*persisted)
+                self._observe_refresh(started, "persisted")
+                return persisted[0]
+
+            try:
+                token = self.fetch_token()
+            except Exception as error:
+                self._observe_refresh(started, "fetched", error)
+                raise
+            self._observe_refresh(started, "fetched")
+            expires_at = self.clock() + self.ttl
+            self._set_state(token, expires_at)
+            self._persist(token, expires_at)
+            return token
+
+    async def refresh_async(self, stale_token=None):
+        return await asyncio.to_thread(self.refresh, stale_token)
+
+    def _observe_refresh(self, started, source, error=None):
+        if self.metrics is not None:
+            self.metrics.observe_token_refresh(time.perf_counter() - started, source, error)
+
+    def set_token(self, token, expires_at):
+        with self._lock:
+            self._set_state(token, expires_at)
+
+    def _set_state(self, token, expires_at):
+        self._state = (token, expires_at)
+        self._wakeup.set()
+        self.start()
+
+    def _load_persisted(self):
+        if self.repository is None:
+            return None
+        try:
+            cached = self.repository.get_cached_token()
+        except Exception:
+            logger.exception("No se pudo leer el token persistido")
+            return None
+        if not isinstance(cached, dict):
+            return None
+        return cached.get("token"), float(cached.get("expires_at") or 0)
+
+    def _persist(self, token, expires_at):
+        if self.repository is None:
+            return
+        try:
+            self.repository.save_token({"token": token, "expires_at": expires_at})
+        except Exception:
+            logger.exception("No se pudo persistir el token")
+
+    def start(self):
+        if self._closed or (self._thread and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self._run, name="token-refresh", daemon=True)
+        self._thread.start()
+
+    def close(self, timeout=None):
+        self._closed = True
+        self._wakeup.set()
+        thread = self._thread
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._closed:
+            token, expires_at = self._state
+            delay = expires_at - self.refresh_margin - self.clock()
+            # Un token nuevo o el cierre despiertan al hilo para recalcular la espera.
+            if self._wakeup.wait(max(0, delay)):
+                self._wakeup.clear()
+                continue
+            try:
+                self.refresh(stale_token=token)
+            except Exception:
+                logger.exception("Fallo la renovacion del token en segundo plano")
+                self._wakeup.wait(self.retry_delay)
+                self._wakeup.clear()
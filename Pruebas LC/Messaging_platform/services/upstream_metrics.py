@@ -0,0 +1,195 @@
+import logging
+import threading
+import time
+
+
+# Limites superiores (ms) de los buckets del histograma de latencia; lo que
+# supera el ultimo cae en "+inf".
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+PERCENTILES = (50, 95, 99)
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyHistogram:
+    def __init__(self, bounds=LATENCY_BUCKETS_MS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, elapsed_ms):
+        index = len(self.bounds)
+        for position, bound in enumerate(self.bounds):
+            if elapsed_ms <= bound:
+                index = position
+                break
+        self.counts[index] += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def _percentile(self, percentile, total):
+        # Estimacion por bucket: se devuelve el limite superior del bucket que
+        # contiene el percentil (el maximo observado si cae en "+inf").
+        target = total * percentile / 100
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return self.bounds[index] if index < len(self.bounds) else round(self.max_ms, 1)
+        return None
+
+    def snapshot(self):
+        total = sum(self.counts)
+        labels = [f"<={bound}" for bound in self.bounds] + ["+inf"]
+        return {
+            "count": total,
+            "avg": round(self.total_ms / total, 1) if total else None,
+            "max": round(self.max_ms, 1),
+            **{f"p{percentile}": self._percentile(percentile, total) for percentile in PERCENTILES},
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class _EndpointStats:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.status_codes = {}
+        self.rejected = {}
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.last_error = None
+
+    def snapshot(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "status_codes": dict(sorted(self.status_codes.items())),
+            "rejected": dict(self.rejected),
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+            "latency_ms": self.latency.snapshot(),
+            "last_error": self.last_error,
+        }
+
+
+class UpstreamMetrics:
+    # Metricas en proceso de cada intento HTTP hacia LiveConnect, de los rechazos
+    # locales (limite/circuito) y de las renovaciones de token. Los listeners
+    # reciben cada evento como dict para alertas o exportadores externos.
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.started_at = clock()
+        self._endpoints = {}
+        self._token = {"refreshes": 0, "fetched": 0, "persisted": 0, "failures": 0, "last_refresh_at": None}
+        self._token_latency = LatencyHistogram()
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._listeners.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._listeners:
+                    self._listeners.remove(callback)
+
+        return unsubscribe
+
+    def _emit(self, event):
+        for callback in list(self._listeners):
+            try:
+                callback(event)
+            except Exception:
+                logger.exception("Fallo un listener de metricas de upstream")
+
+    def _stats(self, endpoint):
+        stats = self._endpoints.get(endpoint)
+        if stats is None:
+            stats = self._endpoints[endpoint] = _EndpointStats()
+        return stats
+
+    def observe_call(self, path, elapsed, status_code=None, error=None, request_bytes=0, response_bytes=0):
+        endpoint = path.strip("/")
+        elapsed_ms = elapsed * 1000
+        with self._lock:
+            stats = self._stats(endpoint)
+            stats.calls += 1
+            stats.latency.observe(elapsed_ms)
+            stats.request_bytes += request_bytes
+            stats.response_bytes += response_bytes
+            if error is not None:
+                stats.errors += 1
+                stats.last_error = f"{type(error).__name__}: {str(error)}"[:300]
+            else:
+                key = str(status_code)
+                stats.status_codes[key] = stats.status_codes.get(key, 0) + 1
+        self._emit(
+            {
+                "type": "call",
+                "endpoint": endpoint,
+                "elapsed_ms": round(elapsed_ms, 1),
+                "status_code": status_code,
+                "error": type(error).__name__ if error is not None else None,
+                "request_bytes": request_bytes,
+                "response_bytes": response_bytes,
+            }
+        )
+
+    def observe_retry(self, path, delay):
+        endpoint = path.strip("/")
+        with self._lock:
+            self._stats(endpoint).retries += 1
+        self._emit({"type": "retry", "endpoint": endpoint, "delay_ms": round(delay * 1000, 1)})
+
+    def observe_rejection(self, path, reason):
+        # reason: "rate_limit" o "circuit"; el request no salio hacia LiveConnect.
+        endpoint = path.strip("/")
+        with self._lock:
+            rejected = self._stats(endpoint).rejected
+            rejected[reason] = rejected.get(reason, 0) + 1
+        self._emit({"type": "rejected", "endpoint": endpoint, "reason": reason})
+
+    def observe_token_refresh(self, elapsed, source, error=None):
+        # source: "fetched" (llamada a account/token) o "persisted" (system_config).
+        with self._lock:
+            self._token["refreshes"] += 1
+            if error is not None:
+                self._token["failures"] += 1
+            else:
+                self._token[source] += 1
+                self._token["last_refresh_at"] = self.clock()
+            self._token_latency.observe(elapsed * 1000)
+        self._emit(
+            {
+                "type": "token_refresh",
+                "source": source,
+                "elapsed_ms": round(elapsed * 1000, 1),
+                "error": type(error).__name__ if error is not None else None,
+            }
+        )
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "since": self.started_at,
+                "uptime_seconds": round(self.clock() - self.started_at, 1),
+                "endpoints": {endpoint: stats.snapshot() for endpoint, stats in sorted(self._endpoints.items())},
+                "token": {**self._token, "latency_ms": self._token_latency.snapshot()},
+            }
+
+    def reset(self):
+        with self._lock:
+            self.started_at = self.clock()
+            self._endpoints = {}
+            self._token = {"refreshes": 0, "fetched": 0, "persisted": 0, "failures": 0, "last_refresh_at": None}
+            self._token_latency = LatencyHistogram()
+
+
+default_metrics = UpstreamMetrics()
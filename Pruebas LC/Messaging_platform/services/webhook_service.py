@@ -1,3 +1,4 @@
+import json
 import re
 
 from DB.database import default_repository
@@ -144,6 +145,24 @@ def _build_metadata(message_obj, file_payload, urls):
     return metadata or None
 
 
+def _extract_external_id(message_obj):
+    # LiveConnect repite el messageUID entre eventos de un mismo mensaje (p. ej.
+    # tipo 0 con el texto y tipo 2 con la tarjeta del documento), asi que el
+    # tipo es parte de la clave. Debe coincidir con _rekey_message_external_id.
+    tipo = message_obj.get("tipo")
+    if isinstance(tipo, (str, int)) and not isinstance(tipo, bool):
+        tipo = str(tipo).strip()
+    else:
+        tipo = ""
+    for key in ("messageUID", "messageId"):
+        value = message_obj.get(key)
+        if isinstance(value, (str, int)) and not isinstance(value, bool):
+            normalized = str(value).strip()
+            if normalized:
+                return f"{normalized}:{tipo}" if tipo else normalized
+    return None
+
+
 def _extract_contact_name(data):
     try:
         name = data["contact_data"]["name"]
@@ -165,9 +184,9 @@ def _resolve_channel(data):
     return str(canal).strip()
 
 
-def process_incoming_webhook(data, repository=default_repository):
+def _build_webhook_message(data):
     if not isinstance(data, dict):
-        return {"status": "error", "ok": False, "error": "Payload JSON invalido"}
+        return {"status": "error", "ok": False, "error": "Payload JSON invalido"}, None
 
     conversation_id = str(data.get("id_conversacion", "")).strip()
     if not conversation_id:
@@ -175,7 +194,7 @@ def process_incoming_webhook(data, repository=default_repository):
             "status": "error",
             "ok": False,
             "error": "id_conversacion es requerido",
-        }
+        }, None
 
     message_obj = _get_message_object(data)
     message_text = _extract_message_text(data)
@@ -188,7 +207,7 @@ def process_incoming_webhook(data, repository=default_repository):
             "status": "ignored",
             "ok": True,
             "warning": "Mensaje vacio ignorado",
-        }
+        }, None
 
     contact_name = _extract_contact_name(data)
     canal = _resolve_channel(data)
@@ -208,16 +227,104 @@ def process_incoming_webhook(data, repository=default_repository):
     }
     if contact_name:
         save_kwargs["contact_name"] = contact_name
+    external_id = _extract_external_id(message_obj)
+    if external_id:
+        save_kwargs["external_id"] = external_id
+    external_at = message_obj.get("timestamp")
+    if external_at is not None:
+        save_kwargs["external_at"] = external_at
+    return None, save_kwargs
+
+
+def process_incoming_webhook(data, repository=default_repository):
+    early_result, save_kwargs = _build_webhook_message(data)
+    if early_result is not None:
+        return early_result
 
     try:
-        repository.save_message(**save_kwargs)
+        saved = repository.save_message(**save_kwargs)
     except TypeError:
         # Fallback for repositories/tests with old signature.
-        repository.save_message(
-            conversation_id=conversation_id,
-            canal=canal,
+        saved = repository.save_message(
+            conversation_id=save_kwargs["conversation_id"],
+            canal=save_kwargs["canal"],
             sender="usuario",
-            message=final_message,
+            message=save_kwargs["message"],
         )
 
+    if saved is False:
+        return {
+            "status": "ignored",
+            "ok": True,
+            "warning": "Mensaje duplicado ignorado",
+        }
+
     return {"status": "ok", "ok": True}
+
+
+def parse_ndjson(lines, max_items=None):
+    # Una linea invalida no corta el lote: se entrega como None y el item
+    # correspondiente se reporta como "Payload JSON invalido". Con max_items se
+    # deja de leer al pasar el limite (devuelve max_items + 1 eventos).
+    payloads = []
+    for raw_line in lines:
+        if max_items is not None and len(payloads) > max_items:
+            break
+        if isinstance(raw_line, bytes):
+            raw_line = raw_line.decode("utf-8", errors="replace")
+        line = raw_line.strip()
+        if not line:
+            continue
+        try:
+            payloads.append(json.loads(line))
+        except ValueError:
+            payloads.append(None)
+    return payloads
+
+
+def process_incoming_webhooks(payloads, repository=default_repository):
+    results = []
+    pending = []
+
+    for index, data in enumerate(payloads):
+        early_result, save_kwargs = _build_webhook_message(data)
+        if early_result is not None:
+            results.append({"index": index, **early_result})
+            continue
+        try:
+            prepared = repository.prepare_message(**save_kwargs)
+        except ValueError as error:
+            results.append({"index": index, "status": "error", "ok": False, "error": str(error)})
+            continue
+        if prepared is None:
+            results.append({"index": index, "status": "ignored", "ok": True, "warning": "Mensaje vacio ignorado"})
+            continue
+        result = {"index": index, "status": "ok", "ok": True}
+        results.append(result)
+        pending.append((result, prepared))
+
+    if pending:
+        # Todo el lote se persiste en una sola transaccion.
+        try:
+            saved = repository.save_messages([prepared for _, prepared in pending])
+        except Exception as error:
+            saved = None
+            for result, _ in pending:
+                result.update({"status": "error", "ok": False, "error": f"No se pudo guardar: {str(error)}"})
+        if saved is not None:
+            for (result, _), was_saved in zip(pending, saved):
+                if not was_saved:
+                    result.update({"status": "ignored", "warning": "Mensaje duplicado ignorado"})
+
+    summary = {"ok": 0, "ignored": 0, "error": 0}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+
+    return {
+        "ok": True,
+        "total": len(results),
+        "saved": summary["ok"],
+        "ignored": summary["ignored"],
+        "errors": summary["error"],
+        "results": results,
+    }
@@ -0,0 +1,149 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from DB.database import default_repository
+
+
+MAX_BATCH_SIZE = 200
+# Con 0 el lote toma lo que se acumulo mientras corria el commit anterior;
+# un valor mayor espera mas webhooks a cambio de latencia.
+MAX_DELAY_SECONDS = 0.0
+COMMIT_TIMEOUT_SECONDS = 10
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    # Group commit: los webhooks concurrentes se agrupan en una sola transaccion.
+    # Cada llamador espera el commit de su lote, asi que un webhook solo se
+    # confirma (HTTP 200) cuando ya esta en disco.
+
+    def __init__(
+        self,
+        repository=default_repository,
+        max_batch_size=MAX_BATCH_SIZE,
+        max_delay=MAX_DELAY_SECONDS,
+        commit_timeout=COMMIT_TIMEOUT_SECONDS,
+    ):
+        self.repository = repository
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_delay = max(0.0, float(max_delay))
+        self.commit_timeout = commit_timeout
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+
+    def start(self):
+        with self._lock:
+            if self._closed or (self._thread and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(
+                target=self._run,
+                name="write-behind-queue",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def submit(self, prepared_message):
+        future = Future()
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._queue.put((prepared_message, future))
+        if closed:
+            # Tras el cierre se escribe en linea para no perder el mensaje.
+            future.set_result(self.repository.save_messages([prepared_message])[0])
+            return future
+        self.start()
+        return future
+
+    def save_message(self, **message):
+        prepared = self.repository.prepare_message(**message)
+        if prepared is None:
+            return False
+        return self.submit(prepared).result(timeout=self.commit_timeout)
+
+    def close(self, timeout=None):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+            self._queue.put(_STOP)
+        if thread:
+            thread.join(timeout)
+        else:
+            self._drain_without_worker()
+
+    def _drain_without_worker(self):
+        pending = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                pending.append(item)
+        if pending:
+            self._flush(pending)
+
+    def _collect_batch(self, first_item):
+        batch = [first_item]
+        stop = False
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stop = True
+                break
+            batch.append(item)
+        return batch, stop
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._drain_without_worker()
+                return
+            batch, stop = self._collect_batch(item)
+            self._flush(batch)
+            if stop:
+                self._drain_without_worker()
+                return
+
+    def _flush(self, batch):
+        futures = [future for _, future in batch]
+        try:
+            results = self.repository.save_messages([message for message, _ in batch])
+        except Exception:
+            logger.exception("Fallo el commit agrupado; reintentando mensaje por mensaje")
+            self._flush_individually(batch)
+            return
+        for future, result in zip(futures, results):
+            future.set_result(result)
+
+    def _flush_individually(self, batch):
+        # Aisla el registro que falla para no rechazar a todo el lote.
+        for message, future in batch:
+            try:
+                future.set_result(self.repository.save_messages([message])[0])
+            except Exception as error:
+                future.set_exception(error)
+
+
+default_write_queue = WriteBehindQueue()
+atexit.register(default_write_queue.close)
@@ -1,6 +1,23 @@
 const APP_CONFIG = Object.freeze({
   conversationsPollMs: 5000,
   messagesPollMs: 2000,
+  outboxPollMs: 1000,
+  outboxMaxPolls: 30,
+  eventsFallbackErrors: 3,
+  eventsRetryMs: 15000,
+  messagePageSize: 100,
+  conversationPageSize: 100,
+  messageRowEstimatePx: 72,
+  conversationRowEstimatePx: 68,
+  virtualOverscanPx: 600,
+  loadOlderThresholdPx: 200,
+  stickToBottomPx: 40,
+  cacheDbName: "inbox-cache",
+  cacheDbVersion: 1,
+  cacheMaxConversations: 50,
+  cacheMaxSidebarConversations: 100,
+  cacheMaxMessages: 20000,
+  messageCatchUpPages: 5,
   defaultTransferChannelId: 3918,
   currencyLocale: "es-CO"
 });
@@ -38,7 +55,14 @@ const UI_TEXT = Object.freeze({
 });
 
 const state = {
-  currentConversation: null
+  currentConversation: null,
+  conversations: new Map(),
+  conversationSync: { cursor: null, etag: null, before: null, loadingOlder: false },
+  messagesByConversation: new Map(),
+  search: { query: "", conversationId: null, after: null, highlight: null },
+  events: { source: null, conversationId: null, lastEventId: null, failures: 0, pollTimers: [], retryTimer: null },
+  views: { conversations: null, messages: null },
+  cache: { db: null, evictTimer: null }
 };
 
 const dom = {
@@ -62,11 +86,15 @@ const dom = {
   chatFileUrl: document.getElementById("chatFileUrl"),
   chatFileName: document.getElementById("chatFileName"),
   chatFileExtension: document.getElementById("chatFileExtension"),
+  chatFileUpload: document.getElementById("chatFileUpload"),
   fileUrl: document.getElementById("fileUrl"),
   fileName: document.getElementById("fileName"),
   fileExtension: document.getElementById("fileExtension"),
   quickAnswerId: document.getElementById("quickAnswerId"),
-  quickAnswerVariables: document.getElementById("quickAnswerVariables")
+  quickAnswerVariables: document.getElementById("quickAnswerVariables"),
+  searchInput: document.getElementById("searchInput"),
+  searchCurrentOnly: document.getElementById("searchCurrentOnly"),
+  searchResults: document.getElementById("searchResults")
 };
 
 function renderConfigStatus(text, isError = false) {
@@ -95,6 +123,22 @@ async function requestJSON(url, options = {}) {
   return { res, data };
 }
 
+async function requestSync(url, etag) {
+  const headers = etag ? { "If-None-Match": etag } : {};
+  const { res, data } = await requestJSON(url, { headers, cache: "no-store" });
+  return {
+    res,
+    data,
+    notModified: res.status === 304,
+    etag: res.headers.get("ETag")
+  };
+}
+
+function withSince(url, cursor) {
+  if (!cursor) return url;
+  return `${url}?since=${encodeURIComponent(cursor)}`;
+}
+
 function postJSON(url, payload) {
   return requestJSON(url, {
     method: "POST",
@@ -103,6 +147,51 @@ function postJSON(url, payload) {
   });
 }
 
+function uploadMedia(file) {
+  // El navegador arma el multipart; el servidor lo escribe a disco por partes.
+  const form = new FormData();
+  form.append("file", file, file.name);
+  return requestJSON("/media", { method: "POST", body: form });
+}
+
+function formatCacheAge(data) {
+  // Balance, canales y webhook pueden venir de cache: se indica la antiguedad.
+  const age = data?.cache?.age_seconds;
+  if (!data?.cache?.hit || typeof age !== "number") return "";
+  if (age < 60) return ` (datos de hace ${Math.round(age)} s)`;
+  return ` (datos de hace ${Math.round(age / 60)} min)`;
+}
+
+function delay(ms) {
+  return new Promise((resolve) => setTimeout(resolve, ms));
+}
+
+async function waitForOutbox(outboxId) {
+  // Los envios responden 202 y se entregan en segundo plano: se consulta el outbox hasta un estado final.
+  for (let attempt = 0; attempt < APP_CONFIG.outboxMaxPolls; attempt += 1) {
+    await delay(APP_CONFIG.outboxPollMs);
+    const { res, data } = await requestJSON(`/outbox/${encodeURIComponent(outboxId)}`, { cache: "no-store" });
+    const status = data?.data?.status;
+    if (res.ok && (status === "sent" || status === "failed")) return data.data;
+  }
+  return null;
+}
+
+async function reportOutboxDelivery(outboxId, conversationId, successText, failureText) {
+  const item = await waitForOutbox(outboxId);
+  if (!item) {
+    renderConfigStatus("El envio sigue en cola; se reintentara en segundo plano.");
+    return;
+  }
+  writeWebhookResult(item.result);
+  if (item.status === "failed") {
+    renderConfigStatus(failureText, true);
+    return;
+  }
+  renderConfigStatus(successText);
+  await loadMessages(conversationId);
+}
+
 function toNumeric(value) {
   if (typeof value === "number" && Number.isFinite(value)) return value;
   if (typeof value !== "string") return null;
@@ -276,24 +365,287 @@ function ensureCurrentConversation() {
   return state.currentConversation;
 }
 
-function renderConversationList(conversations) {
-  if (!dom.sidebar) return;
+// Lista con ventana: solo las filas visibles (mas virtualOverscanPx) estan en
+// el DOM, entre dos espaciadores. Cada fila se construye una vez por clave y
+// version; las alturas se miden al mostrarse y las demas se estiman.
+function createVirtualList(container, options) {
+  const view = {
+    container,
+    keyOf: options.keyOf,
+    versionOf: options.versionOf,
+    renderItem: options.renderItem,
+    estimatedHeight: options.estimatedHeight,
+    stickToBottom: Boolean(options.stickToBottom),
+    pinTop: Boolean(options.pinTop),
+    onNearTop: options.onNearTop || null,
+    onNearBottom: options.onNearBottom || null,
+    owner: null,
+    items: [],
+    nodes: new Map(),
+    heights: new Map(),
+    topSpacer: createVirtualSpacer(),
+    bottomSpacer: createVirtualSpacer(),
+    atBottom: true,
+    frame: null
+  };
+  container.addEventListener("scroll", () => onVirtualScroll(view), { passive: true });
+  // Una imagen que termina de cargar cambia la altura de su fila.
+  container.addEventListener("load", () => scheduleVirtualRender(view), true);
+  window.addEventListener("resize", () => scheduleVirtualRender(view));
+  return view;
+}
+
+function createVirtualSpacer() {
+  const spacer = document.createElement("div");
+  spacer.className = "virtual-spacer";
+  return spacer;
+}
+
+function setVirtualItems(view, items, { reset = false } = {}) {
+  if (reset) {
+    view.nodes.clear();
+    view.heights.clear();
+    view.atBottom = true;
+  } else {
+    const keys = new Set(items.map((item) => String(view.keyOf(item))));
+    view.nodes.forEach((_cached, key) => {
+      if (keys.has(key)) return;
+      view.nodes.delete(key);
+      view.heights.delete(key);
+    });
+  }
+  view.items = items;
+  renderVirtualList(view);
+}
 
-  dom.sidebar.innerHTML = "";
-  const fragment = document.createDocumentFragment();
+function onVirtualScroll(view) {
+  const { container } = view;
+  view.atBottom =
+    container.scrollHeight - container.scrollTop - container.clientHeight <= APP_CONFIG.stickToBottomPx;
+  if (view.onNearTop && container.scrollTop <= APP_CONFIG.loadOlderThresholdPx) {
+    view.onNearTop();
+  }
+  if (
+    view.onNearBottom &&
+    container.scrollHeight - container.scrollTop - container.clientHeight <= APP_CONFIG.loadOlderThresholdPx
+  ) {
+    view.onNearBottom();
+  }
+  scheduleVirtualRender(view);
+}
 
-  conversations.forEach((conversation) => {
-    const item = document.createElement("div");
-    item.className = "conversation";
-    if (conversation.id === state.currentConversation) {
-      item.classList.add("active");
+function scheduleVirtualRender(view) {
+  if (view.frame) return;
+  view.frame = requestAnimationFrame(() => {
+    view.frame = null;
+    renderVirtualList(view);
+  });
+}
+
+function getVirtualRows(view) {
+  const rows = [];
+  for (let node = view.topSpacer.nextSibling; node && node !== view.bottomSpacer; node = node.nextSibling) {
+    rows.push(node);
+  }
+  return rows;
+}
+
+function measureVirtualRows(view) {
+  // La altura de una fila es la distancia hasta la siguiente: incluye margenes
+  // y floats (los espaciadores hacen clear).
+  let changed = false;
+  const rows = getVirtualRows(view);
+  rows.forEach((node, index) => {
+    const next = rows[index + 1] || view.bottomSpacer;
+    const height = next.getBoundingClientRect().top - node.getBoundingClientRect().top;
+    const key = node.dataset.virtualKey;
+    if (key === undefined || height <= 0) return;
+    if (Math.abs((view.heights.get(key) || 0) - height) > 1) {
+      view.heights.set(key, height);
+      changed = true;
     }
-    item.dataset.conversationId = conversation.id;
-    item.innerText = conversation.id;
-    fragment.appendChild(item);
   });
+  return changed;
+}
+
+function findVirtualAnchor(view) {
+  // Primera fila visible y su distancia al borde superior, para que agregar
+  // filas arriba (historial) o corregir alturas no mueva lo que se esta leyendo.
+  const top = view.container.getBoundingClientRect().top;
+  const row = getVirtualRows(view).find((node) => node.getBoundingClientRect().bottom > top);
+  if (!row) return null;
+  return { key: row.dataset.virtualKey, offset: row.getBoundingClientRect().top - top };
+}
+
+function getVirtualNode(view, item) {
+  const key = String(view.keyOf(item));
+  const version = view.versionOf(item);
+  const cached = view.nodes.get(key);
+  if (cached && cached.version === version) return cached.node;
+
+  const node = view.renderItem(item);
+  node.dataset.virtualKey = key;
+  if (cached && cached.node.parentNode === view.container) {
+    view.container.replaceChild(node, cached.node);
+  }
+  view.nodes.set(key, { node, version });
+  return node;
+}
+
+function renderVirtualList(view) {
+  const { container, items } = view;
+  if (view.frame) {
+    cancelAnimationFrame(view.frame);
+    view.frame = null;
+  }
+  if (view.topSpacer.parentNode !== container) {
+    // El contenedor se reescribio por fuera (p. ej. un mensaje de error).
+    container.innerHTML = "";
+    container.append(view.topSpacer, view.bottomSpacer);
+  }
+
+  measureVirtualRows(view);
+  const stick = view.stickToBottom && view.atBottom;
+  const pinned = view.pinTop && container.scrollTop <= 1;
+  const anchor = stick || pinned ? null : findVirtualAnchor(view);
+  const base =
+    view.topSpacer.getBoundingClientRect().top - container.getBoundingClientRect().top + container.scrollTop;
+
+  const offsets = new Array(items.length + 1);
+  const indexByKey = new Map();
+  offsets[0] = 0;
+  items.forEach((item, index) => {
+    const key = String(view.keyOf(item));
+    indexByKey.set(key, index);
+    offsets[index + 1] = offsets[index] + (view.heights.get(key) || view.estimatedHeight);
+  });
+  const total = offsets[items.length];
+
+  let scrollTop = container.scrollTop;
+  if (stick) {
+    scrollTop = Math.max(0, base + total - container.clientHeight);
+  } else if (anchor && indexByKey.has(anchor.key)) {
+    scrollTop = base + offsets[indexByKey.get(anchor.key)] - anchor.offset;
+  }
+
+  const from = scrollTop - base - APP_CONFIG.virtualOverscanPx;
+  const to = scrollTop - base + container.clientHeight + APP_CONFIG.virtualOverscanPx;
+  let start = 0;
+  while (start < items.length && offsets[start + 1] <= from) start += 1;
+  let end = start;
+  while (end < items.length && offsets[end] < to) end += 1;
+
+  const wanted = items.slice(start, end).map((item) => getVirtualNode(view, item));
+  const wantedSet = new Set(wanted);
+  getVirtualRows(view).forEach((node) => {
+    if (!wantedSet.has(node)) node.remove();
+  });
+  let cursor = view.topSpacer.nextSibling;
+  wanted.forEach((node) => {
+    if (cursor === node) {
+      cursor = cursor.nextSibling;
+      return;
+    }
+    container.insertBefore(node, cursor);
+  });
+
+  view.topSpacer.style.height = `${offsets[start]}px`;
+  view.bottomSpacer.style.height = `${total - offsets[end]}px`;
+  if (stick) {
+    container.scrollTop = container.scrollHeight;
+  } else if (Math.abs(container.scrollTop - scrollTop) > 1) {
+    container.scrollTop = scrollTop;
+  }
+  const anchorNode = anchor && view.nodes.get(anchor.key)?.node;
+  if (anchorNode && anchorNode.parentNode === container) {
+    // Las filas de la ventana sobre el ancla pueden medir distinto a lo
+    // estimado: se corrige con su posicion real.
+    const drift = anchorNode.getBoundingClientRect().top - container.getBoundingClientRect().top - anchor.offset;
+    if (Math.abs(drift) > 1) {
+      container.scrollTop += drift;
+    }
+  }
+
+  // Filas nuevas con altura distinta a la estimada: se recalcula en el
+  // siguiente frame (converge porque las medidas ya quedan guardadas).
+  if (measureVirtualRows(view)) {
+    scheduleVirtualRender(view);
+  }
+}
+
+function buildConversationPreview(conversation) {
+  const text = normalizeText(conversation?.last_message);
+  if (!text) return "";
+
+  const fileMessage = parseFileMessage(text);
+  const preview = fileMessage ? `Archivo: ${fileMessage.name || fileMessage.url}` : text;
+  const prefix = conversation.last_sender && conversation.last_sender !== "usuario" ? "Tu: " : "";
+  const singleLine = `${prefix}${preview}`.replace(/\s+/g, " ");
+  return singleLine.length > 80 ? `${singleLine.slice(0, 80)}...` : singleLine;
+}
+
+function renderConversationSummary(item, conversation) {
+  const header = document.createElement("div");
+  header.className = "conversation-header";
+
+  const title = document.createElement("span");
+  title.className = "conversation-title";
+  title.innerText = normalizeText(conversation.contact_name) || conversation.id;
+  header.appendChild(title);
+
+  const unread = Number(conversation.unread_count) || 0;
+  if (unread > 0) {
+    const badge = document.createElement("span");
+    badge.className = "conversation-unread";
+    badge.innerText = unread > 99 ? "99+" : String(unread);
+    header.appendChild(badge);
+  }
+  item.appendChild(header);
+
+  const preview = buildConversationPreview(conversation);
+  if (preview) {
+    const previewNode = document.createElement("div");
+    previewNode.className = "conversation-preview";
+    previewNode.innerText = preview;
+    item.appendChild(previewNode);
+  }
+}
+
+function getConversationVersion(conversation) {
+  const active = conversation.id === state.currentConversation ? "1" : "0";
+  return `${conversation.sync_version}|${conversation.unread_count}|${conversation.contact_name || ""}|${active}`;
+}
+
+function renderConversationItem(conversation) {
+  const item = document.createElement("div");
+  item.className = "conversation";
+  if (conversation.id === state.currentConversation) {
+    item.classList.add("active");
+  }
+  item.dataset.conversationId = conversation.id;
+  renderConversationSummary(item, conversation);
+  return item;
+}
+
+function getConversationListView() {
+  if (!state.views.conversations) {
+    state.views.conversations = createVirtualList(dom.sidebar, {
+      keyOf: (conversation) => conversation.id,
+      versionOf: getConversationVersion,
+      renderItem: renderConversationItem,
+      estimatedHeight: APP_CONFIG.conversationRowEstimatePx,
+      // Arriba del todo se queda arriba: una conversacion que sube se ve.
+      pinTop: true,
+      onNearBottom: loadOlderConversations
+    });
+  }
+  return state.views.conversations;
+}
+
+function renderConversationList(conversations) {
+  if (!dom.sidebar) return;
 
-  dom.sidebar.appendChild(fragment);
+  setVirtualItems(getConversationListView(), conversations);
 }
 
 function normalizeText(value) {
@@ -592,6 +944,11 @@ function renderMessageBubble(item, messageItem) {
   if (!fileExt) {
     fileExt = normalizeFileExtension(getUrlExtension(fileUrl));
   }
+  // Adjunto espejado en este servidor: se carga desde /media.
+  const localFileUrl = normalizeText(messageItem?.local_file_url);
+  if (localFileUrl && fileUrl === normalizeText(messageItem?.file_url)) {
+    fileUrl = localFileUrl;
+  }
 
   const metadata = normalizeMetadata(messageItem?.metadata);
 
@@ -632,24 +989,39 @@ function renderMessageBubble(item, messageItem) {
   }
 }
 
+function renderMessageItem(messageItem) {
+  const item = document.createElement("div");
+  item.className = `msg ${messageItem.sender === "usuario" ? "user" : "agent"}`;
+  item.style.display = "flex";
+  item.style.flexDirection = "column";
+  item.style.gap = "2px";
+  renderMessageBubble(item, messageItem);
+  return item;
+}
+
+function getMessageListView() {
+  if (!state.views.messages) {
+    state.views.messages = createVirtualList(dom.messages, {
+      // Los mensajes no se editan: solo cambia el adjunto cuando se espeja.
+      keyOf: (messageItem) => String(messageItem.id),
+      versionOf: (messageItem) => messageItem.local_file_url || "",
+      renderItem: renderMessageItem,
+      estimatedHeight: APP_CONFIG.messageRowEstimatePx,
+      stickToBottom: true,
+      onNearTop: loadOlderMessages
+    });
+  }
+  return state.views.messages;
+}
+
 function renderMessageList(messages) {
   if (!dom.messages) return;
 
-  dom.messages.innerHTML = "";
-  const fragment = document.createDocumentFragment();
-
-  messages.forEach((messageItem) => {
-    const item = document.createElement("div");
-    item.className = `msg ${messageItem.sender === "usuario" ? "user" : "agent"}`;
-    item.style.display = "flex";
-    item.style.flexDirection = "column";
-    item.style.gap = "2px";
-    renderMessageBubble(item, messageItem);
-    fragment.appendChild(item);
-  });
-
-  dom.messages.appendChild(fragment);
-  dom.messages.scrollTop = dom.messages.scrollHeight;
+  const view = getMessageListView();
+  const owner = state.currentConversation;
+  // Al cambiar de conversacion se descartan las filas de la anterior.
+  setVirtualItems(view, messages, { reset: view.owner !== owner });
+  view.owner = owner;
 }
 
 function parseVariablesJSON(rawValue) {
@@ -703,15 +1075,17 @@ function getFileFormValues() {
   const manualExtension = normalizeFileExtension(
     pickFirstFilled([dom.chatFileExtension?.value, dom.fileExtension?.value])
   );
-  const extension = manualExtension || inferExtensionFromUrl(url);
+  const upload = dom.chatFileUpload?.files?.[0] || null;
+  const extension = manualExtension || inferExtensionFromUrl(upload ? upload.name : url);
 
-  return { url, nombre, extension };
+  return { url, nombre, extension, upload };
 }
 
 function clearFileFormValues() {
   if (dom.chatFileUrl) dom.chatFileUrl.value = "";
   if (dom.chatFileName) dom.chatFileName.value = "";
   if (dom.chatFileExtension) dom.chatFileExtension.value = "";
+  if (dom.chatFileUpload) dom.chatFileUpload.value = "";
   if (dom.fileUrl) dom.fileUrl.value = "";
   if (dom.fileName) dom.fileName.value = "";
   if (dom.fileExtension) dom.fileExtension.value = "";
@@ -764,50 +1138,740 @@ async function loadChannels() {
   }
 }
 
+function compareConversations(left, right) {
+  const leftKey = `${left.updated_at || ""}|${left.id}`;
+  const rightKey = `${right.updated_at || ""}|${right.id}`;
+  if (leftKey === rightKey) return 0;
+  return leftKey < rightKey ? 1 : -1;
+}
+
+function getSortedConversations() {
+  return Array.from(state.conversations.values()).sort(compareConversations);
+}
+
+// Cache local en IndexedDB: la primera pagina del sidebar, mensajes y los
+// cursores del servidor con que se obtuvieron. Al abrir la pagina se pinta desde
+// aqui; los hilos solo traen lo posterior a su cursor y el sidebar vuelve a
+// pedir su primera pagina. Todo es best-effort: si IndexedDB no esta disponible
+// o falla, la UI sigue solo con la red.
+function openCache() {
+  if (!state.cache.db) {
+    state.cache.db = new Promise((resolve) => {
+      if (!window.indexedDB) {
+        resolve(null);
+        return;
+      }
+      let request;
+      try {
+        request = indexedDB.open(APP_CONFIG.cacheDbName, APP_CONFIG.cacheDbVersion);
+      } catch (_error) {
+        resolve(null);
+        return;
+      }
+      request.onupgradeneeded = () => {
+        const db = request.result;
+        if (!db.objectStoreNames.contains("meta")) db.createObjectStore("meta");
+        if (!db.objectStoreNames.contains("conversations")) db.createObjectStore("conversations", { keyPath: "id" });
+        if (!db.objectStoreNames.contains("threads")) db.createObjectStore("threads", { keyPath: "conversation_id" });
+        if (!db.objectStoreNames.contains("messages")) {
+          db.createObjectStore("messages", { keyPath: ["conversation_id", "id"] });
+        }
+      };
+      request.onsuccess = () => resolve(request.result);
+      request.onerror = () => resolve(null);
+      request.onblocked = () => resolve(null);
+    });
+  }
+  return state.cache.db;
+}
+
+function idbResult(request) {
+  return new Promise((resolve, reject) => {
+    request.onsuccess = () => resolve(request.result);
+    request.onerror = () => reject(request.error);
+  });
+}
+
+function idbDone(transaction) {
+  return new Promise((resolve, reject) => {
+    transaction.oncomplete = () => resolve();
+    transaction.onerror = () => reject(transaction.error);
+    transaction.onabort = () => reject(transaction.error);
+  });
+}
+
+async function withCache(storeNames, mode, run) {
+  try {
+    const db = await openCache();
+    if (!db) return null;
+    const transaction = db.transaction(storeNames, mode);
+    // Si una peticion falla tambien falla la transaccion: el error se maneja
+    // una sola vez, al esperar idbDone.
+    const result = Promise.resolve(run(transaction)).catch(() => null);
+    await idbDone(transaction);
+    return await result;
+  } catch (_error) {
+    return null;
+  }
+}
+
+function cachedMessagesRange(conversationId) {
+  return IDBKeyRange.bound([conversationId, -Infinity], [conversationId, Infinity]);
+}
+
+function readCachedInbox() {
+  return withCache(["meta", "conversations"], "readonly", (transaction) =>
+    Promise.all([
+      idbResult(transaction.objectStore("conversations").getAll()),
+      idbResult(transaction.objectStore("meta").get("currentConversation"))
+    ]).then(([conversations, currentConversation]) => ({ conversations, currentConversation }))
+  );
+}
+
+function cacheConversations(conversations, { replace = false } = {}) {
+  // replace: la primera pagina reemplaza lo guardado, asi desaparecen las
+  // conversaciones que el servidor ya no devuelve (borradas o archivadas).
+  scheduleCacheEviction();
+  return withCache(["conversations"], "readwrite", (transaction) => {
+    const store = transaction.objectStore("conversations");
+    if (replace) store.clear();
+    conversations.forEach((conversation) => store.put(conversation));
+  });
+}
+
+function readCachedThread(conversationId) {
+  return withCache(["threads", "messages"], "readonly", (transaction) =>
+    Promise.all([
+      idbResult(transaction.objectStore("threads").get(conversationId)),
+      idbResult(transaction.objectStore("messages").getAll(cachedMessagesRange(conversationId)))
+    ]).then(([thread, messages]) => (thread ? { thread, messages } : null))
+  );
+}
+
+function cacheMessages(conversationId, messages, entry) {
+  // Se guardan solo los mensajes nuevos; el hilo lleva los cursores y el uso
+  // (accessed_at) para el desalojo LRU.
+  const saved = withCache(["threads", "messages"], "readwrite", (transaction) => {
+    const store = transaction.objectStore("messages");
+    messages.forEach((messageItem) => {
+      if (messageItem.id === undefined || messageItem.id === null) return;
+      store.put({ ...messageItem, conversation_id: conversationId });
+    });
+    transaction.objectStore("threads").put({
+      conversation_id: conversationId,
+      sync: entry.sync,
+      before: entry.before,
+      archive: entry.archive,
+      count: entry.items.length,
+      accessed_at: Date.now()
+    });
+  });
+  scheduleCacheEviction();
+  return saved;
+}
+
+function touchCachedThread(conversationId) {
+  return withCache(["meta", "threads"], "readwrite", (transaction) => {
+    transaction.objectStore("meta").put(conversationId, "currentConversation");
+    const threads = transaction.objectStore("threads");
+    idbResult(threads.get(conversationId)).then((thread) => {
+      if (thread) threads.put({ ...thread, accessed_at: Date.now() });
+    });
+  });
+}
+
+function dropCachedThread(conversationId) {
+  return withCache(["threads", "messages"], "readwrite", (transaction) => {
+    transaction.objectStore("threads").delete(conversationId);
+    transaction.objectStore("messages").delete(cachedMessagesRange(conversationId));
+  });
+}
+
+function clearCache() {
+  return withCache(["meta", "conversations", "threads", "messages"], "readwrite", (transaction) => {
+    ["meta", "conversations", "threads", "messages"].forEach((name) => transaction.objectStore(name).clear());
+  });
+}
+
+function scheduleCacheEviction() {
+  if (state.cache.evictTimer) return;
+  state.cache.evictTimer = setTimeout(() => {
+    state.cache.evictTimer = null;
+    evictCache();
+  }, 1000);
+}
+
+function evictCache() {
+  // Se conservan los hilos usados mas recientemente mientras quepan en
+  // cacheMaxConversations y cacheMaxMessages, y en el sidebar las
+  // cacheMaxSidebarConversations mas recientes; la conversacion abierta nunca
+  // se desaloja.
+  return withCache(["conversations", "threads", "messages"], "readwrite", (transaction) => {
+    const conversations = transaction.objectStore("conversations");
+    const threads = transaction.objectStore("threads");
+    const messages = transaction.objectStore("messages");
+    const trimConversations = idbResult(conversations.getAll()).then((rows) => {
+      rows
+        .sort(compareConversations)
+        .slice(APP_CONFIG.cacheMaxSidebarConversations)
+        .forEach((conversation) => {
+          if (conversation.id !== state.currentConversation) conversations.delete(conversation.id);
+        });
+    });
+    const trimThreads = idbResult(threads.getAll()).then((entries) => {
+      let kept = 0;
+      let total = 0;
+      entries
+        .sort((left, right) => (right.accessed_at || 0) - (left.accessed_at || 0))
+        .forEach((thread) => {
+          const count = thread.count || 0;
+          const fits = kept < APP_CONFIG.cacheMaxConversations && total + count <= APP_CONFIG.cacheMaxMessages;
+          if (thread.conversation_id === state.currentConversation || fits) {
+            kept += 1;
+            total += count;
+            return;
+          }
+          threads.delete(thread.conversation_id);
+          messages.delete(cachedMessagesRange(thread.conversation_id));
+          state.messagesByConversation.delete(thread.conversation_id);
+        });
+    });
+    return Promise.all([trimConversations, trimThreads]);
+  });
+}
+
+async function hydrateMessages(conversationId) {
+  if (state.messagesByConversation.has(conversationId)) return;
+  const cached = await readCachedThread(conversationId);
+  if (!cached || state.messagesByConversation.has(conversationId)) return;
+
+  const entry = getMessageState(conversationId);
+  // La clave [conversation_id, id] devuelve los mensajes en orden de llegada.
+  cached.messages.forEach(({ conversation_id: _conversationId, ...messageItem }) => {
+    entry.ids.add(messageItem.id);
+    entry.items.push(messageItem);
+  });
+  entry.sync = cached.thread.sync;
+  entry.before = cached.thread.before;
+  entry.archive = cached.thread.archive ?? !cached.thread.before;
+}
+
+async function restoreFromCache() {
+  const cached = await readCachedInbox();
+  if (!cached) return;
+
+  (cached.conversations || []).forEach((conversation) => {
+    state.conversations.set(conversation.id, conversation);
+  });
+  if (state.conversations.size) {
+    // Sin cursor: loadConversations pide la primera pagina y reemplaza estas filas.
+    renderConversationList(getSortedConversations());
+  }
+  if (cached.currentConversation && state.conversations.has(cached.currentConversation)) {
+    // Sin await: los mensajes guardados se pintan enseguida y el delta de red
+    // no retrasa la carga de conversaciones.
+    selectConversation(cached.currentConversation);
+  }
+}
+
 async function loadConversations() {
   if (!dom.sidebar) return;
 
+  const sync = state.conversationSync;
+  // Sin cursor es la primera pagina: de ahi sale el cursor de las mas viejas.
+  const firstPage = !sync.cursor;
+  try {
+    const { res, data, notModified, etag } = await requestSync(
+      withSince("/conversations", sync.cursor),
+      sync.etag
+    );
+    if (notModified) return;
+
+    if (!isApiSuccess(res, data)) {
+      const hadCursor = Boolean(sync.cursor);
+      sync.cursor = null;
+      sync.etag = null;
+      // Un cursor guardado que el servidor ya no acepta: se recarga completo.
+      if (hadCursor && res.status === 400) {
+        await loadConversations();
+      }
+      return;
+    }
+
+    const conversations = Array.isArray(data?.data) ? data.data : [];
+    if (firstPage) state.conversations.clear();
+    conversations.forEach((conversation) => {
+      state.conversations.set(conversation.id, conversation);
+    });
+    sync.cursor = data.sync || null;
+    sync.etag = etag;
+    if (firstPage) {
+      sync.before = data.paging?.has_more ? data.paging.before : null;
+    }
+    cacheConversations(conversations, { replace: firstPage });
+
+    renderConversationList(getSortedConversations());
+    if (firstPage) fillConversationViewport();
+  } catch (_error) {
+    // Sin red se deja lo que vino del cache.
+    if (!state.conversations.size) {
+      dom.sidebar.innerHTML = '<div class="conversation">Error cargando conversaciones</div>';
+    }
+  }
+}
+
+function fillConversationViewport() {
+  // Igual que en el chat: sin barra de scroll se piden paginas hasta llenarla.
+  if (!dom.sidebar || dom.sidebar.scrollHeight > dom.sidebar.clientHeight) return;
+  loadOlderConversations();
+}
+
+async function loadOlderConversations() {
+  const sync = state.conversationSync;
+  if (!sync.before || sync.loadingOlder) return;
+
+  sync.loadingOlder = true;
+  let loaded = false;
   try {
-    const { data } = await requestJSON("/conversations");
-    const conversations = Array.isArray(data) ? data : [];
-    renderConversationList(conversations);
+    const params = new URLSearchParams({ limit: String(APP_CONFIG.conversationPageSize), before: sync.before });
+    const { res, data } = await requestJSON(`/conversations?${params.toString()}`);
+    if (!isApiSuccess(res, data)) return;
+
+    const older = Array.isArray(data?.data) ? data.data : [];
+    // Una conversacion que ya llego por el delta trae datos mas nuevos.
+    const added = older.filter((conversation) => !state.conversations.has(conversation.id));
+    added.forEach((conversation) => {
+      state.conversations.set(conversation.id, conversation);
+    });
+    // Las paginas viejas no se guardan en el cache: se vuelven a pedir al bajar.
+    sync.before = data.paging?.has_more ? data.paging.before : null;
+    loaded = true;
+
+    if (added.length) {
+      renderConversationList(getSortedConversations());
+    }
   } catch (_error) {
-    dom.sidebar.innerHTML = '<div class="conversation">Error cargando conversaciones</div>';
+    // Se reintenta con el siguiente scroll hacia abajo.
+  } finally {
+    sync.loadingOlder = false;
   }
+  if (loaded) fillConversationViewport();
 }
 
-async function selectConversation(conversationId, element) {
+async function selectConversation(conversationId) {
   state.currentConversation = conversationId;
 
-  document.querySelectorAll(".conversation").forEach((item) => item.classList.remove("active"));
-  if (element) {
-    element.classList.add("active");
+  // La version de cada fila incluye si esta activa: solo se rehacen dos filas.
+  renderConversationList(getSortedConversations());
+  await hydrateMessages(conversationId);
+  if (state.currentConversation !== conversationId) return;
+  touchCachedThread(conversationId);
+  renderMessageList(getMessageState(conversationId).items);
+  await loadMessages(conversationId);
+  connectEvents();
+}
+
+function getMessageState(conversationId) {
+  let entry = state.messagesByConversation.get(conversationId);
+  if (!entry) {
+    entry = { items: [], ids: new Set(), sync: null, etag: null, before: null, archive: false, loadingOlder: false };
+    state.messagesByConversation.set(conversationId, entry);
   }
+  return entry;
+}
 
-  await loadMessages(conversationId);
+function mergeMessages(entry, messages) {
+  // Devuelve los mensajes agregados o actualizados.
+  const changed = [];
+  messages.forEach((messageItem) => {
+    if (messageItem.id !== undefined && messageItem.id !== null) {
+      if (entry.ids.has(messageItem.id)) {
+        const updated = updateMessage(entry, messageItem);
+        if (updated) changed.push(updated);
+        return;
+      }
+      entry.ids.add(messageItem.id);
+    }
+    entry.items.push(messageItem);
+    changed.push(messageItem);
+  });
+  return changed;
+}
+
+function updateMessage(entry, messageItem) {
+  // Un mensaje guardado solo cambia al espejarse su adjunto (local_file_url).
+  if (!messageItem.local_file_url) return null;
+  const index = entry.items.findIndex((item) => item.id === messageItem.id);
+  if (index < 0 || entry.items[index].local_file_url === messageItem.local_file_url) return null;
+  entry.items[index] = { ...entry.items[index], local_file_url: messageItem.local_file_url };
+  return entry.items[index];
+}
+
+function normalizeMessage(messageItem) {
+  return {
+    id: messageItem?.id,
+    created_at: messageItem?.created_at,
+    sender: messageItem?.sender === "usuario" ? "usuario" : "agent",
+    message: normalizeText(messageItem?.message),
+    message_type: normalizeText(messageItem?.message_type || "text"),
+    file_url: normalizeText(messageItem?.file_url),
+    file_name: normalizeText(messageItem?.file_name),
+    file_ext: normalizeFileExtension(messageItem?.file_ext || ""),
+    local_file_url: normalizeText(messageItem?.local_file_url),
+    metadata: normalizeMetadata(messageItem?.metadata)
+  };
 }
 
-async function loadMessages(conversationId) {
+async function loadMessages(conversationId, catchUpPage = 0) {
   if (!dom.messages) return;
 
+  const entry = getMessageState(conversationId);
   try {
     const encodedId = encodeURIComponent(conversationId);
-    const { data } = await requestJSON(`/messages/${encodedId}`);
-    const messages = Array.isArray(data) ? data : [];
-
-    const normalizedMessages = messages.map((messageItem) => ({
-      sender: messageItem?.sender === "usuario" ? "usuario" : "agent",
-      message: normalizeText(messageItem?.message),
-      message_type: normalizeText(messageItem?.message_type || "text"),
-      file_url: normalizeText(messageItem?.file_url),
-      file_name: normalizeText(messageItem?.file_name),
-      file_ext: normalizeFileExtension(messageItem?.file_ext || ""),
-      metadata: normalizeMetadata(messageItem?.metadata)
-    }));
-
-    renderMessageList(normalizedMessages);
+    const { res, data, notModified, etag } = await requestSync(
+      withSince(`/messages/${encodedId}`, entry.sync),
+      entry.etag
+    );
+    if (notModified) return;
+
+    if (!isApiSuccess(res, data)) {
+      const hadCursor = Boolean(entry.sync);
+      entry.sync = null;
+      entry.etag = null;
+      if (hadCursor && res.status === 400) {
+        await resetMessages(conversationId);
+      }
+      return;
+    }
+
+    const behind = Boolean(entry.sync) && Boolean(data.paging?.has_more);
+    if (behind && catchUpPage + 1 >= APP_CONFIG.messageCatchUpPages) {
+      // El cache quedo demasiado atras: en vez de recorrer todo el hueco se
+      // parte de la pagina mas reciente y el historial se pide al subir.
+      await resetMessages(conversationId);
+      return;
+    }
+
+    const messages = Array.isArray(data?.data) ? data.data : [];
+    const changed = mergeMessages(entry, messages.map(normalizeMessage));
+    const firstLoad = !entry.sync;
+    if (firstLoad) {
+      // La primera carga trae la pagina mas reciente; lo anterior se pide al subir.
+      setOlderCursor(entry, data.paging);
+    }
+    const syncChanged = Boolean(data.sync) && data.sync !== entry.sync;
+    entry.sync = data.sync || entry.sync;
+    entry.etag = etag;
+    if (changed.length || syncChanged) {
+      cacheMessages(conversationId, changed, entry);
+    }
+
+    if (changed.length && state.currentConversation === conversationId) {
+      renderMessageList(entry.items);
+    }
+    if (firstLoad) fillMessageViewport(conversationId);
+    if (behind) {
+      await loadMessages(conversationId, catchUpPage + 1);
+    }
   } catch (_error) {
-    dom.messages.innerHTML = "";
+    // Sin red se deja lo que vino del cache.
+    if (state.currentConversation === conversationId && !entry.items.length) {
+      dom.messages.innerHTML = "";
+    }
+  }
+}
+
+async function resetMessages(conversationId) {
+  state.messagesByConversation.delete(conversationId);
+  await dropCachedThread(conversationId);
+  await loadMessages(conversationId);
+}
+
+function setOlderCursor(entry, paging) {
+  // Cuando la tabla caliente se agota se sigue con el historico archivado
+  // (?archived=1) desde el mensaje mas viejo cargado; al agotarse ambos, null.
+  if (paging?.has_more) {
+    entry.before = paging.before;
+    return;
+  }
+  if (entry.archive) {
+    entry.archive = false;
+    entry.before = null;
+    return;
+  }
+  entry.archive = true;
+  entry.before = paging?.before || entry.before;
+}
+
+function fillMessageViewport(conversationId) {
+  // Sin barra de scroll no hay borde superior al que acercarse: se pide
+  // historial hasta llenar el chat (p. ej. un cliente que vuelve tras meses).
+  const container = dom.messages;
+  if (!container || state.currentConversation !== conversationId) return;
+  if (container.scrollHeight > container.clientHeight) return;
+  loadOlderMessages();
+}
+
+async function loadOlderMessages() {
+  const conversationId = state.currentConversation;
+  if (!conversationId) return;
+
+  const entry = getMessageState(conversationId);
+  if ((!entry.before && !entry.archive) || entry.loadingOlder) return;
+
+  entry.loadingOlder = true;
+  let loaded = false;
+  try {
+    const params = new URLSearchParams({ limit: String(APP_CONFIG.messagePageSize) });
+    if (entry.before) params.set("before", entry.before);
+    if (entry.archive) params.set("archived", "1");
+    const { res, data } = await requestJSON(`/messages/${encodeURIComponent(conversationId)}?${params.toString()}`);
+    if (!isApiSuccess(res, data)) return;
+
+    const older = (Array.isArray(data?.data) ? data.data : [])
+      .map(normalizeMessage)
+      .filter((messageItem) => !entry.ids.has(messageItem.id));
+    older.forEach((messageItem) => entry.ids.add(messageItem.id));
+    entry.items = older.concat(entry.items);
+    setOlderCursor(entry, data.paging);
+    cacheMessages(conversationId, older, entry);
+    loaded = true;
+
+    if (older.length && state.currentConversation === conversationId) {
+      renderMessageList(entry.items);
+    }
+  } catch (_error) {
+    // Se reintenta con el siguiente scroll hacia arriba.
+  } finally {
+    entry.loadingOlder = false;
+  }
+  if (loaded) fillMessageViewport(conversationId);
+}
+
+function startPolling() {
+  // Respaldo cuando /events no esta disponible: el sondeo de siempre.
+  const events = state.events;
+  if (events.pollTimers.length) return;
+  events.pollTimers = [
+    setInterval(loadConversations, APP_CONFIG.conversationsPollMs),
+    setInterval(() => {
+      if (state.currentConversation) {
+        loadMessages(state.currentConversation);
+      }
+    }, APP_CONFIG.messagesPollMs)
+  ];
+}
+
+function stopPolling() {
+  state.events.pollTimers.forEach((timer) => clearInterval(timer));
+  state.events.pollTimers = [];
+}
+
+function readEventData(event) {
+  state.events.lastEventId = event.lastEventId || state.events.lastEventId;
+  try {
+    return JSON.parse(event.data);
+  } catch (_error) {
+    return null;
+  }
+}
+
+function onMessageCreatedEvent(event) {
+  const messageItem = readEventData(event);
+  if (!messageItem) return;
+  const entry = state.messagesByConversation.get(messageItem.conversation_id);
+  // Si la conversacion aun no se cargo, el mensaje llega con su primera carga.
+  if (!entry || !entry.sync) return;
+  const changed = mergeMessages(entry, [normalizeMessage(messageItem)]);
+  if (!changed.length) return;
+  cacheMessages(messageItem.conversation_id, changed, entry);
+  if (state.currentConversation === messageItem.conversation_id) {
+    renderMessageList(entry.items);
+  }
+}
+
+function onMessageUpdatedEvent(event) {
+  const update = readEventData(event);
+  const entry = update && state.messagesByConversation.get(update.conversation_id);
+  if (!entry) return;
+  const updated = updateMessage(entry, { id: update.id, local_file_url: normalizeText(update.local_file_url) });
+  if (!updated) return;
+  cacheMessages(update.conversation_id, [updated], entry);
+  if (state.currentConversation === update.conversation_id) {
+    renderMessageList(entry.items);
+  }
+}
+
+function onConversationUpdatedEvent(event) {
+  const conversation = readEventData(event);
+  if (!conversation?.id) return;
+  const merged = { ...state.conversations.get(conversation.id), ...conversation };
+  state.conversations.set(conversation.id, merged);
+  cacheConversations([merged]);
+  renderConversationList(getSortedConversations());
+}
+
+function onResyncEvent(event) {
+  readEventData(event);
+  state.conversationSync = { cursor: null, etag: null, before: null, loadingOlder: false };
+  state.messagesByConversation.clear();
+  clearCache();
+  loadConversations();
+  if (state.currentConversation) {
+    loadMessages(state.currentConversation);
+  }
+}
+
+function connectEvents() {
+  const events = state.events;
+  if (!window.EventSource) {
+    startPolling();
+    return;
+  }
+  if (events.source && events.conversationId === state.currentConversation) return;
+  if (events.source) events.source.close();
+  clearTimeout(events.retryTimer);
+
+  const params = new URLSearchParams();
+  if (state.currentConversation) params.set("conversation_id", state.currentConversation);
+  // Al abrir un stream nuevo se continua desde el ultimo evento recibido.
+  if (events.lastEventId) params.set("last_event_id", events.lastEventId);
+  const source = new EventSource(`/events?${params.toString()}`);
+  events.source = source;
+  events.conversationId = state.currentConversation;
+
+  source.addEventListener("message.created", onMessageCreatedEvent);
+  source.addEventListener("message.updated", onMessageUpdatedEvent);
+  source.addEventListener("conversation.updated", onConversationUpdatedEvent);
+  source.addEventListener("resync", onResyncEvent);
+  source.onopen = () => {
+    events.failures = 0;
+    stopPolling();
+  };
+  source.onerror = () => {
+    events.failures += 1;
+    if (events.failures >= APP_CONFIG.eventsFallbackErrors || source.readyState === EventSource.CLOSED) {
+      startPolling();
+    }
+    if (source.readyState === EventSource.CLOSED && events.source === source) {
+      events.source = null;
+      events.retryTimer = setTimeout(connectEvents, APP_CONFIG.eventsRetryMs);
+    }
+  };
+}
+
+function appendHighlightedSnippet(container, snippet, highlight) {
+  // El servidor marca las coincidencias con caracteres de control; se arman
+  // nodos de texto y <mark> para no interpretar HTML del mensaje.
+  const start = highlight?.start || "\u0002";
+  const end = highlight?.end || "\u0003";
+  normalizeText(snippet).split(start).forEach((chunk, index) => {
+    if (index === 0) {
+      container.appendChild(document.createTextNode(chunk.split(end).join("")));
+      return;
+    }
+    const [matched, ...rest] = chunk.split(end);
+    const mark = document.createElement("mark");
+    mark.innerText = matched;
+    container.appendChild(mark);
+    container.appendChild(document.createTextNode(rest.join("")));
+  });
+}
+
+function renderSearchStatus(text) {
+  const status = document.createElement("div");
+  status.className = "search-status";
+  status.innerText = text;
+  dom.searchResults.appendChild(status);
+}
+
+function renderSearchResults(results, hasMore) {
+  dom.searchResults.querySelectorAll(".search-status, [data-action='loadMoreSearch']").forEach((node) => node.remove());
+
+  const fragment = document.createDocumentFragment();
+  results.forEach((result) => {
+    const item = document.createElement("div");
+    item.className = "search-result";
+    item.dataset.searchConversationId = result.conversation_id;
+
+    const title = document.createElement("div");
+    title.className = "search-result-title";
+    const contact = normalizeText(result.contact_name) || result.conversation_id;
+    title.innerText = result.canal ? `${contact} · ${result.canal}` : contact;
+    item.appendChild(title);
+
+    const snippet = document.createElement("div");
+    snippet.className = "search-result-snippet";
+    appendHighlightedSnippet(snippet, result.snippet || result.message, state.search.highlight);
+    item.appendChild(snippet);
+
+    fragment.appendChild(item);
+  });
+  dom.searchResults.appendChild(fragment);
+
+  if (!dom.searchResults.querySelector(".search-result")) {
+    renderSearchStatus("Sin resultados");
+  }
+  if (hasMore) {
+    const more = document.createElement("button");
+    more.type = "button";
+    more.dataset.action = "loadMoreSearch";
+    more.innerText = "Ver mas";
+    dom.searchResults.appendChild(more);
+  }
+}
+
+async function fetchSearchPage() {
+  const search = state.search;
+  const params = new URLSearchParams({ q: search.query });
+  if (search.conversationId) params.set("conversation_id", search.conversationId);
+  if (search.after) params.set("after", search.after);
+
+  const { res, data } = await requestJSON(`/search?${params.toString()}`);
+  if (!isApiSuccess(res, data)) {
+    dom.searchResults.innerHTML = "";
+    renderSearchStatus(data?.error || "No se pudo completar la busqueda");
+    return;
+  }
+
+  search.highlight = data.highlight || null;
+  search.after = data.paging?.has_more ? data.paging.after : null;
+  renderSearchResults(Array.isArray(data.data) ? data.data : [], Boolean(search.after));
+}
+
+async function searchMessages() {
+  if (!dom.searchInput || !dom.searchResults) return;
+
+  const query = dom.searchInput.value.trim();
+  dom.searchResults.innerHTML = "";
+  if (!query) {
+    dom.searchResults.hidden = true;
+    return;
+  }
+
+  const currentOnly = Boolean(dom.searchCurrentOnly?.checked);
+  if (currentOnly && !ensureCurrentConversation()) return;
+
+  state.search = {
+    query,
+    conversationId: currentOnly ? state.currentConversation : null,
+    after: null,
+    highlight: null
+  };
+  dom.searchResults.hidden = false;
+  try {
+    await fetchSearchPage();
+  } catch (error) {
+    renderSearchStatus(`Error de red en la busqueda: ${error.message}`);
+  }
+}
+
+async function loadMoreSearch() {
+  if (!state.search.after) return;
+  try {
+    await fetchSearchPage();
+  } catch (error) {
+    renderSearchStatus(`Error de red en la busqueda: ${error.message}`);
   }
 }
 
@@ -831,9 +1895,9 @@ async function sendMessage() {
   }
 
   dom.messageInput.value = "";
-  renderConfigStatus("Mensaje enviado correctamente.");
+  renderConfigStatus("Mensaje en cola de envio.");
   writeWebhookResult(data);
-  await loadMessages(conversationId);
+  await reportOutboxDelivery(data.outbox_id, conversationId, "Mensaje enviado correctamente.", "No se pudo enviar el mensaje.");
 }
 
 async function sendQuickAnswer() {
@@ -873,26 +1937,26 @@ async function sendQuickAnswer() {
     return;
   }
 
-  renderConfigStatus("QuickAnswer enviado correctamente.");
+  renderConfigStatus("QuickAnswer en cola de envio.");
   writeWebhookResult(data);
-  await loadMessages(conversationId);
+  await reportOutboxDelivery(data.outbox_id, conversationId, "QuickAnswer enviado correctamente.", "No se pudo enviar el QuickAnswer.");
 }
 
 async function sendFile() {
   const conversationId = ensureCurrentConversation();
   if (!conversationId) return;
 
-  const { url, nombre, extension } = getFileFormValues();
+  const { url, nombre, extension, upload } = getFileFormValues();
 
-  if (!url) {
-    renderConfigStatus("Debes ingresar la URL del archivo.", true);
+  if (!upload && !url) {
+    renderConfigStatus("Debes ingresar la URL del archivo o elegir uno.", true);
     return;
   }
-  if (!isValidHttpUrl(url)) {
+  if (!upload && !isValidHttpUrl(url)) {
     renderConfigStatus("La URL del archivo debe iniciar con http:// o https://", true);
     return;
   }
-  if (!nombre) {
+  if (!upload && !nombre) {
     renderConfigStatus("Debes ingresar el nombre del archivo.", true);
     return;
   }
@@ -903,10 +1967,22 @@ async function sendFile() {
 
   const payload = {
     id_conversacion: conversationId,
-    url,
-    nombre,
+    nombre: nombre || upload?.name,
     extension
   };
+  if (upload) {
+    // El archivo se sube a /media y LiveConnect lo descarga desde este servidor.
+    renderConfigStatus("Subiendo archivo...");
+    const uploaded = await uploadMedia(upload);
+    if (!isApiSuccess(uploaded.res, uploaded.data)) {
+      renderConfigStatus("No se pudo subir el archivo.", true);
+      writeWebhookResult(uploaded.data);
+      return;
+    }
+    payload.media_id = uploaded.data.data.sha256;
+  } else {
+    payload.url = url;
+  }
 
   const { res, data } = await postJSON("/sendFile", payload);
   if (!isApiSuccess(res, data)) {
@@ -917,9 +1993,9 @@ async function sendFile() {
 
   clearFileFormValues();
   if (dom.fileComposer) dom.fileComposer.setAttribute("hidden", "hidden");
-  renderConfigStatus("Archivo enviado correctamente.");
+  renderConfigStatus("Archivo en cola de envio.");
   writeWebhookResult(data);
-  await loadMessages(conversationId);
+  await reportOutboxDelivery(data.outbox_id, conversationId, "Archivo enviado correctamente.", "No se pudo enviar el archivo.");
 }
 
 async function transferConversation() {
@@ -1023,7 +2099,7 @@ async function checkWebhook() {
     const summary = extractWebhookSummary(data || {});
 
     renderConfigStatus(
-      ok ? `Consulta completada: webhook ${summary.estado}.` : "La consulta de webhook devolvio error.",
+      ok ? `Consulta completada: webhook ${summary.estado}.${formatCacheAge(data)}` : "La consulta de webhook devolvio error.",
       !ok
     );
 
@@ -1054,7 +2130,7 @@ async function consultBalance() {
       return;
     }
 
-    dom.balanceDisplay.innerText = `Saldo actual: $${balance.toLocaleString(APP_CONFIG.currencyLocale, { minimumFractionDigits: 2, maximumFractionDigits: 2 })}`;
+    dom.balanceDisplay.innerText = `Saldo actual: $${balance.toLocaleString(APP_CONFIG.currencyLocale, { minimumFractionDigits: 2, maximumFractionDigits: 2 })}${formatCacheAge(data)}`;
     renderConfigStatus(
       ok ? "Balance consultado correctamente." : "Balance consultado con advertencias.",
       !ok
@@ -1090,7 +2166,9 @@ const actionHandlers = Object.freeze({
   sendQuickAnswer,
   sendFile,
   transferConversation,
-  sendMessage
+  sendMessage,
+  searchMessages,
+  loadMoreSearch
 });
 
 function onActionClick(event) {
@@ -1112,7 +2190,20 @@ function onConversationClick(event) {
   const conversationId = item.dataset.conversationId;
   if (!conversationId) return;
 
-  selectConversation(conversationId, item);
+  selectConversation(conversationId);
+}
+
+function onSearchResultClick(event) {
+  const item = event.target.closest("[data-search-conversation-id]");
+  if (!item) return;
+
+  selectConversation(item.dataset.searchConversationId);
+}
+
+function onSearchInputKeyDown(event) {
+  if (event.key !== "Enter") return;
+  event.preventDefault();
+  searchMessages();
 }
 
 function onChannelSelectionChange(event) {
@@ -1157,6 +2248,14 @@ function bindEvents() {
     dom.channelSelect.addEventListener("change", onChannelSelectionChange);
   }
 
+  if (dom.searchResults) {
+    dom.searchResults.addEventListener("click", onSearchResultClick);
+  }
+
+  if (dom.searchInput) {
+    dom.searchInput.addEventListener("keydown", onSearchInputKeyDown);
+  }
+
   if (dom.messageInput) {
     dom.messageInput.addEventListener("keydown", onMessageInputKeyDown);
   }
@@ -1174,16 +2273,13 @@ function bindEvents() {
   }
 }
 
-function initApp() {
+async function initApp() {
   closeImageModal();
   bindEvents();
+  // Primero se pinta lo guardado; la red solo trae lo posterior a los cursores.
+  await restoreFromCache();
   loadConversations();
-  setInterval(loadConversations, APP_CONFIG.conversationsPollMs);
-  setInterval(() => {
-    if (state.currentConversation) {
-      loadMessages(state.currentConversation);
-    }
-  }, APP_CONFIG.messagesPollMs);
+  connectEvents();
 }
 
 initApp();
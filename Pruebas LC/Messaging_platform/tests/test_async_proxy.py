@@ -0,0 +1,80 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import metodos.SendMessage as send_message_module
+import metodos.Token as token_module
+import services.liveconnect_async_client as async_client_module
+from metodos.SendMessage import send_message_async
+from metodos.Transfer import transfer_async
+from services.liveconnect_async_client import AsyncLiveConnectClient
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.server.requests.append((self.path, self.headers.get("PageGearToken"), json.loads(body)))
+        payload = json.dumps({"status": "sent"}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AsyncProxyTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = AsyncLiveConnectClient(base_url=f"http://127.0.0.1:{self.server.server_address[1]}/prod")
+        patchers = (
+            mock.patch.object(async_client_module, "default_async_client", self.client),
+            mock.patch.object(token_module.default_token_manager, "_state", ("token-test", time.time() + 3600)),
+        )
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        self.server.shutdown()
+        self.server.server_close()
+
+    async def test_send_message_async_calls_upstream_and_saves_message(self):
+        # Arrange
+        with mock.patch.object(send_message_module, "save_message") as save_message:
+            # Act
+            result = await send_message_async({"id_conversacion": "conv-1", "mensaje": " Hola "})
+
+        # Assert
+        self.assertEqual({"status": "sent", "ok": True, "status_code": 200}, result)
+        self.assertEqual(
+            [("/prod/proxy/sendMessage", "token-test", {"id_conversacion": "conv-1", "mensaje": "Hola"})],
+            self.server.requests,
+        )
+        save_message.assert_called_once_with("conv-1", "proxy", "agent", "Hola", external_id=None)
+
+    async def test_network_error_is_reported_as_bad_gateway(self):
+        # Arrange
+        self.client.base_url = "http://127.0.0.1:1/prod"
+
+        # Act
+        result = await transfer_async({"id_conversacion": "conv-1"})
+
+        # Assert
+        self.assertFalse(result["ok"])
+        self.assertEqual(502, result["status_code"])
+        self.assertIn("Error de red en transfer", result["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
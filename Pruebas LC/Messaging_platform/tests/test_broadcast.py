@@ -0,0 +1,124 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import metodos.Proxy as proxy_module
+from DB.database import SQLiteRepository
+from services.broadcast import prepare_broadcast, stream_broadcast
+from services.resilience import UpstreamUnavailable
+
+
+class CountingRepository(SQLiteRepository):
+    def __post_init__(self):
+        super().__post_init__()
+        self.batch_sizes = []
+
+    def save_messages(self, messages):
+        self.batch_sizes.append(len(messages))
+        return super().save_messages(messages)
+
+
+class _Response:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.text = json.dumps(payload)
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class BroadcastTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.repository = CountingRepository(db_name=os.path.join(self.temp_dir.name, "broadcast_test.db"))
+        self.repository.init_schema()
+        for conversation_id, canal in (("conv-1", "whatsapp"), ("conv-2", "whatsapp"), ("conv-3", "web")):
+            self.repository.save_message(conversation_id, canal, "usuario", "Hola")
+        self.repository.batch_sizes.clear()
+
+    def tearDown(self):
+        self.repository.close()
+        self.temp_dir.cleanup()
+
+    def test_prepare_validates_payload_and_filters_by_channel(self):
+        # Act
+        both_error, _ = prepare_broadcast({"mensaje": "Hola", "id_respuesta": 1, "canal": "web"}, self.repository)
+        empty_error, _ = prepare_broadcast({"mensaje": "Hola"}, self.repository)
+        _, plan = prepare_broadcast(
+            {
+                "id_respuesta": 7,
+                "canal": "whatsapp",
+                "variables": {"nombre": "cliente", "cupon": "A1"},
+                "id_conversaciones": ["conv-1", {"id_conversacion": "conv-2", "variables": {"nombre": "Ana"}}, "conv-3"],
+            },
+            self.repository,
+        )
+
+        # Assert
+        self.assertEqual(400, both_error["status_code"])
+        self.assertEqual("id_conversaciones o canal es requerido", empty_error["error"])
+        self.assertEqual("sendQuickAnswer", plan["kind"])
+        self.assertEqual(["conv-1", "conv-2"], [recipient[0] for recipient in plan["recipients"]])
+        self.assertEqual({"nombre": "Ana", "cupon": "A1"}, plan["recipients"][1][2]["variables"])
+
+    def test_stream_reports_each_recipient_and_persists_logs_in_one_batch(self):
+        # Arrange
+        in_flight = []
+        max_in_flight = []
+        lock = threading.Lock()
+
+        def fake_call(request):
+            with lock:
+                in_flight.append(1)
+                max_in_flight.append(len(in_flight))
+            time.sleep(0.02)
+            with lock:
+                in_flight.pop()
+            if request["json"]["id_conversacion"] == "conv-2":
+                return _Response(400, {"ok": False, "message": "Conversacion cerrada"})
+            return _Response(200, {"status": "sent"})
+
+        _, plan = prepare_broadcast({"mensaje": "Promo", "id_conversaciones": ["conv-1", "conv-2", "conv-3", "conv-4"]}, self.repository)
+
+        with mock.patch.object(proxy_module, "call_liveconnect", side_effect=fake_call):
+            # Act
+            lines = list(stream_broadcast(plan, repository=self.repository, concurrency=2))
+
+        # Assert
+        results = {line["id_conversacion"]: line for line in lines if line["type"] == "result"}
+        summary = lines[-1]
+        self.assertEqual({"conv-1", "conv-2", "conv-3", "conv-4"}, set(results))
+        self.assertEqual("Conversacion cerrada", results["conv-2"]["error"])
+        self.assertEqual((4, 3, 1), (summary["total"], summary["sent"], summary["failed"]))
+        self.assertLessEqual(max(max_in_flight), 2)
+        self.assertEqual([3], self.repository.batch_sizes)
+        self.assertEqual("Promo", self.repository.list_messages("conv-4")[0]["message"])
+        self.assertEqual("whatsapp", self.repository.conversation_channels(["conv-1"])["conv-1"])
+
+    def test_local_rate_limit_waits_for_its_turn(self):
+        # Arrange
+        _, plan = prepare_broadcast({"mensaje": "Hola", "id_conversaciones": ["conv-1"]}, self.repository)
+        outcomes = [UpstreamUnavailable("limite", status_code=429, retry_after=0), _Response(200, {"status": "sent"})]
+
+        def fake_call(request):
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        with mock.patch.object(proxy_module, "call_liveconnect", side_effect=fake_call):
+            # Act
+            lines = list(stream_broadcast(plan, repository=self.repository))
+
+        # Assert
+        self.assertTrue(lines[0]["ok"])
+        self.assertEqual([], outcomes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import metodos.Proxy as proxy_module
+from DB.database import SQLiteRepository
+from services.bulk_transfer import BULK_TRANSFER_MAX_CONVERSATIONS, prepare_bulk_transfer, run_bulk_transfer
+from services.long_poll import LONG_POLL_MAX_SECONDS
+from services.resilience import ENDPOINT_LIMITS, UpstreamUnavailable
+
+
+class _Response:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.text = json.dumps(payload)
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class BulkTransferTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.repository = SQLiteRepository(db_name=os.path.join(self.temp_dir.name, "bulk_transfer_test.db"))
+        self.repository.init_schema()
+        self.repository.save_message("conv-1", "whatsapp", "usuario", "Hola")
+
+    def tearDown(self):
+        self.repository.close()
+        self.temp_dir.cleanup()
+
+    def test_prepare_rejects_invalid_payloads(self):
+        # Act
+        no_ids, _ = prepare_bulk_transfer({"id_canal": 3918}, self.repository)
+        bad_channel, _ = prepare_bulk_transfer({"id_conversaciones": ["conv-1"], "id_canal": "x"}, self.repository)
+        empty_id, _ = prepare_bulk_transfer({"id_conversaciones": ["conv-1", " "], "id_canal": 3918}, self.repository)
+
+        # Assert
+        self.assertEqual("id_conversaciones debe ser una lista no vacia", no_ids["error"])
+        self.assertEqual("id_canal debe ser numerico", bad_channel["error"])
+        self.assertEqual("id_conversaciones contiene un id vacio", empty_id["error"])
+
+    def test_batch_is_capped_to_what_the_rate_limit_finishes_before_a_proxy_timeout(self):
+        # Arrange
+        rate, burst = ENDPOINT_LIMITS["proxy/transfer"]
+        ids = [f"conv-{index}" for index in range(BULK_TRANSFER_MAX_CONVERSATIONS + 1)]
+
+        # Act
+        too_many, _ = prepare_bulk_transfer({"id_conversaciones": ids, "id_canal": 3918}, self.repository)
+        error, plan = prepare_bulk_transfer({"id_conversaciones": ids[:-1], "id_canal": 3918}, self.repository)
+
+        # Assert
+        self.assertEqual(413, too_many["status_code"])
+        self.assertIsNone(error)
+        self.assertLess((len(plan["conversations"]) - burst) / rate, LONG_POLL_MAX_SECONDS)
+
+    def test_failures_are_reported_without_stopping_the_batch(self):
+        # Arrange
+        def fake_call(request):
+            conversation_id = request["json"]["id_conversacion"]
+            if conversation_id == "conv-2":
+                raise UpstreamUnavailable("LiveConnect no disponible (circuito abierto)", retry_after=30)
+            if conversation_id == "conv-3":
+                return _Response(404, {"ok": False, "message": "Conversacion no encontrada"})
+            return _Response(200, {"status": "transferred"})
+
+        _, plan = prepare_bulk_transfer(
+            {"id_conversaciones": ["conv-1", "conv-2", "conv-3", "conv-4", "conv-1"], "id_canal": "3918"},
+            self.repository,
+        )
+
+        with mock.patch.object(proxy_module, "call_liveconnect", side_effect=fake_call) as call:
+            # Act
+            report = run_bulk_transfer(plan, repository=self.repository)
+
+        # Assert
+        self.assertEqual((4, 2, 2), (report["total"], report["transferred"], report["failed"]))
+        self.assertEqual(207, report["status_code"])
+        self.assertEqual(["conv-1", "conv-2", "conv-3", "conv-4"], [result["id_conversacion"] for result in report["results"]])
+        self.assertEqual(
+            {"id_conversacion": "conv-1", "id_canal": 3918, "estado": 1},
+            call.call_args_list[0].args[0]["json"],
+        )
+        self.assertEqual(
+            ["Conversacion no encontrada", "transfer: LiveConnect no disponible (circuito abierto)"],
+            sorted(error["error"] for error in report["errors"]),
+        )
+        logged = self.repository.list_messages("conv-1")[-1]
+        self.assertEqual("structured", logged["message_type"])
+        self.assertEqual("Conversacion transferida al canal 3918", logged["message"])
+        self.assertEqual(3918, logged["metadata"]["id_canal"])
+        self.assertEqual("whatsapp", self.repository.conversation_channels(["conv-1"])["conv-1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from DB.database import SQLiteRepository
+from services.change_bus import ChangeBus
+
+
+class ChangeBusTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "change_bus_test.db")
+        self.repository = SQLiteRepository(db_name=self.db_path)
+        self.repository.init_schema()
+        self.bus = ChangeBus(self.repository, tail_interval=0.05)
+        self.received = []
+        self.delivered = threading.Event()
+
+    def tearDown(self):
+        self.bus.close()
+        self.repository.close()
+        self.temp_dir.cleanup()
+
+    def _collect(self, changes):
+        self.received.extend(changes)
+        self.delivered.set()
+
+    def test_mutations_are_logged_in_the_same_transaction(self):
+        # Arrange
+        self.repository.save_message("conv-1", "proxy", "usuario", "Hola")
+        self.repository.save_message("conv-1", "proxy", "agente", "Respuesta")
+        with self.repository._connection() as conn:
+            conn.execute("UPDATE messages SET created_at = datetime('now', '-2 days')")
+
+        # Act
+        self.repository.archive_messages(older_than_days=1)
+        changes = self.repository.changes_after(0)
+
+        # Assert
+        self.assertEqual(
+            [
+                ("conversation", "insert"),
+                ("message", "insert"),
+                ("conversation", "update"),
+                ("message", "insert"),
+                ("message", "update"),
+                ("message", "update"),
+                ("message", "delete"),
+                ("message", "delete"),
+            ],
+            [(change["entity"], change["op"]) for change in changes],
+        )
+        self.assertEqual(sorted(change["seq"] for change in changes), [change["seq"] for change in changes])
+        self.assertEqual({"conv-1"}, {change["conversation_id"] for change in changes})
+
+    def test_local_commit_wakes_subscriber_with_filtered_changes(self):
+        # Arrange
+        self.repository.save_message("conv-1", "proxy", "usuario", "Anterior")
+        self.bus.subscribe(self._collect, entities=("message",))
+        self.bus.tail_interval = 60
+
+        # Act
+        self.repository.save_message("conv-1", "proxy", "usuario", "Hola")
+
+        # Assert
+        self.assertTrue(self.delivered.wait(2))
+        self.assertEqual([("message", "insert")], [(change["entity"], change["op"]) for change in self.received])
+
+    def test_commit_from_another_process_is_picked_up_by_tailing(self):
+        # Arrange
+        other_process = SQLiteRepository(db_name=self.db_path)
+        self.addCleanup(other_process.close)
+        unsubscribe = self.bus.subscribe(self._collect)
+
+        # Act
+        other_process.save_message("conv-2", "proxy", "usuario", "Desde otro worker")
+
+        # Assert
+        self.assertTrue(self.delivered.wait(2))
+        self.assertEqual({"conv-2"}, {change["conversation_id"] for change in self.received})
+        unsubscribe()
+        self.assertIsNone(self.bus.seq)
+
+
+if __name__ == "__main__":
+    unittest.main()
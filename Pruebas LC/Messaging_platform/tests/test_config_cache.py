@@ -0,0 +1,187 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest import mock
+
+import services.config_cache as config_cache
+from services.config_cache import StaleWhileRevalidateCache
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class StaleWhileRevalidateCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = _Clock()
+        self.cache = StaleWhileRevalidateCache(ttls={"balance": 60}, max_stale=3600, clock=self.clock)
+
+    def test_fresh_entries_are_served_without_calling_upstream(self):
+        # Arrange
+        fetch = mock.Mock(return_value={"ok": True, "balance": 10})
+
+        # Act
+        first = self.cache.get(("balance",), fetch)
+        self.clock.now += 30
+        second = self.cache.get(("balance",), fetch)
+
+        # Assert
+        self.assertEqual({"hit": False, "age_seconds": 0, "stale": False}, first["cache"])
+        self.assertEqual({"hit": True, "age_seconds": 30, "stale": False}, second["cache"])
+        self.assertEqual(10, second["balance"])
+        fetch.assert_called_once()
+
+    def test_stale_entry_is_served_while_refreshing_in_background(self):
+        # Arrange
+        refreshed = threading.Event()
+        values = [{"ok": True, "balance": 10}, {"ok": True, "balance": 20}]
+
+        def fetch():
+            value = values.pop(0)
+            if value["balance"] == 20:
+                refreshed.set()
+            return value
+
+        self.cache.get(("balance",), fetch)
+        self.clock.now += 90
+
+        # Act
+        stale = self.cache.get(("balance",), fetch)
+        refreshed.wait(2)
+        for _ in range(100):
+            if self.cache.peek(("balance",))[0]["balance"] == 20:
+                break
+            time.sleep(0.01)
+        fresh = self.cache.get(("balance",), fetch)
+
+        # Assert
+        self.assertEqual(10, stale["balance"])
+        self.assertEqual({"hit": True, "age_seconds": 90, "stale": True}, stale["cache"])
+        self.assertEqual(20, fresh["balance"])
+        self.assertFalse(fresh["cache"]["stale"])
+
+    def test_errors_are_not_cached_and_fall_back_to_the_last_value(self):
+        # Arrange
+        error = {"ok": False, "status_code": 502, "error": "Error de red en balance: caido"}
+        self.assertEqual(error, self.cache.get(("balance",), lambda: error))
+        self.cache.get(("balance",), lambda: {"ok": True, "balance": 10})
+        self.clock.now += 7200
+
+        # Act
+        result = self.cache.get(("balance",), lambda: error)
+
+        # Assert
+        self.assertEqual(10, result["balance"])
+        self.assertTrue(result["cache"]["stale"])
+        self.assertIn("LiveConnect no respondio", result["warning"])
+
+    def test_set_webhook_invalidates_only_that_channel(self):
+        # Arrange
+        cache = StaleWhileRevalidateCache(clock=self.clock)
+        fetch_webhook = mock.Mock(side_effect=lambda id_canal: {"ok": True, "id_canal": id_canal})
+        with mock.patch.object(config_cache, "fetch_webhook", fetch_webhook), mock.patch.object(
+            config_cache, "push_webhook", return_value={"ok": True}
+        ):
+            config_cache.get_webhook("3918", cache=cache)
+            config_cache.get_webhook(" 42 ", cache=cache)
+
+            # Act
+            config_cache.set_webhook({"id_canal": 3918, "url": "https://example.com/hook"}, cache=cache)
+            after_set = config_cache.get_webhook(3918, cache=cache)
+            other = config_cache.get_webhook("42", cache=cache)
+
+        # Assert
+        self.assertFalse(after_set["cache"]["hit"])
+        self.assertTrue(other["cache"]["hit"])
+        self.assertEqual(3, fetch_webhook.call_count)
+
+    def test_channel_filters_are_normalized_into_the_key(self):
+        # Arrange
+        cache = StaleWhileRevalidateCache(clock=self.clock)
+        fetch_channels = mock.Mock(return_value={"ok": True, "data": []})
+        with mock.patch.object(config_cache, "fetch_channels", fetch_channels):
+            # Act
+            config_cache.get_channels({"visible": "1", "tipo": ""}, cache=cache)
+            cached = config_cache.get_channels({"visible": 1}, cache=cache)
+
+        # Assert
+        self.assertTrue(cached["cache"]["hit"])
+        fetch_channels.assert_called_once()
+
+    def test_concurrent_async_callers_share_one_upstream_call(self):
+        # Arrange
+        calls = []
+        seed_threads = []
+
+        async def fetch_async():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"ok": True, "balance": 10}
+
+        def get_cached_balance():
+            seed_threads.append(threading.current_thread())
+            return None
+
+        async def scenario():
+            return await asyncio.gather(*(config_cache.get_balance_async(cache=self.cache) for _ in range(5)))
+
+        # Act
+        with mock.patch.object(config_cache, "fetch_balance_async", fetch_async), mock.patch.object(
+            config_cache, "get_cached_balance", get_cached_balance
+        ):
+            results = asyncio.run(scenario())
+
+        # Assert
+        self.assertEqual(1, len(calls))
+        self.assertEqual([10] * 5, [result["balance"] for result in results])
+        self.assertEqual(1, sum(1 for result in results if not result["cache"]["hit"]))
+        self.assertNotIn(threading.main_thread(), seed_threads)
+        self.assertEqual({}, self.cache._async_key_locks)
+
+    def test_invalidate_during_foreground_fetch_discards_the_old_value(self):
+        # Arrange
+        key = ("getWebhook", "3918")
+
+        def fetch():
+            # set_webhook termina mientras la consulta sigue en curso.
+            self.cache.invalidate(key)
+            return {"ok": True, "url": "https://example.com/viejo"}
+
+        # Act
+        result = self.cache.get(key, fetch)
+
+        # Assert
+        self.assertEqual("https://example.com/viejo", result["url"])
+        self.assertIsNone(self.cache.peek(key))
+        self.assertEqual({}, self.cache._generations)
+
+    def test_arbitrary_channel_filters_keep_the_cache_bounded(self):
+        # Arrange
+        cache = StaleWhileRevalidateCache(clock=self.clock, max_entries=3)
+        fetch_channels = mock.Mock(return_value={"ok": True, "data": []})
+        with mock.patch.object(config_cache, "fetch_channels", fetch_channels):
+            config_cache.get_channels({"visible": "1"}, cache=cache)
+
+            # Act
+            for index in range(50):
+                config_cache.get_channels({"visible": "1", "ruido": str(index)}, cache=cache)
+                config_cache.get_channels({"visible": "1"}, cache=cache)
+            evicted = config_cache.get_channels({"visible": "1", "ruido": "0"}, cache=cache)
+            recent = config_cache.get_channels({"visible": "1"}, cache=cache)
+
+        # Assert
+        self.assertEqual(3, len(cache._entries))
+        self.assertEqual({}, cache._key_locks)
+        self.assertEqual({}, cache._generations)
+        self.assertFalse(evicted["cache"]["hit"])
+        self.assertTrue(recent["cache"]["hit"])
+        self.assertEqual(52, fetch_channels.call_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
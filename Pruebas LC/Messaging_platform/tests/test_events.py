@@ -0,0 +1,125 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import services.events as events_module
+from DB.database import SQLiteRepository
+from services.change_bus import ChangeBus
+from services.events import MessageEventHub
+
+
+class MessageEventHubTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.repository = SQLiteRepository(db_name=os.path.join(self.temp_dir.name, "events_test.db"))
+        self.repository.init_schema()
+        self.bus = ChangeBus(self.repository)
+        self.hub = MessageEventHub(self.repository, bus=self.bus, buffer_size=3)
+
+    def tearDown(self):
+        self.hub.close()
+        self.bus.close()
+        self.repository.close()
+        self.temp_dir.cleanup()
+
+    def test_new_messages_are_delivered_with_conversation_filter(self):
+        # Arrange
+        cursor = self.hub.subscribe()
+        self.repository.save_message("conv-1", "proxy", "usuario", "Hola")
+        self.repository.save_message("conv-2", "proxy", "usuario", "Otro")
+        self.hub._read_new()
+
+        # Act
+        events, cursor = self.hub.wait(cursor, frozenset({"conv-1"}), timeout=0)
+
+        # Assert
+        self.assertEqual(
+            [("message.created", "conv-1"), ("conversation.updated", "conv-1"), ("conversation.updated", "conv-2")],
+            [(event["event"], event["data"].get("conversation_id", event["data"]["id"])) for event in events],
+        )
+        self.assertEqual("Hola", events[0]["data"]["message"])
+        self.assertEqual(1, events[1]["data"]["unread_count"])
+
+    def test_idle_wait_times_out_without_events(self):
+        # Arrange
+        cursor = self.hub.subscribe()
+
+        # Act
+        events, new_cursor = self.hub.wait(cursor, timeout=0.05)
+
+        # Assert
+        self.assertEqual(([], cursor), (events, new_cursor))
+
+    def test_cursor_behind_buffer_is_replayed_from_database(self):
+        # Arrange
+        self.hub.subscribe()
+        for index in range(5):
+            self.repository.save_message("conv-1", "proxy", "usuario", f"m{index}")
+        self.hub._read_new()
+
+        # Act
+        events, cursor = self.hub.wait(0, timeout=0)
+        with mock.patch.object(events_module, "REPLAY_LIMIT", 2):
+            resync, _ = self.hub.wait(0, timeout=0)
+
+        # Assert
+        self.assertEqual(["m0", "m1", "m2", "m3", "m4"], [e["data"]["message"] for e in events if e["event"] == "message.created"])
+        self.assertEqual(5, cursor)
+        self.assertEqual(["resync"], [event["event"] for event in resync])
+
+    def test_async_waiter_is_woken_by_commit(self):
+        # Arrange
+        async def scenario():
+            cursor = await asyncio.to_thread(self.hub.subscribe)
+            waiter = asyncio.ensure_future(self.hub.wait_async(cursor, timeout=2))
+            await asyncio.sleep(0.05)
+            await asyncio.to_thread(self.repository.save_message, "conv-1", "proxy", "usuario", "Hola")
+            return await waiter
+
+        # Act
+        events, cursor = asyncio.run(scenario())
+
+        # Assert
+        self.assertEqual(["message.created", "conversation.updated"], [event["event"] for event in events])
+        self.assertEqual(1, cursor)
+
+    def test_stream_formats_events_and_heartbeats(self):
+        # Arrange
+        self.repository.save_message("conv-1", "proxy", "usuario", "Hola")
+        stream = self.hub.stream(after_id=0, heartbeat=0.05)
+
+        # Act
+        chunks = [next(stream) for _ in range(4)]
+        stream.close()
+
+        # Assert
+        self.assertEqual("retry: 3000\n\n", chunks[0])
+        self.assertTrue(chunks[1].startswith("id: 1\nevent: message.created\ndata: {"))
+        self.assertTrue(chunks[2].startswith("id: 1\nevent: conversation.updated\n"))
+        self.assertEqual(": ping\n\n", chunks[3])
+        self.assertIsNone(self.hub._head)
+        self.assertEqual({}, self.bus._subscribers)
+
+    def test_mirrored_attachment_is_pushed_as_message_update(self):
+        # Arrange
+        url = "https://cdn.liveconnect.chat/f.png"
+        self.repository.save_message("conv-1", "proxy", "usuario", "foto", message_type="file", file_url=url)
+        stream = self.hub.stream(after_id=0, conversation_ids=frozenset({"conv-1"}), heartbeat=2)
+        chunks = [next(stream) for _ in range(3)]
+        self.repository.save_media("a" * 64, 3, "image/png", "f.png")
+
+        # Act
+        self.repository.link_media_source(url, "a" * 64)
+        chunks.append(next(stream))
+        stream.close()
+
+        # Assert
+        self.assertIn('"local_file_url": null', chunks[1])
+        self.assertTrue(chunks[3].startswith("id: 1\nevent: message.updated\n"))
+        self.assertIn(f'"local_file_url": "/media/{"a" * 64}"', chunks[3])
+
+
+if __name__ == "__main__":
+    unittest.main()
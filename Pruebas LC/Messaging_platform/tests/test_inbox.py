@@ -0,0 +1,287 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from DB.database import SQLiteRepository
+from Inbox import conversations as inbox_conversations
+from Inbox import messages as inbox_messages
+from Inbox import search as inbox_search
+from Inbox.paging import DEFAULT_PAGE_SIZE
+from services.change_bus import ChangeBus
+from services.long_poll import ConversationWaiters
+
+
+class InboxPagingTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "inbox_test.db")
+        self.repository = SQLiteRepository(db_name=self.db_path)
+        self.repository.init_schema()
+        patchers = (
+            mock.patch.object(inbox_messages, "repository_get_messages", self.repository.list_messages),
+            mock.patch.object(inbox_conversations, "repository_get_conversations", self.repository.list_conversations),
+            mock.patch.object(inbox_conversations, "repository_get_sync_version", self.repository.get_sync_version),
+            mock.patch.object(inbox_messages, "repository_get_sync_version", self.repository.get_sync_version),
+            mock.patch.object(inbox_search, "repository_search_messages", self.repository.search_messages),
+            mock.patch.object(inbox_search, "repository_max_message_id", self.repository.max_message_id),
+        )
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.repository.close()
+        self.temp_dir.cleanup()
+
+    def test_get_messages_walks_history_backwards(self):
+        # Arrange
+        for index in range(5):
+            self.repository.save_message("conv-1", "web", "usuario", f"Mensaje {index}")
+
+        # Act
+        first_page = inbox_messages.get_messages("conv-1", limit="2")
+        second_page = inbox_messages.get_messages("conv-1", limit="2", before=first_page["paging"]["before"])
+        last_page = inbox_messages.get_messages("conv-1", limit="2", before=second_page["paging"]["before"])
+
+        # Assert
+        self.assertEqual(["Mensaje 3", "Mensaje 4"], [item["message"] for item in first_page["data"]])
+        self.assertEqual(["Mensaje 1", "Mensaje 2"], [item["message"] for item in second_page["data"]])
+        self.assertEqual(["Mensaje 0"], [item["message"] for item in last_page["data"]])
+        self.assertTrue(second_page["paging"]["has_more"])
+        self.assertFalse(last_page["paging"]["has_more"])
+
+    def test_get_messages_after_cursor_returns_only_newer_rows(self):
+        # Arrange
+        self.repository.save_message("conv-2", "web", "usuario", "Primero")
+        page = inbox_messages.get_messages("conv-2")
+        self.repository.save_message("conv-2", "web", "agent", "Segundo")
+
+        # Act
+        newer = inbox_messages.get_messages("conv-2", after=page["paging"]["after"])
+
+        # Assert
+        self.assertEqual(["Segundo"], [item["message"] for item in newer["data"]])
+        self.assertFalse(newer["paging"]["has_more"])
+
+    def test_get_conversations_pages_newest_first(self):
+        # Arrange
+        for index in range(3):
+            self.repository.save_message(f"conv-{index}", "web", "usuario", "Hola")
+
+        # Act
+        first_page = inbox_conversations.get_conversations(limit=2)
+        second_page = inbox_conversations.get_conversations(limit=2, before=first_page["paging"]["before"])
+
+        # Assert
+        seen = [item["id"] for item in first_page["data"] + second_page["data"]]
+        self.assertEqual(3, len(set(seen)))
+        self.assertTrue(first_page["paging"]["has_more"])
+        self.assertFalse(second_page["paging"]["has_more"])
+
+    def test_sidebar_reaches_every_conversation_beyond_the_first_page(self):
+        # Arrange
+        total = DEFAULT_PAGE_SIZE * 2 + 50
+        for index in range(total):
+            self.repository.save_message(f"conv-{index:03d}", "web", "usuario", "Hola")
+        first_page = inbox_conversations.get_conversations()
+        # Una conversacion vieja que se mueve mientras se pagina llega por el delta.
+        self.repository.save_message("conv-000", "web", "agent", "Respuesta")
+
+        # Act
+        delta = inbox_conversations.get_conversations(since=first_page["sync"])
+        seen = [item["id"] for item in first_page["data"] + delta["data"]]
+        before = first_page["paging"]["before"] if first_page["paging"]["has_more"] else None
+        pages = 0
+        while before:
+            page = inbox_conversations.get_conversations(before=before)
+            seen.extend(item["id"] for item in page["data"])
+            before = page["paging"]["before"] if page["paging"]["has_more"] else None
+            pages += 1
+
+        # Assert
+        self.assertEqual(DEFAULT_PAGE_SIZE, len(first_page["data"]))
+        self.assertEqual(2, pages)
+        self.assertEqual({f"conv-{index:03d}" for index in range(total)}, set(seen))
+        self.assertEqual(["conv-000"], [item["id"] for item in delta["data"]])
+
+    def test_get_conversations_since_returns_only_changed_rows(self):
+        # Arrange
+        self.repository.save_message("conv-a", "web", "usuario", "Hola")
+        self.repository.save_message("conv-b", "web", "usuario", "Hola")
+        snapshot = inbox_conversations.get_conversations()
+        version_before = inbox_conversations.get_conversations_version()
+        self.repository.save_message("conv-a", "web", "agent", "Respuesta")
+
+        # Act
+        delta = inbox_conversations.get_conversations(since=snapshot["sync"])
+        empty_delta = inbox_conversations.get_conversations(since=delta["sync"])
+
+        # Assert
+        self.assertEqual(["conv-a"], [item["id"] for item in delta["data"]])
+        self.assertEqual([], empty_delta["data"])
+        self.assertEqual(delta["sync"], empty_delta["sync"])
+        self.assertGreater(inbox_conversations.get_conversations_version(), version_before)
+
+    def test_get_messages_since_sync_cursor_returns_new_rows(self):
+        # Arrange
+        self.repository.save_message("conv-3", "web", "usuario", "Primero")
+        snapshot = inbox_messages.get_messages("conv-3")
+        version_before = inbox_messages.get_messages_version("conv-3")
+
+        # Act
+        unchanged = inbox_messages.get_messages("conv-3", since=snapshot["sync"])
+        self.repository.save_message("conv-3", "web", "agent", "Segundo")
+        delta = inbox_messages.get_messages("conv-3", since=unchanged["sync"])
+
+        # Assert
+        self.assertEqual([], unchanged["data"])
+        self.assertEqual(snapshot["sync"], unchanged["sync"])
+        self.assertEqual(["Segundo"], [item["message"] for item in delta["data"]])
+        self.assertGreater(inbox_messages.get_messages_version("conv-3"), version_before)
+
+    def test_linked_media_changes_version_and_is_listed(self):
+        # Arrange
+        self.repository.save_message(
+            "conv-4", "web", "usuario", "foto", message_type="file", file_url="https://cdn.liveconnect.chat/f.png"
+        )
+        version = inbox_messages.get_messages_version("conv-4")
+        self.repository.save_media("a" * 64, 3, "image/png", "f.png")
+
+        # Act
+        self.repository.link_media_source("https://cdn.liveconnect.chat/f.png", "a" * 64)
+        page = inbox_messages.get_messages("conv-4")
+
+        # Assert
+        self.assertGreater(inbox_messages.get_messages_version("conv-4"), version)
+        self.assertEqual(f"/media/{'a' * 64}", page["data"][0]["local_file_url"])
+
+    def test_invalid_cursor_returns_error(self):
+        # Act
+        result = inbox_messages.get_messages("conv-1", before="no-es-un-cursor")
+
+        # Assert
+        self.assertFalse(result["ok"])
+        self.assertEqual(400, result["status_code"])
+
+
+    def test_search_messages_ranks_matches_and_pages_with_after(self):
+        # Arrange
+        self.repository.save_message("conv-1", "web", "usuario", "Necesito la factura de marzo")
+        self.repository.save_message("conv-2", "whatsapp", "usuario", "La facturacion esta lista, revisa la factura")
+        self.repository.save_message("conv-2", "whatsapp", "agente", "Sin relacion")
+
+        # Act
+        first = inbox_search.search_messages("FACTURA", limit=1)
+        second = inbox_search.search_messages("factura", limit=1, after=first["paging"]["after"])
+
+        # Assert
+        self.assertTrue(first["paging"]["has_more"])
+        self.assertFalse(second["paging"]["has_more"])
+        ids = {first["data"][0]["conversation_id"], second["data"][0]["conversation_id"]}
+        self.assertEqual({"conv-1", "conv-2"}, ids)
+        self.assertIn("\x02factura\x03", first["data"][0]["snippet"].lower())
+
+    def test_search_pages_stay_consistent_when_messages_arrive(self):
+        # Arrange
+        for index in range(6):
+            self.repository.save_message(f"conv-{index}", "web", "usuario", "pedido " + "listo " * index)
+        first = inbox_search.search_messages("pedido", limit=3)
+        # Cambia las estadisticas de bm25 (cantidad de filas y largo promedio).
+        self.repository.save_message("conv-9", "web", "usuario", "pedido")
+        for _ in range(20):
+            self.repository.save_message("conv-9", "web", "usuario", "otro texto " * 30)
+
+        # Act
+        second = inbox_search.search_messages("pedido", limit=3, after=first["paging"]["after"])
+
+        # Assert
+        results = first["data"] + second["data"]
+        self.assertEqual(6, len({item["id"] for item in results}))
+        self.assertEqual({f"conv-{index}" for index in range(6)}, {item["conversation_id"] for item in results})
+        self.assertTrue(first["paging"]["has_more"])
+        self.assertFalse(second["paging"]["has_more"])
+
+    def test_search_messages_filters_by_conversation_and_escapes_syntax(self):
+        # Arrange
+        self.repository.save_message("conv-1", "web", "usuario", "Pedido enviado")
+        self.repository.save_message("conv-2", "web", "usuario", "Pedido pendiente")
+
+        # Act
+        filtered = inbox_search.search_messages('pedido" (^*', conversation_id="conv-2")
+        empty = inbox_search.search_messages("  *  ")
+
+        # Assert
+        self.assertEqual(["conv-2"], [item["conversation_id"] for item in filtered["data"]])
+        self.assertEqual(400, empty["status_code"])
+
+    def test_build_match_query_quotes_terms_and_prefixes_last(self):
+        # Act
+        match_query = inbox_search.build_match_query('hola "mun')
+
+        # Assert
+        self.assertEqual('"hola" "mun"*', match_query)
+
+
+class MessageLongPollTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.repository = SQLiteRepository(db_name=os.path.join(self.temp_dir.name, "long_poll_test.db"))
+        self.repository.init_schema()
+        patcher = mock.patch.object(inbox_messages, "repository_get_messages", self.repository.list_messages)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.bus = ChangeBus(self.repository)
+        self.waiters = ConversationWaiters(bus=self.bus)
+
+    def tearDown(self):
+        self.waiters.close()
+        self.bus.close()
+        self.repository.close()
+        self.temp_dir.cleanup()
+
+    def test_poll_returns_once_a_message_arrives_for_the_conversation(self):
+        # Arrange
+        self.repository.save_message("conv-1", "web", "usuario", "Primero")
+        cursor = inbox_messages.get_messages("conv-1")["sync"]
+
+        def deliver():
+            self.repository.save_message("conv-2", "web", "usuario", "Otra conversacion")
+            self.repository.save_message("conv-1", "web", "agent", "Segundo")
+
+        timer = threading.Timer(0.1, deliver)
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        # Act
+        page = inbox_messages.poll_messages("conv-1", after=cursor, wait="5", waiters=self.waiters)
+
+        # Assert
+        self.assertEqual(["Segundo"], [item["message"] for item in page["data"]])
+        self.assertNotEqual(cursor, page["sync"])
+        self.assertEqual(0, self.waiters.count())
+
+    def test_async_poll_times_out_with_same_cursor(self):
+        # Arrange
+        self.repository.save_message("conv-1", "web", "usuario", "Primero")
+        cursor = inbox_messages.get_messages("conv-1")["sync"]
+
+        async def scenario():
+            return await asyncio.gather(
+                *(inbox_messages.poll_messages_async("conv-1", after=cursor, wait="0.1", waiters=self.waiters) for _ in range(50))
+            )
+
+        # Act
+        pages = asyncio.run(scenario())
+        invalid = inbox_messages.poll_messages("conv-1", wait="-1", waiters=self.waiters)
+
+        # Assert
+        self.assertEqual({(0, cursor)}, {(len(page["data"]), page["sync"]) for page in pages})
+        self.assertEqual(0, self.waiters.count())
+        self.assertEqual(400, invalid["status_code"])
+
+
+if __name__ == "__main__":
+    unittest.main()
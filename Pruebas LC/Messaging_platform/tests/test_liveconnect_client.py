@@ -0,0 +1,73 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from services.liveconnect_client import LiveConnectClient
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self.server.client_ports.append(self.client_address[1])
+        if self.path.endswith("/slow"):
+            time.sleep(0.5)
+        body = json.dumps({"ok": True, "path": self.path}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _reply
+    do_POST = _reply
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LiveConnectClientTests(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+        self.server.client_ports = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{self.server.server_address[1]}/prod"
+        self.client = LiveConnectClient(base_url=base_url, timeouts={"proxy/slow": (1, 0.1)})
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_requests_reuse_a_single_keep_alive_connection(self):
+        # Act
+        responses = [
+            self.client.post("proxy/sendMessage", json={"mensaje": "Hola"}),
+            self.client.get("/proxy/balance"),
+            self.client.get("channels/list", params={"visible": 1}),
+        ]
+
+        # Assert
+        self.assertEqual(
+            ["/prod/proxy/sendMessage", "/prod/proxy/balance", "/prod/channels/list?visible=1"],
+            [response.json()["path"] for response in responses],
+        )
+        self.assertEqual(1, len(set(self.server.client_ports)))
+
+    def test_endpoint_timeout_is_applied(self):
+        # Act / Assert
+        self.assertEqual((1, 0.1), self.client.timeout_for("/proxy/slow"))
+        self.assertEqual(self.client.default_timeout, self.client.timeout_for("proxy/transfer"))
+        with self.assertRaises(requests.Timeout):
+            self.client.get("proxy/slow")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from werkzeug.test import EnvironBuilder
+
+import services.media_store as media_store_module
+from DB.database import SQLiteRepository
+from services.media_store import MediaStore
+
+
+def _multipart(boundary, parts):
+    body = b""
+    for name, file_name, content in parts:
+        disposition = f'form-data; name="{name}"'
+        if file_name is not None:
+            disposition += f'; filename="{file_name}"'
+        body += f"--{boundary}\r\nContent-Disposition: {disposition}\r\n\r\n".encode("ascii") + content + b"\r\n"
+    return body + f"--{boundary}--\r\n".encode("ascii")
+
+
+class _Response:
+    def __init__(self, status_code, headers=None, chunks=()):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.chunks = chunks
+        self.is_redirect = "Location" in self.headers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        return iter(self.chunks)
+
+
+class _Session:
+    def __init__(self, responses):
+        self.responses = responses
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        return self.responses.pop(0)
+
+
+def _resolve_to(address):
+    return lambda host, port, **kwargs: [(None, None, None, "", (address, port))]
+
+
+class MediaStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.repository = SQLiteRepository(db_name=os.path.join(self.temp_dir.name, "media_test.db"))
+        self.repository.init_schema()
+        self.store = MediaStore(root=os.path.join(self.temp_dir.name, "media"), repository=self.repository, max_bytes=1024)
+
+    def tearDown(self):
+        self.repository.close()
+        self.temp_dir.cleanup()
+
+    def _upload(self, parts):
+        body = _multipart("limite", parts)
+        return self.store.save_multipart(io.BytesIO(body), "multipart/form-data; boundary=limite")
+
+    def test_same_content_is_stored_once(self):
+        # Act
+        first = self._upload([("nota", None, b"ignorado"), ("file", "a.txt", b"hola")])
+        second = self._upload([("file", "b.txt", b"hola")])
+
+        # Assert
+        self.assertEqual(201, first["status_code"])
+        self.assertEqual(first["data"]["sha256"], second["data"]["sha256"])
+        self.assertEqual("text/plain", first["data"]["content_type"])
+        path, record = self.store.get(first["data"]["sha256"])
+        with open(path, "rb") as handle:
+            self.assertEqual(b"hola", handle.read())
+        self.assertEqual(4, record["size"])
+        self.assertEqual([], os.listdir(os.path.join(self.store.root, ".tmp")))
+
+    def test_upload_over_limit_is_rejected_without_leftovers(self):
+        # Act
+        result = self._upload([("file", "grande.bin", b"x" * 2048)])
+
+        # Assert
+        self.assertEqual(413, result["status_code"])
+        self.assertEqual([".tmp"], os.listdir(self.store.root))
+        self.assertEqual([], os.listdir(os.path.join(self.store.root, ".tmp")))
+
+    def test_mirrored_url_is_exposed_as_local_file(self):
+        # Arrange
+        record = self.store.save_chunks([b"img"], "image/png", "foto.png")
+        self.repository.link_media_source("https://cdn.example/foto.png", record["sha256"])
+        self.repository.save_message(
+            "conv-1", "proxy", "usuario", "foto", message_type="file", file_url="https://cdn.example/foto.png"
+        )
+
+        # Act
+        messages = self.repository.list_messages("conv-1")
+
+        # Assert
+        self.assertEqual(f"/media/{record['sha256']}", messages[0]["local_file_url"])
+
+    def test_mirror_only_fetches_public_allowed_hosts(self):
+        # Arrange
+        session = _Session([_Response(200, chunks=[b"img"])])
+        self.store.allowed_hosts = ("cdn.liveconnect.chat",)
+
+        # Act
+        with self.assertRaises(ValueError):
+            self.store.mirror("http://169.254.169.254/latest/meta-data", session=session)
+        with mock.patch.object(media_store_module.socket, "getaddrinfo", _resolve_to("10.0.0.5")):
+            with self.assertRaises(ValueError):
+                self.store.mirror("https://cdn.liveconnect.chat/a.png", session=session)
+        with mock.patch.object(media_store_module.socket, "getaddrinfo", _resolve_to("104.18.0.1")):
+            record = self.store.mirror("https://cdn.liveconnect.chat/a.png", session=session)
+
+        # Assert
+        self.assertEqual(["https://cdn.liveconnect.chat/a.png"], session.urls)
+        self.assertEqual(("a.png", 3), (record["file_name"], record["size"]))
+
+    def test_mirror_rejects_redirect_to_other_host(self):
+        # Arrange
+        session = _Session([_Response(302, {"Location": "http://127.0.0.1:8080/admin"})])
+        self.store.allowed_hosts = ("cdn.liveconnect.chat",)
+
+        # Act
+        with mock.patch.object(media_store_module.socket, "getaddrinfo", _resolve_to("104.18.0.1")):
+            with self.assertRaises(ValueError):
+                self.store.mirror("https://cdn.liveconnect.chat/a.png", session=session)
+
+        # Assert
+        self.assertEqual(["https://cdn.liveconnect.chat/a.png"], session.urls)
+        self.assertEqual({}, self.repository.media_for_urls(["https://cdn.liveconnect.chat/a.png"]))
+
+    def test_uploaded_html_is_served_as_download(self):
+        # Arrange
+        html = self._upload([("file", "a.html", b"<script>alert(document.cookie)</script>")])["data"]
+        image = self.store.save_chunks([b"img"], "image/png", "foto.png")
+        environ = EnvironBuilder(path="/media").get_environ()
+
+        # Act
+        html_response = self.store.serve(html["sha256"], environ)
+        image_response = self.store.serve(image["sha256"], environ)
+        missing = self.store.serve("0" * 64, environ)
+
+        # Assert
+        self.assertEqual("text/html", html["content_type"])
+        self.assertEqual("application/octet-stream", html_response.mimetype)
+        self.assertTrue(html_response.headers["Content-Disposition"].startswith("attachment"))
+        self.assertEqual("image/png", image_response.mimetype)
+        self.assertTrue(image_response.headers["Content-Disposition"].startswith("inline"))
+        for response in (html_response, image_response):
+            self.assertEqual("nosniff", response.headers["X-Content-Type-Options"])
+            self.assertEqual("sandbox", response.headers["Content-Security-Policy"])
+            response.close()
+        self.assertIsNone(missing)
+
+    def test_send_file_resolves_media_id(self):
+        # Arrange
+        record = self.store.save_chunks([b"%PDF"], None, "informe.pdf")
+
+        # Act
+        error, data = self.store.resolve_send_file(
+            {"id_conversacion": "conv-1", "media_id": record["sha256"]}, "http://proxy.local/"
+        )
+        missing, _ = self.store.resolve_send_file({"id_conversacion": "conv-1", "media_id": "0" * 64}, "")
+
+        # Assert
+        self.assertIsNone(error)
+        self.assertEqual(f"http://proxy.local/media/{record['sha256']}", data["url"])
+        self.assertEqual(("informe.pdf", "pdf"), (data["nombre"], data["extension"]))
+        self.assertEqual(404, missing["status_code"])
+
+
+if __name__ == "__main__":
+    unittest.main()
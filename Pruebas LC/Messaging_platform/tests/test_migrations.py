@@ -0,0 +1,144 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from DB.database import SQLiteRepository
+from DB.migrations import LATEST_VERSION, current_version
+
+
+class MigrationTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "migrations_test.db")
+        self.repository = SQLiteRepository(db_name=self.db_path)
+
+    def tearDown(self):
+        self.repository.close()
+        self.temp_dir.cleanup()
+
+    def test_init_schema_records_latest_version_once(self):
+        # Act
+        self.repository.init_schema()
+        self.repository.init_schema()
+
+        # Assert
+        with self.repository._connection() as conn:
+            versions = [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+            self.assertEqual(LATEST_VERSION, current_version(conn))
+        self.assertEqual(list(range(1, LATEST_VERSION + 1)), versions)
+
+    def test_init_schema_upgrades_legacy_database(self):
+        # Arrange
+        with sqlite3.connect(self.db_path) as legacy:
+            legacy.execute("CREATE TABLE conversations (id TEXT PRIMARY KEY, canal TEXT, updated_at DATETIME)")
+            legacy.execute("CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, conversation_id TEXT, sender TEXT, message TEXT, created_at DATETIME DEFAULT CURRENT_TIMESTAMP)")
+            legacy.execute("INSERT INTO messages (conversation_id, sender, message) VALUES ('conv-1', 'usuario', 'Hola')")
+        legacy.close()
+
+        # Act
+        self.repository.init_schema()
+        self.repository.save_message("conv-1", "web", "usuario", "Archivo", file_url="https://example.com/a.pdf")
+
+        # Assert
+        messages = self.repository.list_messages("conv-1")
+        self.assertEqual(["Hola", "Archivo"], [message["message"] for message in messages])
+        self.assertEqual("file", messages[1]["message_type"])
+
+    def test_external_id_backfill_keeps_first_of_existing_duplicates(self):
+        # Arrange
+        with sqlite3.connect(self.db_path) as legacy:
+            legacy.execute("CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, conversation_id TEXT, sender TEXT, message TEXT, metadata TEXT, created_at DATETIME DEFAULT CURRENT_TIMESTAMP)")
+            legacy.executemany(
+                "INSERT INTO messages (conversation_id, sender, message, metadata) VALUES (?, ?, ?, ?)",
+                [
+                    ("conv-1", "usuario", "Hola", '{"messageUID": "uid-1"}'),
+                    ("conv-1", "usuario", "Hola", '{"messageUID": "uid-1"}'),
+                    ("conv-1", "usuario", "Otro", "no es json"),
+                ],
+            )
+        legacy.close()
+
+        # Act
+        self.repository.init_schema()
+        saved = self.repository.save_message("conv-1", "web", "usuario", "Hola", external_id="uid-1")
+
+        # Assert
+        with self.repository._connection() as conn:
+            external_ids = [row[0] for row in conn.execute("SELECT external_id FROM messages ORDER BY id")]
+        self.assertEqual(["uid-1", None, None], external_ids)
+        self.assertFalse(saved)
+
+    def test_external_id_is_rekeyed_with_tipo(self):
+        # Arrange
+        self.repository.init_schema()
+        with self.repository._connection() as conn:
+            conn.execute("DELETE FROM schema_version WHERE version >= 10")
+            conn.executemany(
+                "INSERT INTO messages (conversation_id, sender, message, metadata, external_id) VALUES (?, ?, ?, ?, ?)",
+                [
+                    ("conv-1", "usuario", "archivo.pdf", '{"messageUID": "uid-1", "tipo": 0}', "uid-1"),
+                    ("conv-1", "usuario", "Documento", '{"messageUID": "uid-1", "tipo": 2}', None),
+                    ("conv-1", "usuario", "Documento", '{"messageUID": "uid-1", "tipo": 2}', None),
+                    ("conv-1", "agent", "Hola", None, "outbox:1"),
+                ],
+            )
+            conn.commit()
+
+        # Act
+        self.repository.init_schema()
+        saved = self.repository.save_message("conv-1", "web", "usuario", "Documento", external_id="uid-1:2")
+
+        # Assert
+        with self.repository._connection() as conn:
+            external_ids = [row[0] for row in conn.execute("SELECT external_id FROM messages ORDER BY id")]
+        self.assertEqual(["uid-1:0", "uid-1:2", None, "outbox:1"], external_ids)
+        self.assertFalse(saved)
+
+    def test_conversation_summary_is_backfilled(self):
+        # Arrange
+        with sqlite3.connect(self.db_path) as legacy:
+            legacy.execute("CREATE TABLE conversations (id TEXT PRIMARY KEY, canal TEXT, updated_at DATETIME)")
+            legacy.execute("CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, conversation_id TEXT, sender TEXT, message TEXT, created_at DATETIME DEFAULT CURRENT_TIMESTAMP)")
+            legacy.execute("INSERT INTO conversations (id, canal) VALUES ('conv-1', 'web')")
+            legacy.executemany(
+                "INSERT INTO messages (conversation_id, sender, message) VALUES (?, ?, ?)",
+                [("conv-1", "usuario", "Hola"), ("conv-1", "agent", "Hola!"), ("conv-1", "usuario", "Gracias")],
+            )
+        legacy.close()
+
+        # Act
+        self.repository.init_schema()
+
+        # Assert
+        conversation = self.repository.list_conversations()[0]
+        self.assertEqual(3, conversation["message_count"])
+        self.assertEqual(1, conversation["unread_count"])
+        self.assertEqual("Gracias", conversation["last_message"])
+
+    def test_list_queries_use_indexes(self):
+        # Arrange
+        self.repository.init_schema()
+
+        # Act
+        with self.repository._connection() as conn:
+            messages_plan = " ".join(
+                row[3]
+                for row in conn.execute(
+                    "EXPLAIN QUERY PLAN SELECT id FROM messages WHERE conversation_id = ? ORDER BY created_at, id",
+                    ("conv-1",),
+                )
+            )
+            conversations_plan = " ".join(
+                row[3]
+                for row in conn.execute("EXPLAIN QUERY PLAN SELECT id FROM conversations ORDER BY updated_at DESC")
+            )
+
+        # Assert
+        self.assertIn("idx_messages_conversation_created", messages_plan)
+        self.assertNotIn("TEMP B-TREE", messages_plan)
+        self.assertIn("idx_conversations_updated", conversations_plan)
+
+
+if __name__ == "__main__":
+    unittest.main()
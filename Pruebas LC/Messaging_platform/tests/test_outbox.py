@@ -0,0 +1,124 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import metodos.SendMessage as send_message_module
+import services.outbox as outbox_module
+from DB.database import SQLiteRepository
+from services.outbox import OutboxDispatcher
+
+
+class _Response:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.text = json.dumps(payload or {})
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class OutboxTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.repository = SQLiteRepository(db_name=os.path.join(self.temp_dir.name, "outbox_test.db"))
+        self.repository.init_schema()
+        self.outbox = OutboxDispatcher(self.repository, workers=1)
+        # process_next se llama a mano: sin hilos en segundo plano.
+        self.outbox.start = lambda: None
+        patcher = mock.patch.object(send_message_module, "save_message", self.repository.save_message)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.outbox.close()
+        self.repository.close()
+        self.temp_dir.cleanup()
+
+    def _send(self, conversation_id, message):
+        return self.outbox.enqueue("sendMessage", {"id_conversacion": conversation_id, "mensaje": message})
+
+    def test_enqueue_returns_accepted_and_rejects_invalid_payloads(self):
+        # Act
+        accepted = self._send("conv-1", "Hola")
+        rejected = self._send("conv-1", "  ")
+
+        # Assert
+        self.assertEqual(202, accepted["status_code"])
+        self.assertEqual("pending", self.outbox.status(accepted["outbox_id"])["data"]["status"])
+        self.assertEqual({"ok": False, "status_code": 400, "error": "mensaje es requerido"}, rejected)
+        self.assertEqual(404, self.outbox.status(999)["status_code"])
+
+    def test_claims_only_the_head_of_each_conversation(self):
+        # Arrange
+        first = self._send("conv-1", "Uno")["outbox_id"]
+        second = self._send("conv-1", "Dos")["outbox_id"]
+        other = self._send("conv-2", "Otro")["outbox_id"]
+
+        # Act
+        claimed = [item["id"] for item in self.repository.claim_outbox(limit=10)]
+        while_sending = self.repository.claim_outbox(limit=10)
+        self.repository.finish_outbox(first, "sent")
+        after_first = [item["id"] for item in self.repository.claim_outbox(limit=10)]
+
+        # Assert
+        self.assertEqual([first, other], claimed)
+        self.assertEqual([], while_sending)
+        self.assertEqual([second], after_first)
+
+    def test_expired_lease_is_claimed_again(self):
+        # Arrange
+        outbox_id = self._send("conv-1", "Hola")["outbox_id"]
+        now = time.time()
+        self.repository.claim_outbox(lease_seconds=60, now=now)
+
+        # Act
+        reclaimed = self.repository.claim_outbox(lease_seconds=60, now=now + 61)
+
+        # Assert
+        self.assertEqual([outbox_id], [item["id"] for item in reclaimed])
+        self.assertEqual(2, reclaimed[0]["attempts"])
+
+    def test_upstream_failure_is_retried_and_redelivery_saves_the_message_once(self):
+        # Arrange
+        outbox_id = self._send("conv-1", "Hola")["outbox_id"]
+        responses = [_Response(503), _Response(200, {"status": "sent"}), _Response(200, {"status": "sent"})]
+
+        with mock.patch.object(outbox_module, "call_liveconnect", side_effect=lambda request: responses.pop(0)):
+            # Act
+            self.outbox.process_next()
+            retrying = self.outbox.status(outbox_id)["data"]
+            with self.repository._connection() as conn:
+                conn.execute("UPDATE outbox SET next_attempt_at = 0 WHERE id = ?", (outbox_id,))
+            self.outbox.process_next()
+            # Un reenvio tras una caida (lease vencido) no duplica el mensaje local.
+            self.outbox._deliver(self.outbox.status(outbox_id)["data"])
+
+        # Assert
+        self.assertEqual("pending", retrying["status"])
+        self.assertEqual("LiveConnect respondio 503", retrying["last_error"])
+        delivered = self.outbox.status(outbox_id)["data"]
+        self.assertEqual("sent", delivered["status"])
+        self.assertEqual(2, delivered["attempts"])
+        self.assertEqual(["Hola"], [message["message"] for message in self.repository.list_messages("conv-1")])
+
+    def test_client_errors_are_not_retried(self):
+        # Arrange
+        outbox_id = self._send("conv-1", "Hola")["outbox_id"]
+
+        with mock.patch.object(outbox_module, "call_liveconnect", return_value=_Response(400, {"ok": False, "message": "Conversacion cerrada"})):
+            # Act
+            self.outbox.process_next()
+
+        # Assert
+        failed = self.outbox.status(outbox_id)["data"]
+        self.assertEqual("failed", failed["status"])
+        self.assertEqual("Conversacion cerrada", failed["last_error"])
+        self.assertEqual([], self.repository.list_messages("conv-1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
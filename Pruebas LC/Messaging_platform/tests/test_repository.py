@@ -1,8 +1,11 @@
 import os
+import sqlite3
 import tempfile
 import unittest
+from unittest import mock
 
 from DB.database import SQLiteRepository
+from services.retention import RetentionWorker, run_retention
 
 
 class RepositoryTests(unittest.TestCase):
@@ -13,6 +16,7 @@ class RepositoryTests(unittest.TestCase):
         self.repository.init_schema()
 
     def tearDown(self):
+        self.repository.close()
         self.temp_dir.cleanup()
 
     def test_save_message_updates_existing_conversation(self):
@@ -43,6 +47,26 @@ class RepositoryTests(unittest.TestCase):
         self.assertEqual("usuario", messages[0]["sender"])
         self.assertEqual("agente", messages[1]["sender"])
 
+    def test_save_message_maintains_conversation_summary(self):
+        # Arrange
+        self.repository.save_message("conv-14", "web", "usuario", "Hola", external_at="1700000000")
+        self.repository.save_message("conv-14", "web", "usuario", "Sigo esperando")
+
+        # Act
+        before_reply = self.repository.list_conversations()[0]
+        self.repository.save_message("conv-14", "web", "agent", "Ya te ayudo")
+        after_reply = self.repository.list_conversations()[0]
+
+        # Assert
+        self.assertEqual(2, before_reply["unread_count"])
+        self.assertEqual("Sigo esperando", before_reply["last_message"])
+        self.assertEqual("usuario", before_reply["last_sender"])
+        self.assertEqual("1700000000", before_reply["last_external_at"])
+        self.assertEqual(3, after_reply["message_count"])
+        self.assertEqual(0, after_reply["unread_count"])
+        self.assertEqual("Ya te ayudo", after_reply["last_message"])
+        self.assertEqual("text", after_reply["last_message_type"])
+
     def test_save_and_get_cached_balance(self):
         # Arrange
         balance_payload = {"ok": True, "balance": 1234.5, "status_code": 200}
@@ -54,6 +78,156 @@ class RepositoryTests(unittest.TestCase):
         # Assert
         self.assertEqual(balance_payload, cached_balance)
 
+    def test_connections_are_pooled_and_use_wal(self):
+        # Act
+        with self.repository._connection() as first:
+            journal_mode = first.execute("PRAGMA journal_mode").fetchone()[0]
+        with self.repository._connection() as second:
+            pass
+
+        # Assert
+        self.assertIs(first, second)
+        self.assertEqual("wal", journal_mode.lower())
+
+    def test_reads_do_not_wait_for_open_write_transaction(self):
+        # Arrange
+        self.repository.save_message("conv-12", "web", "usuario", "Antes")
+        writer = self.repository._connect()
+        writer.execute("BEGIN IMMEDIATE")
+        writer.execute(
+            "INSERT INTO messages (conversation_id, sender, message) VALUES (?, ?, ?)",
+            ("conv-12", "usuario", "Pendiente"),
+        )
+
+        # Act
+        try:
+            messages = self.repository.list_messages("conv-12")
+        finally:
+            writer.rollback()
+            writer.close()
+
+        # Assert
+        self.assertEqual(["Antes"], [message["message"] for message in messages])
+
+    def test_list_messages_supports_keyset_windows(self):
+        # Arrange
+        for index in range(5):
+            self.repository.save_message("conv-13", "web", "usuario", f"Mensaje {index}")
+        all_messages = self.repository.list_messages("conv-13")
+        pivot = all_messages[2]
+        pivot_key = (pivot["created_at"], pivot["id"])
+
+        # Act
+        latest = self.repository.list_messages("conv-13", limit=2)
+        older = self.repository.list_messages("conv-13", limit=10, before=pivot_key)
+        newer = self.repository.list_messages("conv-13", limit=1, after=pivot_key)
+
+        # Assert
+        self.assertEqual(["Mensaje 3", "Mensaje 4"], [message["message"] for message in latest])
+        self.assertEqual(["Mensaje 0", "Mensaje 1"], [message["message"] for message in older])
+        self.assertEqual(["Mensaje 3"], [message["message"] for message in newer])
+
+
+    def test_search_messages_indexes_file_names_and_links(self):
+        # Arrange
+        self.repository.save_message("conv-1", "web", "usuario", "Adjunto", file_url="https://example.com/a.pdf", file_name="Cotizacion_final.pdf")
+        self.repository.save_message("conv-1", "web", "usuario", "Mira esto", metadata={"links": ["https://tienda.example.com/promocion"]})
+        self.repository.save_message("conv-1", "web", "usuario", "Informacion basica")
+
+        # Act
+        by_file = self.repository.search_messages('"cotizacion"')
+        by_link = self.repository.search_messages('"promocion"')
+        by_accent = self.repository.search_messages('"información"')
+
+        # Assert
+        self.assertEqual(["Adjunto"], [item["message"] for item in by_file])
+        self.assertEqual(["Mira esto"], [item["message"] for item in by_link])
+        self.assertEqual(["Informacion basica"], [item["message"] for item in by_accent])
+
+
+    def _age_messages(self, conversation_id, days):
+        with self.repository._connection() as conn:
+            conn.execute(
+                "UPDATE messages SET created_at = datetime('now', ?) WHERE conversation_id = ?",
+                (f"-{days} days", conversation_id),
+            )
+
+    def test_archive_messages_moves_old_rows_and_keeps_them_readable(self):
+        # Arrange
+        for index in range(5):
+            self.repository.save_message("conv-30", "web", "usuario", f"Viejo {index}")
+        self._age_messages("conv-30", 400)
+        self.repository.save_message("conv-30", "web", "usuario", "Nuevo")
+
+        # Act
+        result = self.repository.archive_messages(older_than_days=365, batch_size=2)
+
+        # Assert
+        self.assertEqual(5, result["archived"])
+        self.assertEqual(["Nuevo"], [m["message"] for m in self.repository.list_messages("conv-30")])
+        history = self.repository.list_messages("conv-30", include_archive=True)
+        self.assertEqual(["Viejo 0", "Viejo 1", "Viejo 2", "Viejo 3", "Viejo 4", "Nuevo"], [m["message"] for m in history])
+        older = self.repository.list_messages("conv-30", limit=2, before=(history[2]["created_at"], history[2]["id"]), include_archive=True)
+        self.assertEqual(["Viejo 0", "Viejo 1"], [m["message"] for m in older])
+
+    def test_archive_messages_moves_inactive_conversations(self):
+        # Arrange
+        self.repository.save_message("conv-31", "web", "usuario", "Inactiva")
+        self.repository.save_message("conv-32", "web", "usuario", "Activa")
+        with self.repository._connection() as conn:
+            conn.execute("UPDATE conversations SET updated_at = datetime('now', '-120 days') WHERE id = 'conv-31'")
+
+        # Act
+        result = self.repository.archive_messages(inactive_days=90)
+
+        # Assert
+        self.assertEqual(1, result["archived"])
+        self.assertEqual([], self.repository.list_messages("conv-31"))
+        self.assertEqual(["Activa"], [m["message"] for m in self.repository.list_messages("conv-32")])
+        self.assertEqual(2, len(self.repository.list_conversations()))
+
+    def test_init_schema_enables_incremental_auto_vacuum(self):
+        # Act
+        with self.repository._connection() as conn:
+            modes = [conn.execute(f"PRAGMA {schema}.auto_vacuum").fetchone()[0] for schema in ("main", "archive")]
+
+        # Assert
+        self.assertEqual([2, 2], modes)
+
+    def test_existing_database_is_vacuumed_by_retention_not_at_startup(self):
+        # Arrange
+        legacy_path = os.path.join(self.temp_dir.name, "legacy.db")
+        with sqlite3.connect(legacy_path) as legacy:
+            legacy.execute("CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, conversation_id TEXT, sender TEXT, message TEXT, created_at DATETIME DEFAULT CURRENT_TIMESTAMP)")
+        legacy.close()
+        repository = SQLiteRepository(db_name=legacy_path)
+        self.addCleanup(repository.close)
+
+        # Act
+        repository.init_schema()
+        with repository._connection() as conn:
+            mode_after_startup = conn.execute("PRAGMA main.auto_vacuum").fetchone()[0]
+        result = run_retention(repository)
+
+        # Assert
+        self.assertEqual(0, mode_after_startup)
+        self.assertEqual(["main"], result["vacuumed"])
+        self.assertEqual([], run_retention(repository)["vacuumed"])
+
+    def test_retention_worker_does_not_archive_by_default(self):
+        # Arrange
+        self.repository.save_message("conv-33", "web", "usuario", "Vieja")
+        self._age_messages("conv-33", 400)
+        worker = RetentionWorker(self.repository, interval=60)
+
+        # Act: la primera vuelta detiene al worker
+        with mock.patch.object(self.repository, "prune_change_log", side_effect=lambda days: worker._stop.set()) as prune:
+            worker._run()
+
+        # Assert
+        prune.assert_called_once()
+        self.assertEqual(["Vieja"], [m["message"] for m in self.repository.list_messages("conv-33")])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,201 @@
+import asyncio
+import unittest
+
+import requests
+
+from metodos.Proxy import upstream_error
+from services.resilience import CircuitBreaker, ResilientUpstream, UpstreamUnavailable
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class _Upstream:
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return _Response(outcome)
+
+
+class ResilientUpstreamTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = _Clock()
+        self.upstream = ResilientUpstream(
+            limits={"proxy/sendMessage": (1, 2)},
+            base_delay=0,
+            max_wait=0,
+            breaker=CircuitBreaker(failure_threshold=3, recovery_timeout=30, clock=self.clock),
+            clock=self.clock,
+        )
+
+    def test_only_safe_endpoints_are_retried(self):
+        # Arrange
+        balance = _Upstream(503, requests.ReadTimeout("lento"), 200)
+        send_message = _Upstream(503, 200)
+
+        # Act
+        balance_response = self.upstream.call("proxy/balance", balance)
+        send_response = self.upstream.call("proxy/sendMessage", send_message)
+
+        # Assert
+        self.assertEqual(200, balance_response.status_code)
+        self.assertEqual(3, balance.calls)
+        self.assertEqual(503, send_response.status_code)
+        self.assertEqual(1, send_message.calls)
+
+    def test_send_is_retried_only_when_the_connection_never_opened(self):
+        # Arrange
+        not_sent = _Upstream(requests.ConnectTimeout("sin conexion"), 200)
+        maybe_sent = _Upstream(requests.ReadTimeout("lento"), 200)
+
+        # Act
+        response = self.upstream.call("proxy/sendFile", not_sent)
+
+        # Assert
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, not_sent.calls)
+        with self.assertRaises(requests.ReadTimeout):
+            self.upstream.call("proxy/sendFile", maybe_sent)
+        self.assertEqual(1, maybe_sent.calls)
+
+    def test_circuit_opens_fails_fast_and_recovers_after_a_trial_call(self):
+        # Arrange
+        failing = _Upstream(500, 500, 500)
+        for _ in range(3):
+            self.upstream.call("proxy/transfer", failing)
+        never_called = _Upstream(200)
+
+        # Act
+        with self.assertRaises(UpstreamUnavailable) as rejected:
+            self.upstream.call("proxy/transfer", never_called)
+        self.clock.now += 31
+        recovered = self.upstream.call("proxy/transfer", _Upstream(200))
+
+        # Assert
+        self.assertEqual(503, rejected.exception.status_code)
+        self.assertEqual(30, rejected.exception.retry_after)
+        self.assertEqual(0, never_called.calls)
+        self.assertEqual(200, recovered.status_code)
+        self.assertEqual("closed", self.upstream.snapshot()["circuit"]["state"])
+
+    def test_half_open_failure_reopens_the_circuit(self):
+        # Arrange
+        for _ in range(3):
+            self.upstream.call("proxy/transfer", _Upstream(502))
+        self.clock.now += 31
+
+        # Act
+        self.upstream.call("proxy/transfer", _Upstream(502))
+
+        # Assert
+        self.assertEqual("open", self.upstream.snapshot()["circuit"]["state"])
+
+    def test_open_circuit_rejects_without_spending_tokens(self):
+        # Arrange
+        for _ in range(3):
+            self.upstream.call("proxy/transfer", _Upstream(502))
+        self.clock.now += 29
+
+        # Act
+        for _ in range(5):
+            with self.assertRaises(UpstreamUnavailable):
+                self.upstream.call("proxy/sendMessage", _Upstream(200))
+
+        # Assert
+        self.assertEqual(2, self.upstream.snapshot()["endpoints"]["proxy/sendMessage"]["tokens"])
+
+    def test_half_open_trial_with_unexpected_error_does_not_block_the_circuit(self):
+        # Arrange
+        for _ in range(3):
+            self.upstream.call("proxy/transfer", _Upstream(502))
+        self.clock.now += 31
+
+        # Act
+        with self.assertRaises(ValueError):
+            self.upstream.call("proxy/transfer", _Upstream(ValueError("respuesta invalida")))
+        reopened = self.upstream.snapshot()["circuit"]["state"]
+        self.clock.now += 31
+        recovered = self.upstream.call("proxy/transfer", _Upstream(200))
+
+        # Assert
+        self.assertEqual("open", reopened)
+        self.assertEqual(200, recovered.status_code)
+        self.assertEqual("closed", self.upstream.snapshot()["circuit"]["state"])
+
+    def test_rate_limited_or_cancelled_trial_frees_the_half_open_slot(self):
+        # Arrange
+        for _ in range(3):
+            self.upstream.call("proxy/transfer", _Upstream(502))
+        self.clock.now += 31
+        self.upstream._bucket("proxy/sendMessage")._tokens = 0
+
+        async def cancelled():
+            raise asyncio.CancelledError()
+
+        # Act
+        with self.assertRaises(UpstreamUnavailable) as rate_limited:
+            self.upstream.call("proxy/sendMessage", _Upstream(200))
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(self.upstream.call_async("proxy/transfer", cancelled))
+        trial = self.upstream.call("proxy/transfer", _Upstream(200))
+
+        # Assert
+        self.assertEqual(429, rate_limited.exception.status_code)
+        self.assertEqual(200, trial.status_code)
+        self.assertEqual("closed", self.upstream.snapshot()["circuit"]["state"])
+
+    def test_rate_limit_rejects_with_429_and_refills_over_time(self):
+        # Arrange
+        self.upstream.call("proxy/sendMessage", _Upstream(200))
+        self.upstream.call("proxy/sendMessage", _Upstream(200))
+
+        # Act
+        with self.assertRaises(UpstreamUnavailable) as rejected:
+            self.upstream.call("proxy/sendMessage", _Upstream(200))
+        tokens_left = self.upstream.snapshot()["endpoints"]["proxy/sendMessage"]["tokens"]
+        self.clock.now += 1
+        response = self.upstream.call("proxy/sendMessage", _Upstream(200))
+
+        # Assert
+        self.assertEqual(429, rejected.exception.status_code)
+        self.assertEqual(0, tokens_left)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            {"ok": False, "status_code": 429, "retry_after": 1.0, "error": "sendMessage: Limite de requests alcanzado para proxy/sendMessage"},
+            upstream_error(rejected.exception, "sendMessage"),
+        )
+
+    def test_async_calls_honor_retry_after(self):
+        # Arrange
+        outcomes = [_Response(429, {"Retry-After": "0"}), _Response(200)]
+
+        async def send():
+            return outcomes.pop(0)
+
+        # Act
+        response = asyncio.run(self.upstream.call_async("channels/list", send))
+
+        # Assert
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([], outcomes)
+
+
+if __name__ == "__main__":
+    unittest.main()
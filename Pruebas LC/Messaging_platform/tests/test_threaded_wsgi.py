@@ -0,0 +1,86 @@
+import asyncio
+import time
+import unittest
+
+from services.threaded_wsgi import ThreadedWsgiToAsgi
+
+
+def _slow_app(environ, start_response):
+    time.sleep(0.3)
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [environ["PATH_INFO"].encode("utf-8")]
+
+
+class _ClosingBody:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+
+class ThreadedWsgiToAsgiTests(unittest.TestCase):
+    def setUp(self):
+        self.application = ThreadedWsgiToAsgi(_slow_app, max_workers=4)
+        self.addCleanup(self.application.close)
+
+    async def _request(self, path, application=None):
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            "type": "http",
+            "http_version": "1.1",
+            "method": "GET",
+            "path": path,
+            "root_path": "",
+            "query_string": b"",
+            "headers": [],
+        }
+        await (application or self.application)(scope, receive, send)
+        return sent[0]["status"], b"".join(message.get("body", b"") for message in sent[1:])
+
+    def test_concurrent_requests_run_in_parallel(self):
+        # Arrange
+        async def scenario():
+            return await asyncio.gather(*(self._request(f"/r{index}") for index in range(4)))
+
+        # Act
+        started = time.monotonic()
+        responses = asyncio.run(scenario())
+        elapsed = time.monotonic() - started
+
+        # Assert
+        self.assertEqual([(200, f"/r{index}".encode("utf-8")) for index in range(4)], responses)
+        self.assertLess(elapsed, 0.9)
+
+    def test_body_is_cut_at_content_length_and_closed(self):
+        # Arrange
+        body = _ClosingBody([b"hola", b"mundo"])
+
+        def app(environ, start_response):
+            start_response("200 OK", [("Content-Length", "6")])
+            return body
+
+        application = ThreadedWsgiToAsgi(app, max_workers=1)
+        self.addCleanup(application.close)
+
+        # Act
+        status, content = asyncio.run(self._request("/archivo", application))
+
+        # Assert
+        self.assertEqual((200, b"holamu"), (status, content))
+        self.assertTrue(body.closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import metodos.Proxy as proxy_module
+from DB.database import SQLiteRepository
+from services.token_manager import TokenManager
+
+
+class CountingFetch:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+            number = self.calls
+        time.sleep(self.delay)
+        return f"token-{number}"
+
+
+class TokenManagerTests(unittest.TestCase):
+    def setUp(self):
+        self.managers = []
+
+    def tearDown(self):
+        for manager in self.managers:
+            manager.close(timeout=1)
+
+    def _manager(self, fetch, **options):
+        manager = TokenManager(fetch, **options)
+        self.managers.append(manager)
+        return manager
+
+    def test_concurrent_callers_share_a_single_refresh(self):
+        # Arrange
+        fetch = CountingFetch(delay=0.1)
+        manager = self._manager(fetch)
+        tokens = []
+        start = threading.Barrier(20)
+
+        def worker():
+            start.wait()
+            tokens.append(manager.get_token())
+
+        threads = [threading.Thread(target=worker) for _ in range(20)]
+
+        # Act
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Assert
+        self.assertEqual(1, fetch.calls)
+        self.assertEqual({"token-1"}, set(tokens))
+
+    def test_refresh_replaces_only_the_rejected_token(self):
+        # Arrange
+        fetch = CountingFetch()
+        manager = self._manager(fetch)
+        rejected = manager.get_token()
+
+        # Act
+        renewed = manager.refresh(stale_token=rejected)
+        late_caller = manager.refresh(stale_token=rejected)
+
+        # Assert
+        self.assertEqual("token-2", renewed)
+        self.assertEqual("token-2", late_caller)
+        self.assertEqual(2, fetch.calls)
+
+    def test_token_is_reused_from_system_config(self):
+        # Arrange
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repository = SQLiteRepository(db_name=os.path.join(temp_dir, "token_test.db"))
+            repository.init_schema()
+            first_fetch = CountingFetch()
+            second_fetch = CountingFetch()
+            self._manager(first_fetch, repository=repository).get_token()
+
+            # Act
+            token = self._manager(second_fetch, repository=repository).get_token()
+            repository.close()
+
+        # Assert
+        self.assertEqual("token-1", token)
+        self.assertEqual(0, second_fetch.calls)
+
+    def test_token_is_refreshed_in_background_before_expiry(self):
+        # Arrange
+        fetch = CountingFetch()
+        manager = self._manager(fetch, ttl=0.3, refresh_margin=0.2)
+        manager.get_token()
+
+        # Act
+        time.sleep(0.25)
+
+        # Assert
+        self.assertGreaterEqual(fetch.calls, 2)
+        self.assertNotEqual("token-1", manager.get_token())
+
+    def test_call_liveconnect_retries_once_after_unauthorized(self):
+        # Arrange
+        responses = [mock.Mock(status_code=401), mock.Mock(status_code=200)]
+        client = mock.Mock()
+        client.request.side_effect = responses
+        manager = self._manager(CountingFetch())
+        with mock.patch.object(proxy_module, "default_client", client), \
+                mock.patch("metodos.Token.default_token_manager", manager):
+            # Act
+            res = proxy_module.call_liveconnect({"method": "POST", "path": "proxy/transfer", "json": {}})
+
+        # Assert
+        self.assertIs(responses[1], res)
+        sent_tokens = [call.kwargs["headers"]["PageGearToken"] for call in client.request.call_args_list]
+        self.assertEqual(["token-1", "token-2"], sent_tokens)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from services.liveconnect_client import LiveConnectClient
+from services.resilience import CircuitBreaker, ResilientUpstream, UpstreamUnavailable
+from services.token_manager import TokenManager
+from services.upstream_metrics import LatencyHistogram, UpstreamMetrics
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        body = json.dumps({"ok": True}).encode("utf-8")
+        self.send_response(503 if self.path.endswith("/balance") else 200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+
+class UpstreamMetricsTests(unittest.TestCase):
+    def setUp(self):
+        self.metrics = UpstreamMetrics()
+        self.events = []
+        self.metrics.subscribe(self.events.append)
+
+    def test_client_records_latency_status_and_payload_sizes(self):
+        # Arrange
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        client = LiveConnectClient(base_url=f"http://127.0.0.1:{server.server_address[1]}/prod", metrics=self.metrics)
+        self.addCleanup(client.close)
+
+        # Act
+        client.post("proxy/sendMessage", json={"mensaje": "Hola"})
+        client.post("proxy/balance")
+        client.base_url = "http://127.0.0.1:1/prod"
+        with self.assertRaises(requests.ConnectionError):
+            client.post("proxy/sendMessage", json={})
+
+        # Assert
+        endpoints = self.metrics.snapshot()["endpoints"]
+        send_message = endpoints["proxy/sendMessage"]
+        self.assertEqual((2, 1, {"200": 1}), (send_message["calls"], send_message["errors"], send_message["status_codes"]))
+        self.assertEqual(len(b'{"mensaje": "Hola"}'), send_message["request_bytes"])
+        self.assertEqual(len(b'{"ok": true}'), send_message["response_bytes"])
+        self.assertEqual(2, send_message["latency_ms"]["count"])
+        self.assertIn("ConnectionError", send_message["last_error"])
+        self.assertEqual({"503": 1}, endpoints["proxy/balance"]["status_codes"])
+        self.assertEqual(["call", "call", "call"], [event["type"] for event in self.events])
+
+    def test_retries_and_local_rejections_are_counted(self):
+        # Arrange
+        upstream = ResilientUpstream(
+            limits={"proxy/sendMessage": (1, 1)},
+            base_delay=0,
+            max_wait=0,
+            breaker=CircuitBreaker(failure_threshold=10),
+            metrics=self.metrics,
+        )
+        outcomes = [_Response(503), _Response(200)]
+
+        # Act
+        upstream.call("proxy/balance", lambda: outcomes.pop(0))
+        upstream.call("proxy/sendMessage", lambda: _Response(200))
+        with self.assertRaises(UpstreamUnavailable):
+            upstream.call("proxy/sendMessage", lambda: _Response(200))
+
+        # Assert
+        endpoints = self.metrics.snapshot()["endpoints"]
+        self.assertEqual(1, endpoints["proxy/balance"]["retries"])
+        self.assertEqual({"rate_limit": 1}, endpoints["proxy/sendMessage"]["rejected"])
+
+    def test_token_refreshes_are_recorded_by_source(self):
+        # Arrange
+        tokens = iter(["token-1"])
+
+        def fetch():
+            token = next(tokens, None)
+            if token is None:
+                raise requests.RequestException("sin token")
+            return token
+
+        manager = TokenManager(fetch, metrics=self.metrics)
+        self.addCleanup(manager.close)
+
+        # Act
+        manager.get_token()
+        with self.assertRaises(requests.RequestException):
+            manager.refresh(stale_token="token-1")
+
+        # Assert
+        token = self.metrics.snapshot()["token"]
+        self.assertEqual((2, 1, 1), (token["refreshes"], token["fetched"], token["failures"]))
+        self.assertEqual(2, token["latency_ms"]["count"])
+
+    def test_histogram_percentiles_use_bucket_upper_bounds(self):
+        # Arrange
+        histogram = LatencyHistogram(bounds=(10, 100, 1000))
+
+        # Act
+        for elapsed_ms in [5] * 90 + [50] * 9 + [5000]:
+            histogram.observe(elapsed_ms)
+
+        # Assert
+        snapshot = histogram.snapshot()
+        self.assertEqual((10, 100, 100), (snapshot["p50"], snapshot["p95"], snapshot["p99"]))
+        self.assertEqual({"<=10": 90, "<=100": 9, "<=1000": 0, "+inf": 1}, snapshot["buckets"])
+        self.assertEqual(5000, snapshot["max"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,10 @@
+import io
 import os
 import tempfile
 import unittest
 
 from DB.database import SQLiteRepository
-from services.webhook_service import process_incoming_webhook
+from services.webhook_service import parse_ndjson, process_incoming_webhook, process_incoming_webhooks
 
 
 class WebhookServiceTests(unittest.TestCase):
@@ -14,6 +15,7 @@ class WebhookServiceTests(unittest.TestCase):
         self.repository.init_schema()
 
     def tearDown(self):
+        self.repository.close()
         self.temp_dir.cleanup()
 
     def test_process_incoming_webhook_persists_conversation_and_message(self):
@@ -62,6 +64,98 @@ class WebhookServiceTests(unittest.TestCase):
         self.assertFalse(result["ok"])
         self.assertEqual("Payload JSON invalido", result["error"])
 
+    def test_process_incoming_webhooks_reports_each_item(self):
+        # Arrange
+        payloads = [
+            {"id_conversacion": "conv-2", "message": {"texto": "Uno"}},
+            {"message": {"texto": "Sin conversacion"}},
+            {"id_conversacion": "conv-2", "message": {"texto": ""}},
+            {"id_conversacion": "conv-3", "message": {"texto": "Dos"}},
+        ]
+
+        # Act
+        result = process_incoming_webhooks(payloads, repository=self.repository)
+
+        # Assert
+        self.assertEqual(["ok", "error", "ignored", "ok"], [item["status"] for item in result["results"]])
+        self.assertEqual((2, 1, 1), (result["saved"], result["ignored"], result["errors"]))
+        self.assertEqual(["Uno"], [item["message"] for item in self.repository.list_messages("conv-2")])
+        self.assertEqual(["Dos"], [item["message"] for item in self.repository.list_messages("conv-3")])
+
+    def test_process_incoming_webhook_ignores_retried_message(self):
+        # Arrange
+        payload = {
+            "id_conversacion": "conv-5",
+            "message": {"texto": "Hola", "messageUID": "uid-1", "messageId": 99},
+        }
+        process_incoming_webhook(payload, repository=self.repository)
+
+        # Act
+        result = process_incoming_webhook(payload, repository=self.repository)
+
+        # Assert
+        self.assertEqual("ignored", result["status"])
+        self.assertTrue(result["ok"])
+        self.assertEqual(1, len(self.repository.list_messages("conv-5")))
+
+    def test_events_sharing_message_uid_with_different_tipo_are_both_saved(self):
+        # Arrange: filas 18 y 19 de database.db
+        message = {
+            "messageId": "false_265171347992827@lid_ACE116093F81AC46C8C31F32913C1A09",
+            "messageUID": "ACE116093F81AC46C8C31F32913C1A09",
+            "timestamp": 1771472524,
+            "interno": 0,
+            "f_id": "573178560023",
+            "f_tipo": 1,
+        }
+        payloads = [
+            {"id_conversacion": "conv-7", "message": {**message, "tipo": 0, "texto": "001 Algebra_Lineal_unidad.pdf"}},
+            {"id_conversacion": "conv-7", "message": {**message, "tipo": 2, "texto": "📑 Documento compartido..."}},
+        ]
+
+        # Act
+        results = [process_incoming_webhook(payload, repository=self.repository) for payload in payloads]
+        retried = process_incoming_webhook(payloads[1], repository=self.repository)
+
+        # Assert
+        self.assertEqual(["ok", "ok", "ignored"], [result["status"] for result in results + [retried]])
+        self.assertEqual(
+            ["001 Algebra_Lineal_unidad.pdf", "📑 Documento compartido..."],
+            [item["message"] for item in self.repository.list_messages("conv-7")],
+        )
+
+    def test_process_incoming_webhooks_skips_duplicates_within_batch(self):
+        # Arrange
+        payload = {"id_conversacion": "conv-6", "message": {"texto": "Hola", "messageId": 7}}
+
+        # Act
+        result = process_incoming_webhooks([payload, payload], repository=self.repository)
+
+        # Assert
+        self.assertEqual(["ok", "ignored"], [item["status"] for item in result["results"]])
+        self.assertEqual(1, len(self.repository.list_messages("conv-6")))
+
+    def test_parse_ndjson_keeps_position_of_invalid_lines(self):
+        # Arrange
+        lines = [b'{"id_conversacion": "conv-4"}\n', b"\n", b"{invalido\n"]
+
+        # Act
+        payloads = parse_ndjson(lines)
+
+        # Assert
+        self.assertEqual([{"id_conversacion": "conv-4"}, None], payloads)
+
+    def test_parse_ndjson_stops_reading_an_oversized_body(self):
+        # Arrange
+        body = io.BytesIO(b'{"id_conversacion": "conv-5"}\n' * 1000)
+
+        # Act
+        payloads = parse_ndjson(body, max_items=10)
+
+        # Assert
+        self.assertEqual(11, len(payloads))
+        self.assertLess(body.tell(), len(body.getvalue()) // 10)
+
 
 if __name__ == "__main__":
     unittest.main()
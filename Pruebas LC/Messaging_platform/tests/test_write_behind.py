@@ -0,0 +1,92 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from DB.database import SQLiteRepository
+from services.webhook_service import process_incoming_webhook
+from services.write_behind import WriteBehindQueue
+
+
+class CountingRepository(SQLiteRepository):
+    def __post_init__(self):
+        super().__post_init__()
+        self.batch_sizes = []
+
+    def save_messages(self, messages):
+        self.batch_sizes.append(len(messages))
+        return super().save_messages(messages)
+
+
+class WriteBehindQueueTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "write_behind_test.db")
+        self.repository = CountingRepository(db_name=self.db_path)
+        self.repository.init_schema()
+        self.writer = WriteBehindQueue(self.repository, max_batch_size=50, max_delay=0.05)
+
+    def tearDown(self):
+        self.writer.close()
+        self.repository.close()
+        self.temp_dir.cleanup()
+
+    def test_concurrent_saves_are_committed_in_shared_batches(self):
+        # Arrange
+        results = []
+        start = threading.Barrier(20)
+
+        def save(index):
+            start.wait()
+            results.append(self.writer.save_message(
+                conversation_id="conv-1",
+                canal="web",
+                sender="usuario",
+                message=f"Mensaje {index}",
+            ))
+
+        threads = [threading.Thread(target=save, args=(index,)) for index in range(20)]
+
+        # Act
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Assert
+        self.assertEqual([True] * 20, results)
+        self.assertEqual(20, len(self.repository.list_messages("conv-1")))
+        self.assertLess(len(self.repository.batch_sizes), 20)
+
+    def test_close_flushes_pending_messages(self):
+        # Arrange
+        prepared = self.repository.prepare_message("conv-2", "web", "usuario", "Pendiente")
+        future = self.writer.submit(prepared)
+
+        # Act
+        self.writer.close()
+
+        # Assert
+        self.assertTrue(future.result(timeout=1))
+        self.assertEqual(["Pendiente"], [item["message"] for item in self.repository.list_messages("conv-2")])
+
+    def test_invalid_message_fails_only_its_caller(self):
+        # Act / Assert
+        with self.assertRaises(ValueError):
+            self.writer.save_message(conversation_id="", canal="web", sender="usuario", message="Hola")
+        self.assertTrue(self.writer.save_message(conversation_id="conv-3", canal="web", sender="usuario", message="Hola"))
+
+    def test_webhook_service_accepts_queue_as_repository(self):
+        # Arrange
+        payload = {"id_conversacion": "conv-4", "message": {"texto": "Hola desde webhook"}}
+
+        # Act
+        result = process_incoming_webhook(payload, repository=self.writer)
+
+        # Assert
+        self.assertEqual({"status": "ok", "ok": True}, result)
+        self.assertEqual(1, len(self.repository.list_messages("conv-4")))
+
+
+if __name__ == "__main__":
+    unittest.main()